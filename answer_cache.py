@@ -0,0 +1,154 @@
+"""
+Semantic answer cache keyed on query embeddings.
+
+Near-identical questions ("what is autism", "What is autism?") embed to
+almost the same vector, so a new question whose cosine similarity to a cached
+one is above a threshold can reuse the stored answer and sources instead of
+paying for retrieval and a full generation.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    """A cached answer together with the query it was generated for."""
+    question: str
+    model_name: str
+    embedding: np.ndarray  # normalized query embedding
+    answer: str
+    sources: List[dict]
+    created_at: float = field(default_factory=time.time)
+
+
+class SemanticAnswerCache:
+    """LRU/TTL cache of answers, looked up by cosine similarity of query embeddings."""
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        version_path: Optional[str] = None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # File rewritten by populate_database whenever the collection changes
+        self.version_path = version_path
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+        self._version = self._read_version()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _read_version(self) -> Optional[str]:
+        if not self.version_path:
+            return None
+        try:
+            with open(self.version_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _check_version(self):
+        """Drop every entry if the collection changed since the last check."""
+        version = self._read_version()
+        if version != self._version:
+            self._version = version
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+            self.evictions += 1
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding, model_name: str) -> Optional[CachedAnswer]:
+        """Return the most similar cached answer for `model_name` above the threshold."""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+            self._expire(time.time())
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.model_name == model_name and entry.embedding.shape == query.shape
+            ]
+            if candidates:
+                matrix = np.stack([entry.embedding for _key, entry in candidates])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, embedding, model_name: str, answer: str, sources: List[dict]):
+        """Cache an answer, evicting the least recently used entries when full."""
+        entry = CachedAnswer(
+            question=question,
+            model_name=model_name,
+            embedding=self._normalize(embedding),
+            answer=answer,
+            sources=sources,
+        )
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def create_answer_cache_from_env(version_path: Optional[str] = None) -> Optional[SemanticAnswerCache]:
+    """Build the answer cache from environment variables (None when disabled)."""
+    if os.getenv("ANSWER_CACHE_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    return SemanticAnswerCache(
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        version_path=version_path,
+    )
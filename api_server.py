@@ -1,20 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from langchain_chroma import Chroma
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama import OllamaLLM
-from get_embedding_function import get_embedding_function
-from optimization import ModelOptimizer, OptimizationResult, BenchmarkMetrics
-from typing import Optional, List, Dict
-from dataclasses import asdict
+from inference_pool import Deadline, QueueFullError, RequestCancelled, create_inference_pool_from_env
+from answer_cache import CachedAnswer, create_answer_cache_from_env
+from embedding_batcher import create_embedding_batcher_from_env
+from bm25_index import BM25Index, is_lexical_query, load_index as load_bm25_index
+from retrieval import (HYBRID_CANDIDATE_FACTOR, RETRIEVAL_MODES, VECTOR_BACKENDS, chunk_id, dense_search,
+                       hybrid_search, lexical_search, nearest_chunks_batch)
+from sessions import ConversationSession, create_session_store_from_env
+from model_router import ESCALATED, SMALL, create_router_from_env
+from request_coalescing import create_single_flight_from_env, normalize_question
+from context_builder import build_context, estimate_tokens
+from generation_stats import GenerationStats, GenerationStatsCollector
+from model_residency import create_residency_manager_from_env, normalize_model_name
+from readiness import LAZY, READY, ReadinessTracker
+from benchmark_jobs import SUCCEEDED, BenchmarkJob, BenchmarkJobManager
+from pdf_files import (PdfLibrary, create_page_cache_from_env, not_modified, parse_range, range_applies, read_range,
+                       validators)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, TOKEN_RATE_BUCKETS, MetricsMiddleware, Registry
+from typing import TYPE_CHECKING, Optional, List, Dict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import asyncio
 import os
+import threading
 import time
-from urllib.parse import quote
+from contextlib import asynccontextmanager
+from urllib.parse import quote, unquote
 import json
 
-app = FastAPI(title="Autism Chatbot API", version="1.0.0")
+# langchain, Chroma and the optimizer are imported where they are first used,
+# so the server starts quickly and /health, /ready and /api/pdf never load them.
+if TYPE_CHECKING:
+    from langchain_ollama import OllamaLLM
+    from optimization import BenchmarkMetrics, MatrixVariant, ModelOptimizer, OptimizationResult
+    from vector_index import VectorIndex
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; /ready reports progress until it finishes
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+    yield
+
+
+app = FastAPI(title="Autism Chatbot API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 # For local development, allow all origins so the frontend can run on any port (3000, 3001, 3003, etc.)
@@ -28,6 +60,25 @@ app.add_middleware(
 
 CHROMA_PATH = "chroma"
 DATA_PATH = "data"
+# Seconds browsers may reuse a PDF before revalidating it (a cheap 304)
+PDF_CACHE_MAX_AGE = int(os.getenv("PDF_CACHE_MAX_AGE", "3600"))
+# Written by populate_database.add_to_chroma whenever the collection changes
+COLLECTION_VERSION_PATH = os.path.join(CHROMA_PATH, "collection_version")
+# Built by populate_database next to the Chroma directory
+BM25_INDEX_PATH = "bm25_index.json.gz"
+# "dense", "hybrid" (BM25 + vectors, fused with reciprocal rank fusion) or "lexical"; hybrid is opt-in
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+# Exported by populate_database for the "numpy" vector backend
+VECTOR_INDEX_PATH = "vector_index"
+# "chroma" or "numpy" (exact search over the memory-mapped VECTOR_INDEX_PATH)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+RETRIEVAL_K = 5
+# Most questions accepted by one /api/query/batch request
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "256"))
+# Seconds a query may take, queueing included (0 disables); requests may ask for less
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+# How often /api/query checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
 
 # Base and optimized model names (can be overridden via environment variables)
 BASE_MODEL_NAME = os.getenv("BASE_MODEL_NAME", "mistral")
@@ -36,6 +87,26 @@ BASE_MODEL_NAME = os.getenv("BASE_MODEL_NAME", "mistral")
 QUANT_MODEL_TEMPLATE = os.getenv("QUANT_MODEL_TEMPLATE", "mistral:7b-instruct-q4_0")
 # Name of a pruned / smaller model - using llama3.2:1b-instruct-q4_0 (770MB) as a smaller alternative
 PRUNED_MODEL_NAME = os.getenv("PRUNED_MODEL_NAME", "llama3.2:1b-instruct-q4_0")  # 770MB vs 4.4GB baseline
+# "fixed" answers with the current model; "cascade" routes between PRUNED_MODEL_NAME and BASE_MODEL_NAME
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "fixed")
+ROUTING_MODES = ("fixed", "cascade")
+# Comma-separated models loaded on the Ollama server at startup
+PRELOAD_MODELS = [name.strip() for name in os.getenv("PRELOAD_MODELS", BASE_MODEL_NAME).split(",") if name.strip()]
+# SQLite database holding every benchmark result
+BENCHMARK_DB_PATH = os.getenv("BENCHMARK_DB_PATH", "benchmark_results.sqlite3")
+BENCHMARK_TECHNIQUES = ("baseline", "quantization", "pruning")
+# Variant benchmarks reuse a baseline of the same question measured within this many seconds (0 disables)
+BENCHMARK_BASELINE_MAX_AGE = float(os.getenv("BENCHMARK_BASELINE_MAX_AGE", "3600"))
+# Open the DB and warm the embedding model at startup instead of on the first query
+EAGER_INIT = os.getenv("EAGER_INIT", "0").lower() in ("1", "true", "yes")
+
+# Approximate prompt-context tokens per model; smaller models get a tighter context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_TOKEN_BUDGETS = {
+    PRUNED_MODEL_NAME: int(os.getenv("PRUNED_CONTEXT_TOKEN_BUDGET", "700")),
+}
+# Chunks scoring below this fraction of the best chunk's relevance are dropped
+CONTEXT_MIN_RELATIVE_SCORE = float(os.getenv("CONTEXT_MIN_RELATIVE_SCORE", "0.5"))
 
 PROMPT_TEMPLATE = """
 Answer the question based only on the following context:
@@ -47,33 +118,224 @@ Answer the question based only on the following context:
 Answer the question based on the above context: {question}
 """
 
+# Follow-up turns of a session; Ollama already holds the earlier context
+FOLLOW_UP_PROMPT_TEMPLATE = """
+{context}
+
+---
+
+Answer this follow-up question based only on the context given in this conversation: {question}
+"""
+# Turns recapped when a session starts over without its Ollama context
+SESSION_RECAP_TURNS = 2
+
 # Initialize DB and model (singleton / cached pattern)
 _embedding_function = None
+_embedding_batcher = None
 _db = None
+_bm25_index: Optional[BM25Index] = None
+_bm25_mtime: Optional[int] = None
+_vector_index: Optional["VectorIndex"] = None
+_vector_index_mtime: Optional[int] = None
 # Cache multiple models by name so we can benchmark different variants
-_models: Dict[str, OllamaLLM] = {}
+_models: Dict[str, "OllamaLLM"] = {}
 _model_name = BASE_MODEL_NAME
-_optimizer = ModelOptimizer()
-_baseline_metrics: Optional[BenchmarkMetrics] = None
+_optimizer: Optional["ModelOptimizer"] = None
+_baseline_metrics: Optional["BenchmarkMetrics"] = None
+_db_lock = threading.Lock()
+_embeddings_warm = False
+# Blocking retrieval/generation runs here so the event loop stays responsive
+_inference_pool = create_inference_pool_from_env()
+# Answers for near-identical questions (None when ANSWER_CACHE_ENABLED=0)
+_answer_cache = create_answer_cache_from_env(COLLECTION_VERSION_PATH)
+# Tracks which models are loaded on the Ollama server and keeps them warm;
+# a model holding an inference slot is never evicted
+_residency = create_residency_manager_from_env(
+    in_use=lambda name: name in {normalize_model_name(model) for model in _inference_pool.active_models()}
+)
+# Benchmarks submitted through /api/benchmark/jobs, run one at a time in the background
+_benchmark_jobs = BenchmarkJobManager()
+# Index of the PDFs /api/pdf may serve, and single pages extracted from them
+_pdf_library = PdfLibrary(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), DATA_PATH),
+    project_root=os.path.dirname(os.path.abspath(__file__)),
+)
+_page_cache = create_page_cache_from_env()
+# Multi-turn conversations: Ollama context tokens and chunks already sent, per session
+_sessions = create_session_store_from_env()
+# Picks the small or the large model per question when routing is "cascade"
+_router = create_router_from_env(PRUNED_MODEL_NAME, BASE_MODEL_NAME)
+# Identical questions in flight at the same time share one answer (None when COALESCING_ENABLED=0)
+_coalescer = create_single_flight_from_env()
+# Startup/first-use state of each component, reported by /ready
+_readiness = ReadinessTracker(["database", "embeddings", "bm25_index", "models"])
+if not EAGER_INIT:
+    for _component in ("database", "embeddings", "bm25_index"):
+        _readiness.set_state(_component, LAZY)
+
+# Prometheus metrics, scraped from /metrics
+_metrics = Registry()
+_http_requests = _metrics.counter("http_requests_total", "HTTP requests by route and status", ["method", "path", "status"])
+_http_in_flight = _metrics.gauge("http_requests_in_flight", "HTTP requests currently being served", ["path"])
+_http_duration = _metrics.histogram("http_request_duration_seconds", "HTTP request latency, until the last byte is sent", ["method", "path"])
+_stage_duration = _metrics.histogram("rag_stage_duration_seconds", "Time spent in each stage of the query path", ["stage"])
+_stage_seconds = {
+    stage: _stage_duration.labels(stage)
+    for stage in ("embedding", "cache_lookup", "search", "context_packing", "prompt_formatting", "generation")
+}
+_queries = _metrics.counter("rag_queries_total", "Answered questions by retrieval mode and cache outcome", ["retrieval_mode", "cache_hit"])
+_time_to_first_token = _metrics.histogram("rag_time_to_first_token_seconds", "Time from request to first streamed token", ["model"])
+_generated_tokens = _metrics.counter("rag_generated_tokens_total", "Generated tokens per model", ["model"])
+_generation_seconds = _metrics.counter("rag_generation_seconds_total", "Time spent generating per model", ["model"])
+_token_rate = _metrics.histogram("rag_generation_tokens_per_second", "Generation throughput per request", ["model"], buckets=TOKEN_RATE_BUCKETS)
+_cancelled_requests = _metrics.counter("rag_cancelled_requests_total", "Queries stopped before their answer was complete, by reason", ["reason"])
+_route_duration = _metrics.histogram("rag_route_duration_seconds", "Answer latency per cascade route", ["route"])
+app.add_middleware(MetricsMiddleware, requests=_http_requests, in_flight=_http_in_flight, duration=_http_duration)
+
+
+def collect_component_metrics():
+    """Scrape-time metrics read from the components that already count them."""
+    pool = _inference_pool.stats()
+    models = set(pool["pending"]) | set(pool["active"])
+    yield ("rag_inference_active", "gauge", "Requests holding an inference slot per model",
+           [("rag_inference_active", {"model": name}, pool["active"].get(name, 0)) for name in models])
+    yield ("rag_inference_queued", "gauge", "Requests waiting for an inference slot per model",
+           [("rag_inference_queued", {"model": name}, pool["pending"].get(name, 0) - pool["active"].get(name, 0))
+            for name in models])
+    yield ("rag_inference_expected_wait_seconds", "gauge", "Estimated queue wait for a request arriving now, per model",
+           [("rag_inference_expected_wait_seconds", {"model": name}, wait) for name, wait in pool["expected_wait"].items()])
+    yield ("rag_inference_admitted_total", "counter", "Requests given an inference slot per model",
+           [("rag_inference_admitted_total", {"model": name}, count) for name, count in pool["admitted"].items()])
+    yield ("rag_inference_shed_total", "counter", "Requests rejected with Retry-After, by model and reason",
+           [("rag_inference_shed_total", {"model": shed["model"], "reason": shed["reason"]}, shed["count"])
+            for shed in pool["shed"]])
+    yield ("rag_inference_queue_wait_seconds_total", "counter", "Time requests spent waiting for an inference slot",
+           [("rag_inference_queue_wait_seconds_total", {"model": name}, seconds) for name, seconds in pool["wait_seconds"].items()])
+    yield ("rag_inference_service_seconds_total", "counter", "Time inference slots were held",
+           [("rag_inference_service_seconds_total", {"model": name}, seconds) for name, seconds in pool["service_seconds"].items()])
+    if _answer_cache is not None:
+        cache = _answer_cache.stats()
+        for key in ("hits", "misses", "evictions", "invalidations"):
+            name = f"rag_answer_cache_{key}_total"
+            yield (name, "counter", f"Semantic answer cache {key}", [(name, {}, cache[key])])
+        yield ("rag_answer_cache_entries", "gauge", "Answers currently cached",
+               [("rag_answer_cache_entries", {}, cache["entries"])])
+    if _embedding_batcher is not None:
+        batcher = _embedding_batcher.stats()
+        yield ("rag_embedding_requests_total", "counter", "Questions embedded through the batcher",
+               [("rag_embedding_requests_total", {}, batcher["requests"])])
+        yield ("rag_embedding_batches_total", "counter", "Embedding requests sent by the batcher",
+               [("rag_embedding_batches_total", {}, batcher["batches"])])
+    if _coalescer is not None:
+        coalescing = _coalescer.stats()
+        yield ("rag_coalesced_requests_total", "counter", "Requests answered by attaching to an identical one in flight",
+               [("rag_coalesced_requests_total", {}, coalescing["followers"])])
+        yield ("rag_coalescing_in_flight", "gauge", "Distinct questions currently being answered",
+               [("rag_coalescing_in_flight", {}, coalescing["in_flight"])])
+    sessions = _sessions.stats()
+    yield ("rag_sessions_active", "gauge", "Conversation sessions held in memory",
+           [("rag_sessions_active", {}, sessions["sessions"])])
+    yield ("rag_sessions_memory_bytes", "gauge", "Estimated memory held by conversation sessions",
+           [("rag_sessions_memory_bytes", {}, sessions["memory_bytes"])])
+    routing = _router.stats()
+    yield ("rag_route_decisions_total", "counter", "Cascade routing decisions by reason",
+           [("rag_route_decisions_total", {"reason": reason}, count) for reason, count in routing["reasons"].items()])
+    residency = _residency.status()
+    yield ("rag_model_cold_loads_total", "counter", "Models loaded on Ollama by the API",
+           [("rag_model_cold_loads_total", {}, residency["cold_loads"])])
+    yield ("rag_model_loaded_mb", "gauge", "Models known to be loaded on Ollama, by size",
+           [("rag_model_loaded_mb", {"model": model["model"]}, model["size_mb"]) for model in residency["loaded"]])
+
+
+_metrics.add_collector(collect_component_metrics)
 
 
 def get_db():
-    global _db, _embedding_function
+    global _db, _embedding_function, _embedding_batcher
     if _db is None:
-        _embedding_function = get_embedding_function()
-        _db = Chroma(persist_directory=CHROMA_PATH, embedding_function=_embedding_function)
+        with _db_lock:
+            if _db is None:
+                with _readiness.track("database"):
+                    from langchain_chroma import Chroma
+                    from get_embedding_function import get_embedding_function
+
+                    _embedding_function = get_embedding_function()
+                    # Concurrent questions share one embedding request
+                    _embedding_batcher = create_embedding_batcher_from_env(_embedding_function)
+                    _db = Chroma(persist_directory=CHROMA_PATH, embedding_function=_embedding_function)
     return _db
 
 
+def get_optimizer() -> "ModelOptimizer":
+    global _optimizer
+    if _optimizer is None:
+        from benchmark_store import BenchmarkStore
+        from optimization import ModelOptimizer
+
+        # Every benchmark result is persisted so history survives restarts
+        _optimizer = ModelOptimizer(store=BenchmarkStore(BENCHMARK_DB_PATH))
+    return _optimizer
+
+
+def warm_up():
+    """
+    Startup initialization, run on a background thread.
+
+    Preloads PRELOAD_MODELS on Ollama and, with EAGER_INIT=1, also opens the
+    DB, loads the BM25 index and embeds a dummy question so the first real
+    query finds everything warm.
+    """
+    if EAGER_INIT:
+        try:
+            db = get_db()
+            with _readiness.track("embeddings"):
+                embed_query("warm up", db)
+                # Also imports the prompt template machinery
+                build_prompt("warm up", "")
+        except Exception as e:
+            print(f"Error warming up the database and embeddings: {e}")
+        try:
+            with _readiness.track("bm25_index"):
+                index = get_bm25_index()
+            _readiness.set_state("bm25_index", READY, available=index is not None)
+        except Exception as e:
+            print(f"Error loading BM25 index: {e}")
+        if VECTOR_BACKEND == "numpy" and get_vector_index() is None:
+            print(f"No vector index at {VECTOR_INDEX_PATH}; dense retrieval falls back to Chroma")
+    try:
+        with _readiness.track("models"):
+            _residency.preload(PRELOAD_MODELS)
+            missing = [name for name in PRELOAD_MODELS if not _residency.is_loaded(name)]
+            if missing:
+                raise RuntimeError(f"Models not loaded: {', '.join(missing)}")
+    except Exception as e:
+        print(f"Error preloading models: {e}")
+
+
+def queue_full_exception(e: QueueFullError) -> HTTPException:
+    """Translate a rejected request into a 503 telling the client when to retry."""
+    return HTTPException(
+        status_code=503,
+        detail=f"Server busy: {str(e)}. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 def get_model(model_name: Optional[str] = None):
     """
     Get (and cache) an Ollama model by name.
     This allows us to benchmark different model variants (baseline, quantized, pruned).
+
+    Also makes sure the weights are resident on the Ollama server, so this
+    may block on a cold load and should be called from a worker thread.
     """
     global _models, _model_name
     model_to_use = model_name or _model_name
     if model_to_use not in _models:
-        _models[model_to_use] = OllamaLLM(model=model_to_use)
+        from langchain_ollama import OllamaLLM
+
+        _models[model_to_use] = OllamaLLM(model=model_to_use, keep_alive=_residency.keep_alive_for(model_to_use))
+    _residency.ensure_loaded(model_to_use)
     return _models[model_to_use]
 
 
@@ -85,54 +347,551 @@ def reset_model():
 
 class QueryRequest(BaseModel):
     question: str
+    # Overrides RETRIEVAL_MODE for this request: "dense", "hybrid" or "lexical"
+    retrieval_mode: Optional[str] = None
+    # Overrides VECTOR_BACKEND for this request: "chroma" or "numpy"
+    vector_backend: Optional[str] = None
+    # Conversation this question continues (see POST /api/sessions); unknown IDs start a new one
+    session_id: Optional[str] = None
+    # Overrides MODEL_ROUTING for this request: "fixed" or "cascade" (/api/query only)
+    routing: Optional[str] = None
+    # Seconds the answer may take, queueing included; capped at REQUEST_TIMEOUT
+    timeout: Optional[float] = None
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    retrieval_mode: Optional[str] = None
+    vector_backend: Optional[str] = None
+    # Answers generated at once; capped at MODEL_CONCURRENCY
+    concurrency: Optional[int] = None
+    # Seconds the whole batch may take, queueing included; capped at REQUEST_TIMEOUT
+    timeout: Optional[float] = None
 
 
 class QueryResponse(BaseModel):
     answer: str
     sources: list[dict] = []
+    # Timings, cache hit and context packing stats (tokens used/saved)
+    metrics: Optional[dict] = None
 
 
-def query_rag(query_text: str, db, model, return_metrics: bool = False):
-    """Query the RAG system and return response with sources."""
-    start_time = time.time()
-    
-    # Search the DB.
-    results = db.similarity_search_with_score(query_text, k=5)
+def embed_query(query_text: str, db) -> List[float]:
+    """Embed a question with the same embedding function the DB was built with."""
+    global _embeddings_warm
+    if _embedding_batcher is not None and db is _db:
+        embedding = _embedding_batcher.embed_query(query_text)
+    else:
+        embedding = db.embeddings.embed_query(query_text)
+    if not _embeddings_warm and db is _db:
+        # Recovers /ready after a failed warm-up (e.g. Ollama started after the API)
+        _embeddings_warm = True
+        if not _readiness.is_ready("embeddings"):
+            _readiness.set_state("embeddings", READY, error=None)
+    return embedding
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """Load the BM25 index, reloading it whenever populate_database rewrites it."""
+    global _bm25_index, _bm25_mtime
+    try:
+        mtime = os.stat(BM25_INDEX_PATH).st_mtime_ns
+    except OSError:
+        return None
+    if _bm25_index is None or mtime != _bm25_mtime:
+        _bm25_index = load_bm25_index(BM25_INDEX_PATH)
+        _bm25_mtime = mtime
+    return _bm25_index
+
+
+def get_vector_index() -> Optional["VectorIndex"]:
+    """Map the exported vector index, reloading it whenever populate_database rewrites it."""
+    global _vector_index, _vector_index_mtime
+    try:
+        mtime = os.stat(os.path.join(VECTOR_INDEX_PATH, "index.json")).st_mtime_ns
+    except OSError:
+        return None
+    if _vector_index is None or mtime != _vector_index_mtime:
+        from vector_index import load_index as load_vector_index
+
+        _vector_index = load_vector_index(VECTOR_INDEX_PATH)
+        _vector_index_mtime = mtime
+    return _vector_index
+
+
+def dense_vectors(vector_backend: Optional[str] = None) -> Optional["VectorIndex"]:
+    """The VectorIndex to search with the "numpy" backend; None searches Chroma."""
+    backend = vector_backend or VECTOR_BACKEND
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{backend}', expected one of {', '.join(VECTOR_BACKENDS)}")
+    return get_vector_index() if backend == "numpy" else None
 
-    # Extract sources
+
+def resolve_retrieval_mode(query_text: str, retrieval_mode: Optional[str] = None) -> str:
+    """
+    Pick the retrieval strategy for a question.
+
+    Falls back to dense retrieval when no BM25 index has been built, and in
+    hybrid mode answers keyword lookups ("SHANK3", "ADOS-2") lexically so the
+    embedding model is not called at all.
+    """
+    mode = retrieval_mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {', '.join(RETRIEVAL_MODES)}")
+    if mode == "dense" or get_bm25_index() is None:
+        return "dense"
+    if mode == "hybrid" and is_lexical_query(query_text):
+        return "lexical"
+    return mode
+
+
+def search(query_text: str, db, query_embedding: Optional[List[float]], retrieval_mode: str, k: int = RETRIEVAL_K,
+           vector_backend: Optional[str] = None):
+    if retrieval_mode == "lexical":
+        return lexical_search(db, get_bm25_index(), query_text, k)
+    if retrieval_mode == "hybrid":
+        return hybrid_search(db, get_bm25_index(), query_text, query_embedding, k, vectors=dense_vectors(vector_backend))
+    return dense_search(db, query_embedding, k, vectors=dense_vectors(vector_backend))
+
+
+def retrieve_sources(query_text: str, db, query_embedding: Optional[List[float]] = None, retrieval_mode: str = "dense"):
+    """Search the DB and return the raw results alongside the serialisable sources."""
+    if query_embedding is None and retrieval_mode != "lexical":
+        query_embedding = embed_query(query_text, db)
+    results = search(query_text, db, query_embedding, retrieval_mode)
+    return results, format_sources(results, retrieval_mode)
+
+
+def format_sources(results, retrieval_mode: str) -> List[dict]:
+    """Turn (doc, distance, extras) results into the `sources` returned to clients."""
     sources = []
-    for doc, score in results:
+    for doc, score, extras in results:
         source_path = doc.metadata.get("source", "")
         # Create URL for PDF file
         pdf_url = None
+        page_url = None
         filename = None
         if source_path:
             # Use the source path as-is (it should be relative to project root or absolute)
             # URL encode the path for safety
             pdf_url = f"/api/pdf?file={quote(source_path)}"
             filename = os.path.basename(source_path)
+            # Just the cited page, much smaller than the whole book
+            if isinstance(doc.metadata.get("page"), int):
+                page_url = f"/api/pdf/page?file={quote(source_path)}&page={doc.metadata['page']}"
         
         source_info = {
             "content": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-            "score": float(score),
+            # Vector distance; None for chunks found by keyword search alone
+            "score": float(score) if score is not None else None,
             "metadata": doc.metadata,
             "pdf_url": pdf_url,  # Will be None if source_path is empty
-            "filename": filename
+            "page_url": page_url,  # Will be None if the page is unknown
+            "filename": filename,
+            "retrieval": retrieval_mode,
+            **extras,
         }
         sources.append(source_info)
 
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
+    return sources
+
+
+def context_token_budget(model_name: str) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model_name, CONTEXT_TOKEN_BUDGET)
+
+
+def build_prompt(query_text: str, context_text: str) -> str:
+    """Format the RAG prompt from the packed context."""
+    from langchain_core.prompts import ChatPromptTemplate
+
     prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=query_text)
+    return prompt_template.format(context=context_text, question=query_text)
+
+
+def build_session_prompt(query_text: str, context_text: str, session: ConversationSession) -> str:
+    """
+    Prompt for a session turn.
+
+    A follow-up that continues Ollama's context only carries the new question
+    and newly retrieved chunks. A session starting over (first turn, or after
+    a reset) gets the full prompt, recapping the latest turns if there are any.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    if session.has_context:
+        context_text = f"Additional context:\n\n{context_text}" if context_text else "No additional context."
+        return ChatPromptTemplate.from_template(FOLLOW_UP_PROMPT_TEMPLATE).format(context=context_text, question=query_text)
+    if session.turns:
+        recap = "\n\n".join(f"Question: {turn.question}\nAnswer: {turn.answer}"
+                             for turn in session.turns[-SESSION_RECAP_TURNS:])
+        context_text = f"Earlier in this conversation:\n\n{recap}\n\n---\n\n{context_text}"
+    return build_prompt(query_text, context_text)
+
+
+@dataclass
+class PreparedQuery:
+    """Everything needed to answer a question, up to (but excluding) generation."""
+    question: str
+    retrieval_mode: str
+    query_embedding: Optional[List[float]] = None
+    # Answer cache entry name; see answer_cache_key
+    cache_key: Optional[str] = None
+    cached: Optional[CachedAnswer] = None
+    # Search results before context packing, so the prompt can be packed again for another model
+    retrieved: list = field(default_factory=list)
+    results: list = field(default_factory=list)
+    sources: List[dict] = field(default_factory=list)
+    prompt: Optional[str] = None
+    retrieval_time: float = 0.0
+    # Chunks/tokens used by the context builder (see context_builder.build_context)
+    context_stats: Dict[str, int] = field(default_factory=dict)
+    session: Optional[ConversationSession] = None
+    # Context tokens of the session sent back to Ollama with this turn
+    session_context_tokens: int = 0
+
+
+def answer_cache_key(model_name: str, retrieval_mode: Optional[str], vector_backend: Optional[str]) -> str:
+    """Cached answers are only reused for requests that generate and retrieve the same way."""
+    return f"{model_name}|{retrieval_mode or RETRIEVAL_MODE}|{vector_backend or VECTOR_BACKEND}"
+
+
+def prepare_query(query_text: str, db, model_name: str, use_cache: bool = False, retrieval_mode: Optional[str] = None,
+                  vector_backend: Optional[str] = None, session: Optional[ConversationSession] = None,
+                  cache_key: Optional[str] = None) -> PreparedQuery:
+    """
+    Embed the question, consult the answer cache, then retrieve and build the prompt.
+
+    Session turns skip the answer cache, since a follow-up depends on the
+    conversation, and leave out chunks the session already sent. The context
+    is packed for `model_name`'s token budget, and answers are cached under
+    `cache_key` (by default the model's name) together with the retrieval
+    mode and vector backend. Does not load the model.
+    """
+    start_time = time.perf_counter()
+    cache = _answer_cache if use_cache and session is None else None
+    prepared = PreparedQuery(question=query_text, retrieval_mode=resolve_retrieval_mode(query_text, retrieval_mode),
+                             session=session,
+                             cache_key=answer_cache_key(cache_key or model_name, retrieval_mode, vector_backend))
+
+    # Keyword lookups are answered without embedding (and so bypass the semantic cache)
+    if prepared.retrieval_mode == "lexical":
+        stage_start = time.perf_counter()
+        prepared.results = search(query_text, db, None, "lexical")
+        _stage_seconds["search"].observe(time.perf_counter() - stage_start)
+        # A keyword lookup with no matches falls back to hybrid retrieval
+        if not prepared.results and (retrieval_mode or RETRIEVAL_MODE) == "hybrid":
+            prepared.retrieval_mode = "hybrid"
+
+    if prepared.retrieval_mode != "lexical":
+        stage_start = time.perf_counter()
+        prepared.query_embedding = embed_query(query_text, db)
+        _stage_seconds["embedding"].observe(time.perf_counter() - stage_start)
+        if cache is not None:
+            stage_start = time.perf_counter()
+            prepared.cached = cache.lookup(prepared.query_embedding, prepared.cache_key)
+            _stage_seconds["cache_lookup"].observe(time.perf_counter() - stage_start)
+            if prepared.cached is not None:
+                prepared.sources = prepared.cached.sources
+                prepared.retrieval_time = time.perf_counter() - start_time
+                return prepared
+
+        # Search the DB.
+        stage_start = time.perf_counter()
+        prepared.results = search(query_text, db, prepared.query_embedding, prepared.retrieval_mode,
+                                  vector_backend=vector_backend)
+        _stage_seconds["search"].observe(time.perf_counter() - stage_start)
+
+    pack_prompt(prepared, model_name)
+    prepared.retrieval_time = time.perf_counter() - start_time
+    return prepared
+
+
+def prepare_queries(questions: List[str], db, model_name: str, use_cache: bool = False, retrieval_mode: Optional[str] = None,
+                    vector_backend: Optional[str] = None) -> List[PreparedQuery]:
+    """
+    `prepare_query` for many questions at once.
+
+    Questions that need vectors are embedded in one embedding request and
+    searched with one vector search; keyword lookups, answer cache lookups
+    and context packing still run per question. Every question reports the
+    time taken for the whole batch as its retrieval time.
+    """
+    start_time = time.perf_counter()
+    cache = _answer_cache if use_cache else None
+    key = answer_cache_key(model_name, retrieval_mode, vector_backend)
+    batch = [PreparedQuery(question=question, retrieval_mode=resolve_retrieval_mode(question, retrieval_mode), cache_key=key)
+             for question in questions]
+
+    for prepared in batch:
+        if prepared.retrieval_mode == "lexical":
+            prepared.results = search(prepared.question, db, None, "lexical")
+            if not prepared.results and (retrieval_mode or RETRIEVAL_MODE) == "hybrid":
+                prepared.retrieval_mode = "hybrid"
+
+    to_embed = [prepared for prepared in batch if prepared.retrieval_mode != "lexical"]
+    if to_embed:
+        stage_start = time.perf_counter()
+        embeddings = db.embeddings.embed_documents([prepared.question for prepared in to_embed])
+        _stage_seconds["embedding"].observe(time.perf_counter() - stage_start)
+        for prepared, embedding in zip(to_embed, embeddings):
+            prepared.query_embedding = list(embedding)
+            if cache is not None:
+                prepared.cached = cache.lookup(prepared.query_embedding, prepared.cache_key)
+                if prepared.cached is not None:
+                    prepared.sources = prepared.cached.sources
+
+        to_search = [prepared for prepared in to_embed if prepared.cached is None]
+        stage_start = time.perf_counter()
+        vectors = dense_vectors(vector_backend)
+        hybrid = any(prepared.retrieval_mode == "hybrid" for prepared in to_search)
+        candidates = RETRIEVAL_K * HYBRID_CANDIDATE_FACTOR if hybrid else RETRIEVAL_K
+        nearest = nearest_chunks_batch(db, [prepared.query_embedding for prepared in to_search], candidates, vectors)
+        for prepared, dense in zip(to_search, nearest):
+            if prepared.retrieval_mode == "hybrid":
+                prepared.results = hybrid_search(db, get_bm25_index(), prepared.question, prepared.query_embedding,
+                                                 RETRIEVAL_K, vectors=vectors, dense=dense)
+            else:
+                prepared.results = [(doc, distance, {}) for doc, distance in dense[:RETRIEVAL_K]]
+        _stage_seconds["search"].observe(time.perf_counter() - stage_start)
+
+    for prepared in batch:
+        if prepared.cached is None:
+            pack_prompt(prepared, model_name)
+    retrieval_time = time.perf_counter() - start_time
+    for prepared in batch:
+        prepared.retrieval_time = retrieval_time
+    return batch
+
+
+def pack_prompt(prepared: PreparedQuery, model_name: str):
+    """Pack the retrieved chunks into the prompt; sources list only the chunks actually used."""
+    prepared.retrieved = prepared.results
+    session = prepared.session
+    # Chunks this session already sent are still in Ollama's context
+    reused = []
+    if session is not None and session.has_context:
+        reused = [result for result in prepared.results if chunk_id(result[0]) in session.sent_chunks]
+        prepared.results = [result for result in prepared.results if chunk_id(result[0]) not in session.sent_chunks]
+
+    # Pack the context within the model's budget
+    stage_start = time.perf_counter()
+    prepared.results, context_text, prepared.context_stats = build_context(
+        prepared.results, context_token_budget(model_name), CONTEXT_MIN_RELATIVE_SCORE
+    )
+    prepared.sources = format_sources(reused + prepared.results, prepared.retrieval_mode)
+    _stage_seconds["context_packing"].observe(time.perf_counter() - stage_start)
+    stage_start = time.perf_counter()
+    if session is None:
+        prepared.prompt = build_prompt(prepared.question, context_text)
+    else:
+        prepared.context_stats["session_chunks_reused"] = len(reused)
+        prepared.session_context_tokens = len(session.context)
+        prepared.prompt = build_session_prompt(prepared.question, context_text, session)
+    _stage_seconds["prompt_formatting"].observe(time.perf_counter() - stage_start)
+
+
+def stream_tokens(model, prepared: PreparedQuery, collector: GenerationStatsCollector, deadline: Optional[Deadline]):
+    """
+    Stream the answer's tokens from Ollama, checking `deadline` between them.
+
+    Closing the stream closes the HTTP response, which makes Ollama stop
+    generating, so an expired or abandoned request stops within a token.
+    """
+    if deadline is not None:
+        deadline.check()
+    stream = model.stream(prepared.prompt, config={"callbacks": [collector]}, **generation_kwargs(prepared))
+    try:
+        for token in stream:
+            if deadline is not None:
+                deadline.check()
+            yield token
+    finally:
+        stream.close()
+
+
+def generation_kwargs(prepared: PreparedQuery) -> dict:
+    """Extra Ollama generate parameters: a session's context tokens to continue from."""
+    if prepared.session is not None and prepared.session.has_context:
+        return {"context": list(prepared.session.context)}
+    return {}
+
+
+def finish_session_turn(prepared: PreparedQuery, answer: str, collector: GenerationStatsCollector) -> dict:
+    """Record a completed session turn; returns the session's metrics for the response."""
+    session = prepared.session
+    if session is None:
+        return {}
+    _sessions.record_turn(session, prepared.question, answer, collector.context,
+                          [chunk_id(doc) for doc, _score, _extras in prepared.results])
+    return {
+        "session_id": session.id,
+        "session_turn": len(session.turns),
+        "session_context_tokens": prepared.session_context_tokens,
+    }
+
+
+def record_generation(prepared: PreparedQuery, model_name: str, stats: Optional[GenerationStats],
+                      estimated_tokens: int, seconds: float):
+    """
+    Update the generation metrics once an answer is complete.
+
+    Token rates come from Ollama's eval count and duration; the estimate and
+    wall time are only used when the model reported no statistics.
+    """
+    _stage_seconds["generation"].observe(seconds)
+    tokens = estimated_tokens
+    if stats is not None and stats.generation_time:
+        tokens, seconds = stats.generated_tokens, stats.generation_time
+    _queries.labels(prepared.retrieval_mode, "false").inc()
+    _generated_tokens.labels(model_name).inc(tokens)
+    _generation_seconds.labels(model_name).inc(seconds)
+    if seconds > 0:
+        _token_rate.labels(model_name).observe(tokens / seconds)
+
+
+def store_answer(prepared: PreparedQuery, model_name: str, answer: str, use_cache: bool):
+    if use_cache and _answer_cache is not None and prepared.query_embedding is not None:
+        _answer_cache.store(prepared.question, prepared.query_embedding, prepared.cache_key or model_name, answer,
+                            prepared.sources)
+
+
+def query_rag(query_text: str, db, model, return_metrics: bool = False, use_cache: bool = False,
+              retrieval_mode: Optional[str] = None, vector_backend: Optional[str] = None,
+              session: Optional[ConversationSession] = None, deadline: Optional[Deadline] = None):
+    """
+    Query the RAG system and return response with sources.
+
+    With `use_cache=True` the semantic answer cache is consulted first and
+    fresh answers are stored in it. Benchmarks leave it off so they always
+    measure a real retrieval + generation. `vector_backend` overrides
+    VECTOR_BACKEND for the dense search. With a `session` the question is a
+    turn of that conversation, which the caller must have claimed (see
+    `claim_turn`). Generation stops with RequestCancelled once `deadline`
+    passes or is cancelled.
+    """
+    if session is not None:
+        session.use_model(model.model)
+    start_time = time.perf_counter()
+    prepared = prepare_query(query_text, db, model.model, use_cache, retrieval_mode, vector_backend, session)
+
+    if prepared.cached is not None:
+        _queries.labels(prepared.retrieval_mode, "true").inc()
+        if return_metrics:
+            return prepared.cached.answer, prepared.sources, {"response_time": time.perf_counter() - start_time, "cache_hit": True}
+        return prepared.cached.answer, prepared.sources
+
+    response_text, generation_metrics = generate_answer(prepared, model, use_cache, deadline)
+    query_time = time.perf_counter() - start_time
 
-    response_text = model.invoke(prompt)
-    
-    query_time = time.time() - start_time
-    
     if return_metrics:
-        return response_text, sources, {"response_time": query_time}
+        return response_text, prepared.sources, {
+            "response_time": query_time,
+            "retrieval_time": prepared.retrieval_time,
+            **generation_metrics,
+        }
     
-    return response_text, sources
+    return response_text, prepared.sources
+
+
+def generate_answer(prepared: PreparedQuery, model, use_cache: bool = False, deadline: Optional[Deadline] = None):
+    """
+    Generate the answer to a prepared, uncached question. Returns (answer, metrics).
+
+    With a `deadline` the answer is streamed from Ollama, so the generation
+    can be stopped part-way (see `stream_tokens`).
+    """
+    collector = GenerationStatsCollector()
+    generation_start = time.perf_counter()
+    if deadline is None:
+        response_text = model.invoke(prepared.prompt, config={"callbacks": [collector]}, **generation_kwargs(prepared))
+    else:
+        response_text = "".join(stream_tokens(model, prepared, collector, deadline))
+    generation_time = time.perf_counter() - generation_start
+    record_generation(prepared, model.model, collector.stats, estimate_tokens(response_text), generation_time)
+
+    store_answer(prepared, model.model, response_text, use_cache)
+
+    return response_text, {
+        "retrieval_mode": prepared.retrieval_mode,
+        "cache_hit": False,
+        **prepared.context_stats,
+        **finish_session_turn(prepared, response_text, collector),
+        # Prompt/generation token counts, rates and load time as reported by Ollama
+        **(collector.stats.as_metrics() if collector.stats else {"generation_time": generation_time}),
+    }
+
+
+def stream_query_rag(query_text: str, db, model, use_cache: bool = False, retrieval_mode: Optional[str] = None,
+                     vector_backend: Optional[str] = None, session: Optional[ConversationSession] = None,
+                     deadline: Optional[Deadline] = None):
+    """
+    Query the RAG system, yielding events as they become available.
+
+    Sources are yielded first (as soon as retrieval finishes), followed by one
+    event per generated token and a final event carrying the timings:
+        {"type": "sources", "sources": [...]}
+        {"type": "token", "content": "..."}
+        {"type": "done", "metrics": {...}}
+
+    Generation stops with RequestCancelled once `deadline` passes or is
+    cancelled; closing the generator early stops it too. A `session` turn
+    must have been claimed by the caller, as for `query_rag`.
+    """
+    if session is not None:
+        session.use_model(model.model)
+    start_time = time.perf_counter()
+    prepared = prepare_query(query_text, db, model.model, use_cache, retrieval_mode, vector_backend, session)
+    yield {"type": "sources", "sources": prepared.sources}
+
+    if prepared.cached is not None:
+        _queries.labels(prepared.retrieval_mode, "true").inc()
+        elapsed = time.perf_counter() - start_time
+        yield {"type": "token", "content": prepared.cached.answer}
+        yield {
+            "type": "done",
+            "metrics": {
+                "retrieval_time": prepared.retrieval_time,
+                "time_to_first_token": elapsed,
+                "response_time": elapsed,
+                "cache_hit": True,
+            },
+        }
+        return
+
+    time_to_first_token = None
+    tokens = []
+    collector = GenerationStatsCollector()
+    generation_start = time.perf_counter()
+    for token in stream_tokens(model, prepared, collector, deadline):
+        if not token:
+            continue
+        if time_to_first_token is None:
+            time_to_first_token = time.perf_counter() - start_time
+            _time_to_first_token.labels(model.model).observe(time_to_first_token)
+        tokens.append(token)
+        yield {"type": "token", "content": token}
+    generation_time = time.perf_counter() - generation_start
+    # Ollama streams roughly one token per chunk
+    record_generation(prepared, model.model, collector.stats, len(tokens), generation_time)
+
+    # Only completed generations are cached or continued by a session
+    answer = "".join(tokens)
+    store_answer(prepared, model.model, answer, use_cache)
+    session_metrics = finish_session_turn(prepared, answer, collector)
+
+    yield {
+        "type": "done",
+        "metrics": {
+            "retrieval_time": prepared.retrieval_time,
+            "time_to_first_token": time_to_first_token,
+            "response_time": time.perf_counter() - start_time,
+            "retrieval_mode": prepared.retrieval_mode,
+            "cache_hit": False,
+            **prepared.context_stats,
+            **session_metrics,
+            **(collector.stats.as_metrics() if collector.stats else {"generation_time": generation_time}),
+        },
+    }
 
 
 @app.get("/")
@@ -149,64 +908,168 @@ def health_check():
     }
 
 
-@app.get("/api/pdf")
-async def serve_pdf(file: str):
-    """Serve PDF files from the data directory."""
-    if not file:
-        raise HTTPException(status_code=400, detail="File parameter is required")
-    
-    # Decode URL-encoded path
-    from urllib.parse import unquote
-    file_path_input = unquote(file)
-    
-    # Get absolute paths for security checks
-    project_root = os.path.abspath(os.path.dirname(__file__))
-    data_path = os.path.abspath(os.path.join(project_root, DATA_PATH))
-    
-    # Normalize path separators (handle both Windows and Unix)
-    file_path_input = file_path_input.replace("\\", os.sep).replace("/", os.sep)
-    
-    # Handle the file path
-    if os.path.isabs(file_path_input):
-        # If absolute path provided, normalize it
-        file_path = os.path.normpath(file_path_input)
-    else:
-        # If relative path, resolve relative to project root first
-        file_path = os.path.normpath(os.path.join(project_root, file_path_input))
-        
-        # If file doesn't exist, try with just the filename in data directory
-        if not os.path.exists(file_path):
-            filename = os.path.basename(file_path_input)
-            file_path = os.path.normpath(os.path.join(data_path, filename))
-    
-    # Convert to absolute path for security check
-    file_path = os.path.abspath(file_path)
-    data_path_abs = os.path.abspath(data_path)
-    
-    # Security check: ensure file is within data directory
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness probe: per-component state and init timings.
+
+    Returns 503 until the components initialized at startup are warm and
+    Ollama is reachable, so orchestrators only route traffic to warm replicas.
+    """
     try:
-        # Check that the file path is within the data directory
-        common_path = os.path.commonpath([file_path, data_path_abs])
-        if common_path != data_path_abs:
-            raise HTTPException(status_code=403, detail="Access denied: file must be in data directory")
-    except (ValueError, OSError) as e:
-        # Paths don't share a common path or other error
-        raise HTTPException(status_code=403, detail="Access denied: invalid path")
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"PDF file not found: {os.path.basename(file_path)}")
-    
-    if not file_path.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="File must be a PDF")
-    
-    return FileResponse(
-        file_path,
+        _residency.refresh(force=True)
+        ollama_state = {"state": READY, "error": None}
+        # Models loaded after a failed preload (e.g. Ollama started later) count as warm
+        if not _readiness.is_ready("models") and all(_residency.is_loaded(name) for name in PRELOAD_MODELS):
+            _readiness.set_state("models", READY, error=None)
+    except Exception as e:
+        ollama_state = {"state": "failed", "error": str(e)}
+    report = _readiness.report()
+    report["components"]["ollama"] = ollama_state
+    report["ready"] = report["ready"] and ollama_state["state"] == READY
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(_metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/cache/stats")
+def answer_cache_stats():
+    """Hit/miss counters and occupancy of the semantic answer cache."""
+    if _answer_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **_answer_cache.stats()}
+
+
+@app.delete("/api/cache")
+def clear_answer_cache():
+    """Drop every cached answer."""
+    if _answer_cache is not None:
+        _answer_cache.clear()
+    return {"status": "cleared"}
+
+
+@app.get("/api/routing/stats")
+def routing_stats():
+    """Answers per cascade route, their mean latency and the reasons behind the decisions."""
+    return {"routing": MODEL_ROUTING, **_router.stats()}
+
+
+@app.post("/api/sessions", status_code=201)
+def create_session():
+    """Start a conversation; pass the returned session_id with each question."""
+    return _sessions.create(_model_name).to_dict()
+
+
+@app.get("/api/sessions")
+def session_stats():
+    return _sessions.stats()
+
+
+@app.get("/api/sessions/{session_id}")
+def get_session_status(session_id: str):
+    session = _sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.to_dict()
+
+
+@app.delete("/api/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not _sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"status": "deleted"}
+
+
+@app.get("/api/models/residency")
+def model_residency_status():
+    """Models loaded on the Ollama server, their sizes and cold-load counters."""
+    try:
+        _residency.refresh(force=True)
+    except Exception as e:
+        return {"error": f"Could not reach Ollama: {str(e)}", **_residency.status()}
+    return _residency.status()
+
+
+def pdf_response(request: Request, path: str, filename: str, etag: str, last_modified: str, mtime: float) -> Response:
+    """Send a PDF, answering conditional GETs with 304 and a single Range with 206."""
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={PDF_CACHE_MAX_AGE}",
+        "Content-Disposition": f'inline; filename="{filename}"',
+    }
+    if not_modified(request.headers, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if range_applies(request.headers, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type="application/pdf", headers=headers)
+
+    start, end = byte_range
+    content = read_range(path, start, end)
+    return Response(
+        content=content,
+        status_code=206,
         media_type="application/pdf",
-        filename=os.path.basename(file_path),
-        headers={"Content-Disposition": f'inline; filename="{os.path.basename(file_path)}"'}
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
     )
 
 
+def resolve_pdf(file: str) -> str:
+    """Absolute path of an indexed PDF under DATA_PATH, or an HTTPException."""
+    if not file:
+        raise HTTPException(status_code=400, detail="File parameter is required")
+    if not file.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    # Only files found by scanning DATA_PATH are served, so paths outside it never resolve
+    path = _pdf_library.resolve(unquote(file))
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"PDF file not found: {os.path.basename(unquote(file))}")
+    return path
+
+
+@app.get("/api/pdf")
+def serve_pdf(file: str, request: Request):
+    """Serve PDF files from the data directory, with ETag/Last-Modified and byte ranges."""
+    path = resolve_pdf(file)
+    etag, last_modified, mtime = validators(path)
+    return pdf_response(request, path, os.path.basename(path), etag, last_modified, mtime)
+
+
+@app.get("/api/pdf/page")
+def serve_pdf_page(file: str, page: int, request: Request):
+    """
+    Serve one page (0-based, as in a source's metadata["page"]) as a small PDF.
+
+    Extracted pages are kept in an LRU disk cache; a conditional GET for an
+    unchanged page is answered without extracting anything.
+    """
+    path = resolve_pdf(file)
+    if page < 0:
+        raise HTTPException(status_code=400, detail="Page must be 0 or greater")
+    etag, last_modified, mtime = validators(path, variant=f"-p{page}")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    filename = f"{stem}-page-{page + 1}.pdf"
+    if not_modified(request.headers, etag, mtime):
+        return pdf_response(request, path, filename, etag, last_modified, mtime)
+    try:
+        page_path = _page_cache.get(path, page)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return pdf_response(request, page_path, filename, etag, last_modified, mtime)
+
+
 class BenchmarkRequest(BaseModel):
     # Optional free-form list of test queries (kept for backwards compatibility)
     test_queries: List[str] = ["What is autism?", "What are the symptoms of autism?", "How is autism diagnosed?"]
@@ -223,62 +1086,599 @@ class OptimizationRequest(BaseModel):
     question: Optional[str] = None
 
 
+def get_session(session_id: Optional[str], model_name: str) -> Optional[ConversationSession]:
+    if session_id is None:
+        return None
+    if not session_id or len(session_id) > 128:
+        raise HTTPException(status_code=400, detail="session_id must be 1-128 characters")
+    return _sessions.get_or_create(session_id, model_name)[0]
+
+
+def request_deadline(timeout: Optional[float]) -> Deadline:
+    """Deadline of a query asking for `timeout` seconds, within REQUEST_TIMEOUT."""
+    if timeout is not None and timeout <= 0:
+        raise HTTPException(status_code=400, detail="timeout must be positive")
+    if REQUEST_TIMEOUT > 0:
+        timeout = min(timeout or REQUEST_TIMEOUT, REQUEST_TIMEOUT)
+    return Deadline(timeout)
+
+
+def claim_turn(session: Optional[ConversationSession]):
+    """Claim `session` for a turn, or answer 409 while another of its turns is running."""
+    if session is not None and not session.begin_turn():
+        raise HTTPException(status_code=409, detail="Another turn of this session is still running")
+
+
+async def acquire_for_turn(model_name: str, deadline: Deadline, session: Optional[ConversationSession]):
+    """
+    Claim `session` (if any), then acquire a slot of `model_name` within `deadline`.
+
+    The claim is taken first, so a concurrent turn never holds a slot while
+    it waits, and it lasts until the slot is released, i.e. until the worker
+    running the turn has returned.
+    """
+    claim_turn(session)
+    try:
+        slot = await _inference_pool.acquire(model_name, timeout=deadline.remaining())
+    except BaseException:
+        if session is not None:
+            session.end_turn()
+        raise
+    if session is not None:
+        slot.on_release(session.end_turn)
+    return slot
+
+
+async def run_within(model_name: str, deadline: Deadline, func, *args,
+                     session: Optional[ConversationSession] = None):
+    """
+    Run a blocking call on a slot of `model_name` within `deadline`. Returns (result, slot).
+
+    Waiting for the slot counts against the deadline. If the caller is
+    cancelled, the deadline is cancelled so the generation stops. With a
+    `session`, the call is a turn of it (see `acquire_for_turn`).
+    """
+    slot = await acquire_for_turn(model_name, deadline, session)
+    return await _inference_pool.run_in_slot(slot, func, *args, deadline=deadline), slot
+
+
+async def until_disconnected(http_request: Request, work: asyncio.Future):
+    """Await `work`, cancelling it and answering 499 if the client disconnects first."""
+    while True:
+        done, _pending = await asyncio.wait({work}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return work.result()
+        if await http_request.is_disconnected():
+            work.cancel()
+            _cancelled_requests.labels("client_disconnected").inc()
+            raise HTTPException(status_code=499, detail="Client closed request")
+
+
+async def cascade_query(question: str, retrieval_mode: Optional[str], vector_backend: Optional[str],
+                        deadline: Deadline):
+    """
+    Answer through the cascade router.
+
+    Retrieval runs once. The router then picks the small or the large model
+    from the search results; a small answer failing the router's check is
+    regenerated by the large model with the prompt packed for its budget.
+    Each generation holds a slot of the model it runs on. Returns (answer, sources, metrics).
+    """
+    start_time = time.perf_counter()
+    db = await _inference_pool.run_in_worker(get_db)
+    # Packed for the small model; only the model that ends up generating is loaded
+    prepared = await _inference_pool.run_in_worker(
+        prepare_query, question, db, _router.small_model, True, retrieval_mode, vector_backend, None, _router.cache_key
+    )
+    if prepared.cached is not None:
+        _queries.labels(prepared.retrieval_mode, "true").inc()
+        return prepared.cached.answer, prepared.sources, {"response_time": time.perf_counter() - start_time, "cache_hit": True}
+
+    decision = _router.route(question, prepared.retrieved)
+    route, reason = decision.route, decision.reason
+    route_metrics = decision.as_metrics()
+    answer = None
+    queue_time = 0.0
+    if route == SMALL:
+        def answer_with_small_model():
+            return generate_answer(prepared, get_model(_router.small_model), False, deadline)
+
+        (answer, metrics), slot = await run_within(_router.small_model, deadline, answer_with_small_model)
+        queue_time += slot.queue_time
+        escalation = _router.check_answer(answer, prepared.results)
+        if escalation is None:
+            store_answer(prepared, _router.small_model, answer, True)
+        else:
+            route, reason, answer = ESCALATED, escalation, None
+            route_metrics.update(route=route, escalation_reason=escalation,
+                                 small_generation_time=metrics.get("generation_time"))
+
+    if answer is None:
+        def answer_with_large_model():
+            prepared.results = prepared.retrieved
+            pack_prompt(prepared, _router.large_model)
+            return generate_answer(prepared, get_model(_router.large_model), True, deadline)
+
+        (answer, metrics), slot = await run_within(_router.large_model, deadline, answer_with_large_model)
+        queue_time += slot.queue_time
+
+    response_time = time.perf_counter() - start_time
+    _router.record(route, reason, response_time)
+    _route_duration.labels(route).observe(response_time)
+    return answer, prepared.sources, {
+        "response_time": response_time,
+        "queue_time": queue_time,
+        "service_time": response_time - queue_time,
+        "retrieval_time": prepared.retrieval_time,
+        **metrics,
+        **route_metrics,
+        "model": _router.small_model if route == SMALL else _router.large_model,
+    }
+
+
+def coalescing_key(kind: str, question: str, model_name: str, retrieval_mode: Optional[str],
+                   vector_backend: Optional[str]) -> tuple:
+    """Requests with equal keys get the same answer, so concurrent ones can share it."""
+    return (kind, normalize_question(question), model_name, retrieval_mode or RETRIEVAL_MODE,
+            vector_backend or VECTOR_BACKEND)
+
+
 @app.post("/api/query", response_model=QueryResponse)
-async def query(request: QueryRequest):
-    """Query the RAG system with a question."""
+async def query(request: QueryRequest, http_request: Request):
+    """
+    Query the RAG system with a question.
+
+    The answer must be ready within the request's deadline (`timeout`, at
+    most REQUEST_TIMEOUT), queueing included, or the request fails with 504.
+    When the queue ahead would outlast the deadline, it fails straight away
+    with 503 and Retry-After. If the client disconnects, the generation is
+    stopped unless identical requests are still waiting for it.
+    """
     if not request.question or not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
+    if request.retrieval_mode and request.retrieval_mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"retrieval_mode must be one of: {', '.join(RETRIEVAL_MODES)}")
+    if request.vector_backend and request.vector_backend not in VECTOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"vector_backend must be one of: {', '.join(VECTOR_BACKENDS)}")
+    if request.routing and request.routing not in ROUTING_MODES:
+        raise HTTPException(status_code=400, detail=f"routing must be one of: {', '.join(ROUTING_MODES)}")
+
+    question = request.question.strip()
+    model_name = _model_name
+    session = get_session(request.session_id, model_name)
+    # Sessions stay on one model: Ollama context tokens only mean something to the model that produced them
+    cascade = (request.routing or MODEL_ROUTING) == "cascade" and session is None
+    deadline = request_deadline(request.timeout)
+
+    def answer_question():
+        return query_rag(question, get_db(), get_model(model_name), return_metrics=True, use_cache=True,
+                         retrieval_mode=request.retrieval_mode, vector_backend=request.vector_backend,
+                         session=session, deadline=deadline)
+
+    async def answer():
+        if cascade:
+            return await cascade_query(question, request.retrieval_mode, request.vector_backend, deadline)
+        (answer_text, sources, metrics), slot = await run_within(model_name, deadline, answer_question, session=session)
+        return answer_text, sources, {**metrics, "queue_time": slot.queue_time, "service_time": slot.service_time}
+
+    async def coalesced_answer():
+        key = coalescing_key("query", question, _router.cache_key if cascade else model_name,
+                             request.retrieval_mode, request.vector_backend)
+        # Identical requests share the first one's answer, and so its deadline
+        (answer_text, sources, metrics), coalesced = await _coalescer.run(key, answer)
+        return answer_text, sources, {**metrics, "coalesced": True} if coalesced else metrics
+
+    # Session turns depend on their conversation, so only stateless questions are coalesced
+    work = asyncio.ensure_future(answer() if _coalescer is None or session is not None else coalesced_answer())
+    try:
+        answer_text, sources, metrics = await until_disconnected(http_request, work)
+        return QueryResponse(answer=answer_text, sources=sources, metrics=metrics)
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+    except RequestCancelled as e:
+        _cancelled_requests.labels(e.reason).inc()
+        raise HTTPException(status_code=504, detail=f"Error processing query: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+
+@app.post("/api/query/stream")
+async def query_stream(request: QueryRequest):
+    """
+    Query the RAG system and stream the answer back as NDJSON.
+
+    Each line is a JSON event (see `stream_query_rag`). Errors raised after the
+    stream has started are reported as a final {"type": "error"} event.
+    Identical questions streamed at the same time share one generation; a
+    request joining late first receives the events sent so far. Generation
+    stops when the client disconnects or the deadline (`timeout`, at most
+    REQUEST_TIMEOUT) passes; the `done` event reports `queue_time` apart
+    from the time spent answering.
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    if request.retrieval_mode and request.retrieval_mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"retrieval_mode must be one of: {', '.join(RETRIEVAL_MODES)}")
+    if request.vector_backend and request.vector_backend not in VECTOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"vector_backend must be one of: {', '.join(VECTOR_BACKENDS)}")
+    if request.routing == "cascade":
+        # A streamed small answer cannot be taken back once it fails the router's check
+        raise HTTPException(status_code=400, detail="routing=cascade is only supported by /api/query")
+
+    question = request.question.strip()
+    model_name = _model_name
+    session = get_session(request.session_id, model_name)
+    deadline = request_deadline(request.timeout)
+
+    async def event_lines(events, release=None, extra_metrics: Optional[dict] = None,
+                          deadline: Optional[Deadline] = None):
+        finished = False
+        try:
+            async for event in events:
+                if extra_metrics and event["type"] == "done":
+                    event = {**event, "metrics": {**event["metrics"], **extra_metrics}}
+                yield json.dumps(event) + "\n"
+            finished = True
+        except Exception as e:
+            finished = True
+            if isinstance(e, RequestCancelled):
+                _cancelled_requests.labels(e.reason).inc()
+            yield json.dumps({"type": "error", "detail": f"Error processing query: {str(e)}"}) + "\n"
+        finally:
+            if deadline is not None and not finished:
+                # The client went away mid-stream: stop generating for nobody
+                _cancelled_requests.labels("client_disconnected").inc()
+                deadline.cancel("client_disconnected")
+            if release is not None:
+                release()
+
+    # Session turns depend on their conversation, so only stateless questions are coalesced
+    key = None
+    if _coalescer is not None and session is None:
+        key = coalescing_key("stream", question, model_name, request.retrieval_mode, request.vector_backend)
+        shared = _coalescer.stream(key)
+        if shared is not None:
+            return StreamingResponse(event_lines(shared, extra_metrics={"coalesced": True}),
+                                     media_type="application/x-ndjson", background=BackgroundTask(shared.aclose))
+
+    # Reserve the model slot before responding so overload can still return a 503.
+    try:
+        slot = await acquire_for_turn(model_name, deadline, session)
+    except QueueFullError as e:
+        raise queue_full_exception(e)
 
     try:
-        db = get_db()
-        model = get_model()
-        answer, sources = query_rag(request.question.strip(), db, model)
-        return QueryResponse(answer=answer, sources=sources)
+        db = await _inference_pool.run_in_worker(get_db)
+        model = await _inference_pool.run_in_worker(get_model, model_name)
     except Exception as e:
+        slot.release()
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+    if key is not None:
+        # An identical question may have started while this one waited for its slot
+        shared = _coalescer.stream(key)
+        if shared is not None:
+            slot.release()
+            return StreamingResponse(event_lines(shared, extra_metrics={"coalesced": True}),
+                                     media_type="application/x-ndjson", background=BackgroundTask(shared.aclose))
+
+    events = _inference_pool.iterate(stream_query_rag(
+        question, db, model, use_cache=True, retrieval_mode=request.retrieval_mode,
+        vector_backend=request.vector_backend, session=session, deadline=deadline,
+    ), slot)
+    queue_metrics = {"queue_time": slot.queue_time}
+    if key is not None:
+        def finish_shared():
+            # Stops the generation if every listener has left; harmless once it completed.
+            # The slot is freed once the worker's current call has returned.
+            deadline.cancel()
+            slot.release()
+
+        # The slot is held until the shared generation ends, whoever is still listening.
+        # Closing the subscription in the background covers a client leaving before streaming starts.
+        subscription = _coalescer.start_stream(key, events, on_finish=finish_shared)
+        return StreamingResponse(
+            event_lines(subscription, extra_metrics=queue_metrics),
+            media_type="application/x-ndjson",
+            background=BackgroundTask(subscription.aclose),
+        )
 
-@app.post("/api/benchmark/baseline")
-async def benchmark_baseline(request: BenchmarkRequest):
-    """Run baseline benchmark on the current question using the baseline model."""
+    # The background release covers clients that disconnect before streaming starts;
+    # releasing waits for a generation step still running in a worker.
+    return StreamingResponse(
+        event_lines(events, release=slot.release, extra_metrics=queue_metrics, deadline=deadline),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(slot.release),
+    )
+
+
+@app.post("/api/query/batch")
+async def query_batch(request: BatchQueryRequest):
+    """
+    Answer many questions, streaming one NDJSON event per answer as it completes.
+
+    All questions are embedded and searched together, then answers are
+    generated concurrently, at most `concurrency` (and MODEL_CONCURRENCY) at
+    a time. Events arrive in completion order, each tagged with the
+    question's index:
+        {"type": "answer", "index": 0, "question": "...", "answer": "...", "sources": [...], "metrics": {...}}
+        {"type": "error", "index": 1, "question": "...", "detail": "..."}
+        {"type": "done", "metrics": {...}}
+    A question shed by a full model queue gets an error event with the
+    server's "retry_after" seconds instead of an answer. Questions still
+    unanswered when the batch's deadline (`timeout`, at most REQUEST_TIMEOUT)
+    passes get error events, and generation stops if the client disconnects.
+    """
+    questions = [question.strip() for question in request.questions]
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if not all(questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch")
+    if request.retrieval_mode and request.retrieval_mode not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"retrieval_mode must be one of: {', '.join(RETRIEVAL_MODES)}")
+    if request.vector_backend and request.vector_backend not in VECTOR_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"vector_backend must be one of: {', '.join(VECTOR_BACKENDS)}")
+
+    model_name = _model_name
+    concurrency = max(1, min(request.concurrency or _inference_pool.per_model_limit, _inference_pool.per_model_limit))
+    deadline = request_deadline(request.timeout)
     try:
-        db = get_db()
-        model = get_model(BASE_MODEL_NAME)
+        db = await _inference_pool.run_in_worker(get_db)
+        model = await _inference_pool.run_in_worker(get_model, model_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
-        # Determine the question to benchmark on
-        question = (request.question or (request.test_queries[0] if request.test_queries else "What is autism?")).strip()
-        if not question:
-            raise HTTPException(status_code=400, detail="Question for benchmark cannot be empty")
+    async def answer(index: int, prepared: PreparedQuery, start_time: float, limit: asyncio.Semaphore) -> dict:
+        event = {"index": index, "question": prepared.question}
+        try:
+            if prepared.cached is not None:
+                _queries.labels(prepared.retrieval_mode, "true").inc()
+                text, metrics = prepared.cached.answer, {"cache_hit": True}
+            else:
+                async with limit:
+                    slot = await _inference_pool.acquire(model_name, timeout=deadline.remaining())
+                    text, metrics = await _inference_pool.run_in_slot(
+                        slot, generate_answer, prepared, model, True, deadline, deadline=deadline
+                    )
+                metrics["queue_time"] = slot.queue_time
+        except QueueFullError as e:
+            return {"type": "error", **event, "detail": f"Server busy: {str(e)}", "retry_after": e.retry_after}
+        except RequestCancelled as e:
+            _cancelled_requests.labels(e.reason).inc()
+            return {"type": "error", **event, "detail": f"Error processing query: {str(e)}"}
+        except Exception as e:
+            return {"type": "error", **event, "detail": f"Error processing query: {str(e)}"}
+        return {
+            "type": "answer",
+            **event,
+            "answer": text,
+            "sources": prepared.sources,
+            "metrics": {
+                "retrieval_time": prepared.retrieval_time,
+                "response_time": time.perf_counter() - start_time,
+                **metrics,
+            },
+        }
 
-        def query_func(q: str):
-            # Always benchmark on the chosen question, not on q
-            answer, _ = query_rag(question, db, model)
-            return answer
+    async def event_lines():
+        start_time = time.perf_counter()
+        try:
+            batch = await _inference_pool.run_in_worker(
+                prepare_queries, questions, db, model_name, True, request.retrieval_mode, request.vector_backend
+            )
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": f"Error processing query: {str(e)}"}) + "\n"
+            return
+
+        limit = asyncio.Semaphore(concurrency)
+        tasks = [asyncio.create_task(answer(index, prepared, start_time, limit)) for index, prepared in enumerate(batch)]
+        errors = 0
+        finished = False
+        try:
+            for completed in asyncio.as_completed(tasks):
+                event = await completed
+                if event["type"] == "error":
+                    errors += 1
+                yield json.dumps(event) + "\n"
+            finished = True
+        finally:
+            if not finished:
+                # The client went away: drop the questions still waiting for a slot, and
+                # cancel the deadline so the generations in worker threads stop at their next token
+                _cancelled_requests.labels("client_disconnected").inc()
+                deadline.cancel("client_disconnected")
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({
+            "type": "done",
+            "metrics": {
+                "questions": len(batch),
+                "errors": errors,
+                "cache_hits": sum(1 for prepared in batch if prepared.cached is not None),
+                "retrieval_time": batch[0].retrieval_time,
+                "response_time": time.perf_counter() - start_time,
+            },
+        }) + "\n"
 
-        result = _optimizer.benchmark_model(
-            model_name=BASE_MODEL_NAME,
-            query_func=query_func,
-            test_queries=[question],
-            technique="baseline",
-        )
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+
+def quantized_model_name(quantization_level: str) -> str:
+    """Map a quantization level to a pre-quantized model available in Ollama."""
+    quant_model_map = {
+        "q4_0": "mistral:7b-instruct-q4_0",   # 4.1GB - Real quantized Mistral model
+        "q5_0": "llama3.2:3b",   # 2.0GB - Alternative smaller model
+        "q8_0": "llama3.2:1b-instruct-q4_0"   # 770MB - Very small quantized model
+    }
+    
+    # Get quantized model name from map, fallback to template if custom
+    quant_model_name = quant_model_map.get(quantization_level)
+    if not quant_model_name:
+        # Try template format as fallback (for custom quantization levels)
+        try:
+            quant_model_name = QUANT_MODEL_TEMPLATE.format(level=quantization_level)
+        except (KeyError, ValueError):
+            # If template doesn't support {level}, use the default quantized model
+            quant_model_name = QUANT_MODEL_TEMPLATE if "{level}" not in QUANT_MODEL_TEMPLATE else "mistral:7b-instruct-q4_0"
+    return quant_model_name
+
+
+def pruned_model_name(pruning_ratio: float) -> str:
+    if PRUNED_MODEL_NAME:
+        return PRUNED_MODEL_NAME
+    # Fallback: construct a name; user must ensure this model exists in Ollama
+    return f"{BASE_MODEL_NAME}-pruned-{int(pruning_ratio * 100)}"
+
+
+def job_progress(job: Optional[BenchmarkJob], start: float, end: float, label: str):
+    """Progress callback mapping a benchmark's iterations onto [start, end] of the job."""
+    if job is None:
+        return None
+
+    def callback(completed: int, total: int):
+        job.raise_if_cancelled()
+        job.report(start + (end - start) * completed / total, f"{label}: {completed}/{total} iterations")
+
+    return callback
+
+
+async def benchmark_model_on_question(model_name: str, question: str, technique: str,
+                                      baseline: Optional["OptimizationResult"] = None,
+                                      progress_callback=None) -> "OptimizationResult":
+    """Benchmark retrieval + generation with `model_name` on one question, holding a slot for the model."""
+    db = await _inference_pool.run_in_worker(get_db)
+    model = await _inference_pool.run_in_worker(get_model, model_name)
+
+    def query_func(q: str):
+        # Always benchmark on the chosen question, not on q
+        answer, _, query_metrics = query_rag(question, db, model, return_metrics=True)
+        return answer, query_metrics
+
+    return await _inference_pool.run(
+        model_name,
+        get_optimizer().benchmark_model,
+        model_name=model_name,
+        query_func=query_func,
+        test_queries=[question],
+        technique=technique,
+        baseline=baseline,
+        progress_callback=progress_callback,
+    )
 
-        global _baseline_metrics
-        _baseline_metrics = result.metrics
 
+async def run_benchmark(technique: str, question: str, quantization_level: Optional[str] = None,
+                        pruning_ratio: Optional[float] = None, job: Optional[BenchmarkJob] = None,
+                        baseline_max_age: Optional[float] = None) -> dict:
+    """
+    Benchmark the baseline model and, for "quantization" or "pruning", the
+    variant compared against it. Returns the benchmark endpoints' payload.
+
+    Variants reuse a baseline of the same question measured within
+    `baseline_max_age` seconds (default BENCHMARK_BASELINE_MAX_AGE); an
+    explicit "baseline" benchmark always measures anew.
+    """
+    global _baseline_metrics
+    if baseline_max_age is None:
+        baseline_max_age = BENCHMARK_BASELINE_MAX_AGE
+    baseline_result = None
+    if technique != "baseline":
+        baseline_result = await _inference_pool.run_in_worker(
+            get_optimizer().fresh_baseline, BASE_MODEL_NAME, question, baseline_max_age
+        )
+    baseline_reused = baseline_result is not None
+    if baseline_result is None:
+        baseline_end = 1.0 if technique == "baseline" else 0.5
+        baseline_result = await benchmark_model_on_question(
+            BASE_MODEL_NAME, question, "baseline",
+            progress_callback=job_progress(job, 0.0, baseline_end, f"Baseline ({BASE_MODEL_NAME})"),
+        )
+    _baseline_metrics = baseline_result.metrics
+    if technique == "baseline":
         return {
             "technique": "baseline",
             "model_name": BASE_MODEL_NAME,
-            "metrics": {
-                "response_time": result.metrics.response_time,
-                "memory_usage_mb": result.metrics.memory_usage_mb,
-                "cpu_usage_percent": result.metrics.cpu_usage_percent,
-                "tokens_per_second": result.metrics.tokens_per_second,
-                "model_size_mb": result.metrics.model_size_mb,
-                "latency_p50": result.metrics.latency_p50,
-                "latency_p95": result.metrics.latency_p95,
-                "latency_p99": result.metrics.latency_p99,
-            },
+            "metrics": asdict(baseline_result.metrics),
         }
+
+    if technique == "quantization":
+        model_name = quantized_model_name(quantization_level or "q4_0")
+        settings = {"quantization_level": quantization_level or "q4_0"}
+    else:
+        model_name = pruned_model_name(pruning_ratio or 0.3)
+        settings = {"pruning_ratio": pruning_ratio or 0.3}
+    result = await benchmark_model_on_question(
+        model_name, question, technique, baseline=baseline_result,
+        progress_callback=job_progress(job, 0.0 if baseline_reused else 0.5, 1.0,
+                                       f"{technique.capitalize()} ({model_name})"),
+    )
+    return {
+        "technique": technique,
+        **settings,
+        "model_name": result.model_name,
+        "metrics": asdict(result.metrics),
+        "baseline_metrics": asdict(baseline_result.metrics),
+        "baseline_reused": baseline_reused,
+        "improvements": result.improvement_percent,
+    }
+
+
+def matrix_query_func(model_name: str, loop: asyncio.AbstractEventLoop):
+    """Query function for ModelOptimizer.run_matrix; each query holds an inference slot for the model."""
+    db = get_db()
+    model = get_model(model_name)
+
+    def query_func(question: str):
+        slot = asyncio.run_coroutine_threadsafe(_inference_pool.acquire(model_name), loop).result()
+        try:
+            answer, _, query_metrics = query_rag(question, db, model, return_metrics=True)
+            return answer, query_metrics
+        finally:
+            loop.call_soon_threadsafe(slot.release)
+
+    return query_func
+
+
+async def run_benchmark_matrix(variants: List["MatrixVariant"], questions: List[str],
+                               baseline_max_age: Optional[float] = None,
+                               job: Optional[BenchmarkJob] = None) -> dict:
+    """Benchmark every variant on every question against the base model."""
+    loop = asyncio.get_running_loop()
+
+    def progress(completed: float, total: int):
+        if job is not None:
+            job.raise_if_cancelled()
+            job.report(completed / total, f"Matrix: {int(completed)}/{total} cells")
+
+    matrix = await _inference_pool.run_in_worker(
+        get_optimizer().run_matrix,
+        BASE_MODEL_NAME,
+        variants,
+        questions,
+        lambda model_name: matrix_query_func(model_name, loop),
+        baseline_max_age=BENCHMARK_BASELINE_MAX_AGE if baseline_max_age is None else baseline_max_age,
+        progress_callback=progress,
+    )
+    return matrix.to_dict()
+
+
+@app.post("/api/benchmark/baseline")
+async def benchmark_baseline(request: BenchmarkRequest):
+    """Run baseline benchmark on the current question using the baseline model."""
+    try:
+        # Determine the question to benchmark on
+        question = (request.question or (request.test_queries[0] if request.test_queries else "What is autism?")).strip()
+        if not question:
+            raise HTTPException(status_code=400, detail="Question for benchmark cannot be empty")
+
+        return await run_benchmark("baseline", question)
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running baseline benchmark: {str(e)}")
 
@@ -295,84 +1695,11 @@ async def benchmark_quantization(request: OptimizationRequest):
         if not question:
             raise HTTPException(status_code=400, detail="Question for benchmark cannot be empty")
 
-        db = get_db()
-        quantization_level = request.quantization_level or "q4_0"
-        
-        # Map quantization levels to actual pre-quantized models available in Ollama
-        quant_model_map = {
-            "q4_0": "mistral:7b-instruct-q4_0",   # 4.1GB - Real quantized Mistral model
-            "q5_0": "llama3.2:3b",   # 2.0GB - Alternative smaller model
-            "q8_0": "llama3.2:1b-instruct-q4_0"   # 770MB - Very small quantized model
-        }
-        
-        # Get quantized model name from map, fallback to template if custom
-        quant_model_name = quant_model_map.get(quantization_level)
-        if not quant_model_name:
-            # Try template format as fallback (for custom quantization levels)
-            try:
-                quant_model_name = QUANT_MODEL_TEMPLATE.format(level=quantization_level)
-            except (KeyError, ValueError):
-                # If template doesn't support {level}, use the default quantized model
-                quant_model_name = QUANT_MODEL_TEMPLATE if "{level}" not in QUANT_MODEL_TEMPLATE else "mistral:7b-instruct-q4_0"
-
-        # Baseline: real benchmark on base model
-        base_model = get_model(BASE_MODEL_NAME)
-
-        def baseline_query(q: str):
-            answer, _ = query_rag(question, db, base_model)
-            return answer
-
-        baseline_result = _optimizer.benchmark_model(
-            model_name=BASE_MODEL_NAME,
-            query_func=baseline_query,
-            test_queries=[question],
-            technique="baseline",
-        )
-        baseline_metrics = baseline_result.metrics
-
-        # Quantized model: real benchmark on quantized model
-        quant_model = get_model(quant_model_name)
-
-        def quant_query(q: str):
-            answer, _ = query_rag(question, db, quant_model)
-            return answer
-
-        quant_result = _optimizer.benchmark_model(
-            model_name=quant_model_name,
-            query_func=quant_query,
-            test_queries=[question],
-            technique="quantization",
-        )
-        quant_metrics = quant_result.metrics
-
-        improvements = _optimizer.calculate_improvement(baseline_metrics, quant_metrics)
-
-        return {
-            "technique": "quantization",
-            "quantization_level": quantization_level,
-            "model_name": quant_model_name,
-            "metrics": {
-                "response_time": quant_metrics.response_time,
-                "memory_usage_mb": quant_metrics.memory_usage_mb,
-                "cpu_usage_percent": quant_metrics.cpu_usage_percent,
-                "tokens_per_second": quant_metrics.tokens_per_second,
-                "model_size_mb": quant_metrics.model_size_mb,
-                "latency_p50": quant_metrics.latency_p50,
-                "latency_p95": quant_metrics.latency_p95,
-                "latency_p99": quant_metrics.latency_p99,
-            },
-            "baseline_metrics": {
-                "response_time": baseline_metrics.response_time,
-                "memory_usage_mb": baseline_metrics.memory_usage_mb,
-                "cpu_usage_percent": baseline_metrics.cpu_usage_percent,
-                "tokens_per_second": baseline_metrics.tokens_per_second,
-                "model_size_mb": baseline_metrics.model_size_mb,
-                "latency_p50": baseline_metrics.latency_p50,
-                "latency_p95": baseline_metrics.latency_p95,
-                "latency_p99": baseline_metrics.latency_p99,
-            },
-            "improvements": improvements
-        }
+        return await run_benchmark("quantization", question, quantization_level=request.quantization_level)
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error running quantization benchmark: {str(e)}")
 
@@ -389,88 +1716,184 @@ async def benchmark_pruning(request: OptimizationRequest):
         if not question:
             raise HTTPException(status_code=400, detail="Question for benchmark cannot be empty")
 
-        db = get_db()
-        pruning_ratio = request.pruning_ratio or 0.3
-        # Baseline benchmark on base model
-        base_model = get_model(BASE_MODEL_NAME)
+        return await run_benchmark("pruning", question, pruning_ratio=request.pruning_ratio)
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running pruning benchmark: {str(e)}")
 
-        def baseline_query(q: str):
-            answer, _ = query_rag(question, db, base_model)
-            return answer
 
-        baseline_result = _optimizer.benchmark_model(
-            model_name=BASE_MODEL_NAME,
-            query_func=baseline_query,
-            test_queries=[question],
-            technique="baseline",
-        )
-        baseline_metrics = baseline_result.metrics
+class BenchmarkJobRequest(BaseModel):
+    technique: str = "baseline"  # "baseline", "quantization" or "pruning"
+    question: Optional[str] = None
+    quantization_level: Optional[str] = "q4_0"  # For quantization
+    pruning_ratio: Optional[float] = 0.3  # For pruning
+    baseline_max_age: Optional[float] = None  # Seconds; defaults to BENCHMARK_BASELINE_MAX_AGE
+
+
+class MatrixVariantRequest(BaseModel):
+    technique: str  # "quantization" or "pruning"
+    model_name: Optional[str] = None  # Overrides the model derived from the settings below
+    quantization_level: Optional[str] = "q4_0"
+    pruning_ratio: Optional[float] = 0.3
+    label: Optional[str] = None
+
+
+class BenchmarkMatrixRequest(BaseModel):
+    variants: List[MatrixVariantRequest]
+    questions: List[str]
+    baseline_max_age: Optional[float] = None  # Seconds; defaults to BENCHMARK_BASELINE_MAX_AGE
+
+
+def get_benchmark_job(job_id: str) -> BenchmarkJob:
+    job = _benchmark_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown benchmark job: {job_id}")
+    return job
 
-        # Determine pruned model name
-        if PRUNED_MODEL_NAME:
-            pruned_model_name = PRUNED_MODEL_NAME
+
+@app.post("/api/benchmark/jobs", status_code=202)
+async def submit_benchmark_job(request: BenchmarkJobRequest):
+    """Queue a benchmark to run in the background; poll the returned job for progress."""
+    if request.technique not in BENCHMARK_TECHNIQUES:
+        raise HTTPException(status_code=400, detail=f"Technique must be one of: {', '.join(BENCHMARK_TECHNIQUES)}")
+    question = (request.question or "What is autism?").strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question for benchmark cannot be empty")
+
+    params = {"question": question, "baseline_max_age": request.baseline_max_age}
+    if request.technique == "quantization":
+        params["quantization_level"] = request.quantization_level
+    elif request.technique == "pruning":
+        params["pruning_ratio"] = request.pruning_ratio
+
+    async def run_job(job: BenchmarkJob) -> dict:
+        return await run_benchmark(request.technique, job=job, **params)
+
+    job = await _benchmark_jobs.submit(request.technique, params, run_job)
+    return job.to_dict()
+
+
+@app.post("/api/benchmark/matrix", status_code=202)
+async def submit_benchmark_matrix(request: BenchmarkMatrixRequest):
+    """
+    Queue a matrix benchmark: every variant on every question, each compared
+    against the base model. Fresh baseline results are reused.
+    """
+    from optimization import MatrixVariant
+
+    questions = [question.strip() for question in request.questions if question.strip()]
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if not request.variants:
+        raise HTTPException(status_code=400, detail="At least one variant is required")
+
+    variants = []
+    for variant in request.variants:
+        if variant.technique == "quantization":
+            model_name = variant.model_name or quantized_model_name(variant.quantization_level or "q4_0")
+            default_label = f"quantization-{variant.quantization_level or 'q4_0'}"
+        elif variant.technique == "pruning":
+            model_name = variant.model_name or pruned_model_name(variant.pruning_ratio or 0.3)
+            default_label = f"pruning-{int((variant.pruning_ratio or 0.3) * 100)}"
         else:
-            # Fallback: construct a name; user must ensure this model exists in Ollama
-            pruned_model_name = f"{BASE_MODEL_NAME}-pruned-{int(pruning_ratio * 100)}"
+            raise HTTPException(status_code=400, detail="Variant technique must be 'quantization' or 'pruning'")
+        variants.append(MatrixVariant(model_name=model_name, technique=variant.technique,
+                                      label=variant.label or default_label))
+    labels = [variant.name for variant in variants]
+    if len(set(labels)) != len(labels):
+        raise HTTPException(status_code=400, detail="Variant labels must be unique")
+
+    params = {
+        "variants": [asdict(variant) for variant in variants],
+        "questions": questions,
+        "baseline_max_age": request.baseline_max_age,
+    }
 
-        pruned_model = get_model(pruned_model_name)
+    async def run_job(job: BenchmarkJob) -> dict:
+        return await run_benchmark_matrix(variants, questions, request.baseline_max_age, job=job)
 
-        def pruned_query(q: str):
-            answer, _ = query_rag(question, db, pruned_model)
-            return answer
+    job = await _benchmark_jobs.submit("matrix", params, run_job)
+    return job.to_dict()
 
-        pruned_result = _optimizer.benchmark_model(
-            model_name=pruned_model_name,
-            query_func=pruned_query,
-            test_queries=[question],
-            technique="pruning",
-        )
-        pruned_metrics = pruned_result.metrics
 
-        improvements = _optimizer.calculate_improvement(baseline_metrics, pruned_metrics)
+@app.get("/api/benchmark/jobs")
+async def list_benchmark_jobs():
+    return {"jobs": [job.to_dict(include_result=False) for job in _benchmark_jobs.list()]}
 
-        return {
-            "technique": "pruning",
-            "pruning_ratio": pruning_ratio,
-            "model_name": pruned_result.model_name,
-            "metrics": {
-                "response_time": pruned_metrics.response_time,
-                "memory_usage_mb": pruned_metrics.memory_usage_mb,
-                "cpu_usage_percent": pruned_metrics.cpu_usage_percent,
-                "tokens_per_second": pruned_metrics.tokens_per_second,
-                "model_size_mb": pruned_metrics.model_size_mb,
-                "latency_p50": pruned_metrics.latency_p50,
-                "latency_p95": pruned_metrics.latency_p95,
-                "latency_p99": pruned_metrics.latency_p99,
-            },
-            "baseline_metrics": {
-                "response_time": baseline_metrics.response_time,
-                "memory_usage_mb": baseline_metrics.memory_usage_mb,
-                "cpu_usage_percent": baseline_metrics.cpu_usage_percent,
-                "tokens_per_second": baseline_metrics.tokens_per_second,
-                "model_size_mb": baseline_metrics.model_size_mb,
-                "latency_p50": baseline_metrics.latency_p50,
-                "latency_p95": baseline_metrics.latency_p95,
-                "latency_p99": baseline_metrics.latency_p99,
-            },
-            "improvements": improvements
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error running pruning benchmark: {str(e)}")
+
+@app.get("/api/benchmark/jobs/{job_id}")
+async def benchmark_job_status(job_id: str):
+    """Status and progress of a job; includes the result once it has succeeded."""
+    return get_benchmark_job(job_id).to_dict()
+
+
+@app.get("/api/benchmark/jobs/{job_id}/result")
+async def benchmark_job_result(job_id: str):
+    job = get_benchmark_job(job_id)
+    if job.status != SUCCEEDED:
+        detail = f"Benchmark job is {job.status}" + (f": {job.error}" if job.error else "")
+        raise HTTPException(status_code=409, detail=detail)
+    return job.result
+
+
+@app.delete("/api/benchmark/jobs/{job_id}")
+async def cancel_benchmark_job(job_id: str):
+    """Cancel a job; a running benchmark stops after its current iteration."""
+    get_benchmark_job(job_id)
+    return _benchmark_jobs.cancel(job_id).to_dict(include_result=False)
+
+
+def parse_date(value: Optional[str], name: str) -> Optional[float]:
+    """Unix timestamp from an ISO date/datetime or a number of seconds."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected an ISO date or Unix timestamp")
+
+
+@app.get("/api/benchmark/results")
+async def benchmark_results(
+    model_name: Optional[str] = None,
+    technique: Optional[str] = None,
+    question: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 100,
+):
+    """Stored benchmark results, newest first. `question` matches as a substring."""
+    results = await _inference_pool.run_in_worker(
+        get_optimizer().store.query,
+        model_name=model_name,
+        technique=technique,
+        question=question,
+        since=parse_date(since, "since"),
+        until=parse_date(until, "until"),
+        limit=min(max(limit, 1), 1000),
+    )
+    return {"results": [asdict(result) for result in results]}
 
 
 @app.get("/api/benchmark/history")
 async def get_benchmark_history():
-    """Get benchmark history."""
+    """Latest baseline and the most recent stored benchmark results."""
+    store = get_optimizer().store
+    history = await _inference_pool.run_in_worker(store.query, limit=50)
+    latest_baseline = next((result for result in history if result.technique == "baseline"), None)
+    if latest_baseline is None:
+        latest_baseline = await _inference_pool.run_in_worker(store.latest, BASE_MODEL_NAME, technique="baseline")
+    baseline_metrics = latest_baseline.metrics if latest_baseline else _baseline_metrics
     return {
-        "baseline": {
-            "response_time": _baseline_metrics.response_time if _baseline_metrics else None,
-            "memory_usage_mb": _baseline_metrics.memory_usage_mb if _baseline_metrics else None,
-            "cpu_usage_percent": _baseline_metrics.cpu_usage_percent if _baseline_metrics else None,
-            "tokens_per_second": _baseline_metrics.tokens_per_second if _baseline_metrics else None,
-            "model_size_mb": _baseline_metrics.model_size_mb if _baseline_metrics else None,
-        } if _baseline_metrics else None,
-        "history": [asdict(result) for result in _optimizer.benchmark_history]
+        "baseline": asdict(baseline_metrics) if baseline_metrics else None,
+        "history": [asdict(result) for result in history]
     }
 
 
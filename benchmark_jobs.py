@@ -0,0 +1,158 @@
+"""
+Background execution of benchmark jobs.
+
+A comparison benchmark runs the baseline and a variant several times each
+and takes minutes, far longer than clients wait on one HTTP request. Jobs
+are queued and run one at a time by a worker task on the event loop (so
+concurrent benchmarks don't skew each other's timings); clients poll the
+job for status and progress, cancel it, and fetch the result when done.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+@dataclass
+class BenchmarkJob:
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    status: str = QUEUED
+    progress: float = 0.0  # 0..1
+    message: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def raise_if_cancelled(self):
+        """Called by the job (from any thread) at points where it can stop."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: float, message: Optional[str] = None):
+        self.progress = min(max(progress, 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+        }
+        if include_result:
+            data["result"] = self.result
+        return data
+
+
+JobFunction = Callable[[BenchmarkJob], Awaitable[Dict[str, Any]]]
+
+
+class BenchmarkJobManager:
+    """Queue of benchmark jobs run sequentially by one worker task."""
+
+    def __init__(self, max_finished_jobs: int = 100):
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs: "OrderedDict[str, BenchmarkJob]" = OrderedDict()
+        self._functions: Dict[str, JobFunction] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        # The worker lives on the loop serving requests; recreate it if that loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+            for job in self._jobs.values():
+                if job.status == QUEUED:
+                    self._queue.put_nowait(job)
+
+    async def submit(self, kind: str, params: Dict[str, Any], func: JobFunction) -> BenchmarkJob:
+        self._ensure_worker()
+        job = BenchmarkJob(id=uuid.uuid4().hex, kind=kind, params=params)
+        self._jobs[job.id] = job
+        self._functions[job.id] = func
+        self._prune()
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[BenchmarkJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[BenchmarkJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[BenchmarkJob]:
+        """Cancel a queued job immediately, or ask a running one to stop at its next checkpoint."""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        job._cancel.set()
+        if job.status == QUEUED:
+            self._finish(job, CANCELLED)
+        else:
+            job.message = "Cancelling"
+        return job
+
+    def _finish(self, job: BenchmarkJob, status: str, result=None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self._functions.pop(job.id, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(len(finished) - self.max_finished_jobs, 0)]:
+            del self._jobs[job_id]
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            func = self._functions.get(job.id)
+            if job.status != QUEUED or func is None:
+                continue
+            job.status = RUNNING
+            job.started_at = time.time()
+            try:
+                result = await func(job)
+            except JobCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                self._finish(job, FAILED, error=str(e))
+            else:
+                job.report(1.0, "Done")
+                self._finish(job, SUCCEEDED, result=result)
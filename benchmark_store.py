@@ -0,0 +1,149 @@
+"""
+Persistent store for benchmark results.
+
+Every benchmark run by `ModelOptimizer` is written to SQLite, so results
+survive restarts and can be compared over time. Results are queryable by
+model, technique, question and date.
+"""
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import List, Optional
+
+from optimization import BenchmarkMetrics, OptimizationResult
+
+
+def _metrics_from_json(value: Optional[str]) -> Optional[BenchmarkMetrics]:
+    if not value:
+        return None
+    data = json.loads(value)
+    # Ignore fields written by newer versions
+    known = BenchmarkMetrics.__dataclass_fields__
+    return BenchmarkMetrics(**{key: data[key] for key in data if key in known})
+
+
+class BenchmarkStore:
+    """SQLite-backed history of OptimizationResults."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS benchmark_results ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " technique TEXT NOT NULL,"
+            " model_name TEXT NOT NULL,"
+            " question TEXT,"
+            " metrics TEXT NOT NULL,"
+            " before_metrics TEXT,"
+            " improvements TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_results_model ON benchmark_results (model_name, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_results_technique ON benchmark_results (technique, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_results_question ON benchmark_results (question, created_at);"
+        )
+        self._conn.commit()
+
+    def add(self, result: OptimizationResult) -> int:
+        """Persist `result` and return its ID (also set on `result.id`)."""
+        if result.created_at is None:
+            result.created_at = time.time()
+        row = (
+            result.created_at,
+            result.technique,
+            result.model_name,
+            result.question,
+            json.dumps(asdict(result.metrics)),
+            json.dumps(asdict(result.before_metrics)) if result.before_metrics else None,
+            json.dumps(result.improvement_percent) if result.improvement_percent is not None else None,
+        )
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO benchmark_results "
+                "(created_at, technique, model_name, question, metrics, before_metrics, improvements) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self._conn.commit()
+        result.id = cursor.lastrowid
+        return result.id
+
+    @staticmethod
+    def _to_result(row: sqlite3.Row) -> OptimizationResult:
+        return OptimizationResult(
+            technique=row["technique"],
+            model_name=row["model_name"],
+            metrics=_metrics_from_json(row["metrics"]),
+            before_metrics=_metrics_from_json(row["before_metrics"]),
+            improvement_percent=json.loads(row["improvements"]) if row["improvements"] else None,
+            question=row["question"],
+            created_at=row["created_at"],
+            id=row["id"],
+        )
+
+    def query(
+        self,
+        model_name: Optional[str] = None,
+        technique: Optional[str] = None,
+        question: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        limit: int = 100,
+    ) -> List[OptimizationResult]:
+        """
+        Newest results first. `question` matches case-insensitively as a
+        substring; `since`/`until` are Unix timestamps.
+        """
+        clauses, params = [], []
+        if model_name:
+            clauses.append("model_name = ?")
+            params.append(model_name)
+        if technique:
+            clauses.append("technique = ?")
+            params.append(technique)
+        if question:
+            clauses.append("question LIKE ? ESCAPE '\\'")
+            escaped = question.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM benchmark_results {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                params + [limit],
+            ).fetchall()
+        return [self._to_result(row) for row in rows]
+
+    def latest(self, model_name: str, question: Optional[str] = None, technique: Optional[str] = None,
+               max_age: Optional[float] = None) -> Optional[OptimizationResult]:
+        """Most recent result for exactly this model (and question), optionally no older than `max_age` seconds."""
+        clauses, params = ["model_name = ?"], [model_name]
+        if question is not None:
+            clauses.append("question = ?")
+            params.append(question)
+        if technique:
+            clauses.append("technique = ?")
+            params.append(technique)
+        if max_age is not None:
+            clauses.append("created_at >= ?")
+            params.append(time.time() - max_age)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT * FROM benchmark_results WHERE {' AND '.join(clauses)} "
+                "ORDER BY created_at DESC, id DESC LIMIT 1",
+                params,
+            ).fetchone()
+        return self._to_result(row) if row else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
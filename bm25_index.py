@@ -0,0 +1,129 @@
+"""
+Compact BM25 inverted index over the chunk texts.
+
+Dense retrieval alone often misses exact clinical terms, gene names and
+author names. The index is built by populate_database from the Chroma
+collection, persisted as gzipped JSON next to chroma/, and used by the API
+for lexical and hybrid (reciprocal rank fusion) retrieval.
+"""
+import gzip
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Keeps identifiers such as "shank3", "16p11.2", "dsm-5" and "baron-cohen" whole
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-'][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i in is it its
+of on or that the their there these this to was were what when where which who
+why will with you your about into than then them they we our us
+""".split())
+
+# Question words mean the user is asking in prose, not looking up a term
+_QUESTION_WORDS = frozenset(["what", "why", "how", "when", "where", "which", "who", "does", "do", "is", "are", "can"])
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def is_lexical_query(query: str, max_terms: int = 4) -> bool:
+    """
+    True for short keyword lookups that dense retrieval handles poorly.
+
+    A query is lexical when it is quoted, or when it has at most `max_terms`
+    words, none of them question words, and every word looks like an
+    identifier or a name (contains a digit, is an acronym, or is capitalised),
+    e.g. "SHANK3", "ADOS-2", "Baron-Cohen 2008".
+    """
+    stripped = query.strip()
+    if len(stripped) > 2 and stripped[0] == stripped[-1] and stripped[0] in "\"'":
+        return True
+    words = re.findall(r"[\w.\-']+", stripped.rstrip("?"))
+    if not words or len(words) > max_terms:
+        return False
+    if any(word.lower() in _QUESTION_WORDS for word in words):
+        return False
+    return all(any(c.isdigit() for c in word) or word[0].isupper() for word in words)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed set of documents, keyed by Chroma chunk ID."""
+
+    def __init__(self, doc_ids: List[str], doc_lengths: List[int], postings: Dict[str, List[List[int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        # term -> [[doc index, term frequency], ...]
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, doc_ids: Sequence[str], texts: Sequence[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = defaultdict(list)
+        doc_lengths = []
+        for index, text in enumerate(texts):
+            tokens = tokenize(text or "")
+            doc_lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings[term].append([index, count])
+        return cls(list(doc_ids), doc_lengths, dict(postings), k1=k1, b=b)
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.doc_ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        """Return the top `k` (chunk ID, BM25 score) pairs for `query`."""
+        if not self.doc_ids:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[index] / self.avg_length)
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.doc_ids[index], score) for index, score in top]
+
+    def save(self, path: str):
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_ids": self.doc_ids,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["doc_ids"], data["doc_lengths"], data["postings"], k1=data["k1"], b=data["b"])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists; each ID scores sum(1 / (k + rank))."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def load_index(path: str) -> Optional[BM25Index]:
+    try:
+        return BM25Index.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
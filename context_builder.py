@@ -0,0 +1,120 @@
+"""
+Token-budgeted context packing for the RAG prompt.
+
+Prompt size drives prefill time, so instead of joining every retrieved chunk
+the builder drops chunks that score far below the best one, merges
+neighbouring chunks of the same page (removing the text the splitter
+repeated between them) and fills the context up to a per-model token budget.
+"""
+from typing import Dict, List, Tuple
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# split_documents uses chunk_overlap=80; allow some slack for whitespace handling
+MAX_OVERLAP_CHARS = 200
+MIN_OVERLAP_CHARS = 10
+
+# Added to distances before taking ratios, so an exact match (distance 0)
+# doesn't make every other chunk look infinitely worse
+DISTANCE_EPSILON = 0.1
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), matching the benchmark heuristic."""
+    return (len(text) + 3) // 4
+
+
+def _chunk_position(doc) -> Tuple[str, object, int]:
+    """(source, page, chunk index) parsed from IDs like "data/x.pdf:6:2"."""
+    chunk_id = doc.metadata.get("id") or ""
+    try:
+        index = int(chunk_id.rsplit(":", 1)[1])
+    except (IndexError, ValueError):
+        index = -1
+    return doc.metadata.get("source"), doc.metadata.get("page"), index
+
+
+def overlap_length(first: str, second: str, max_overlap: int = MAX_OVERLAP_CHARS) -> int:
+    """Length of the longest suffix of `first` that is also a prefix of `second`."""
+    for size in range(min(len(first), len(second), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _relevance(results) -> List[float]:
+    """Score each result relative to the best one (1.0 = best, lower = worse)."""
+    distances = [distance for _doc, distance, _extras in results]
+    if not results:
+        return []
+    if all(distance is not None for distance in distances):
+        # Shifted so the best distance is >= 0; inner-product distances can be negative
+        shift = min(min(distances), 0.0)
+        best = min(distances) - shift + DISTANCE_EPSILON
+        return [min(best / (distance - shift + DISTANCE_EPSILON), 1.0) for distance in distances]
+    scores = [extras.get("bm25_score", extras.get("rrf_score", 0.0)) for _doc, _distance, extras in results]
+    best = max(scores) if scores else 0.0
+    return [score / best if best > 0 else 1.0 for score in scores]
+
+
+def build_context(results, token_budget: int, min_relative_score: float = 0.0) -> Tuple[list, str, Dict[str, int]]:
+    """
+    Pack retrieved chunks into a context string.
+
+    `results` are (Document, distance, extras) tuples, best first. Returns the
+    results that made it into the context (in rank order), the context text
+    and a stats dict with the tokens used and saved compared to joining
+    every retrieved chunk.
+    """
+    if not results:
+        return [], "", {"chunks_retrieved": 0, "chunks_used": 0, "context_tokens": 0, "context_tokens_saved": 0,
+                        "token_budget": token_budget}
+    naive_tokens = estimate_tokens(CONTEXT_SEPARATOR.join(doc.page_content for doc, _d, _e in results))
+
+    # 1. Drop chunks far below the best one (the best chunk is always kept).
+    relevance = _relevance(results)
+    kept = [result for result, score in zip(results, relevance) if score >= min_relative_score] or results[:1]
+
+    # 2. Merge adjacent chunks of the same page into blocks, removing repeated overlap.
+    positions = [_chunk_position(doc) for doc, _d, _e in kept]
+    order = sorted(range(len(kept)), key=lambda i: positions[i])
+    blocks = []  # [best rank, text, member ranks]
+    for i in order:
+        source, page, index = positions[i]
+        text = kept[i][0].page_content
+        if blocks:
+            previous = blocks[-1]
+            prev_source, prev_page, prev_index = positions[previous[2][-1]]
+            if (source, page) == (prev_source, prev_page) and index >= 0 and index == prev_index + 1:
+                previous[1] += text[overlap_length(previous[1], text):]
+                previous[0] = min(previous[0], i)
+                previous[2].append(i)
+                continue
+        blocks.append([i, text, [i]])
+    blocks.sort(key=lambda block: block[0])
+
+    # 3. Fill the budget in rank order; the best block is truncated rather than dropped.
+    used_blocks = []
+    used_tokens = 0
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    for block in blocks:
+        cost = estimate_tokens(block[1]) + (separator_tokens if used_blocks else 0)
+        if used_tokens + cost <= token_budget:
+            used_blocks.append(block)
+            used_tokens += cost
+        elif not used_blocks:
+            block[1] = block[1][:token_budget * 4]
+            used_blocks.append(block)
+            used_tokens = estimate_tokens(block[1])
+
+    used_ranks = sorted(rank for block in used_blocks for rank in block[2])
+    used_results = [kept[rank] for rank in used_ranks]
+    context_text = CONTEXT_SEPARATOR.join(block[1] for block in used_blocks)
+    stats = {
+        "chunks_retrieved": len(results),
+        "chunks_used": len(used_results),
+        "context_tokens": estimate_tokens(context_text),
+        "context_tokens_saved": max(naive_tokens - estimate_tokens(context_text), 0),
+        "token_budget": token_budget,
+    }
+    return used_results, context_text, stats
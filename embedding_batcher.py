@@ -0,0 +1,113 @@
+"""
+Cross-request micro-batching of query embeddings.
+
+Under concurrent load every /api/query call would otherwise make its own
+tiny embedding request. The batcher collects questions that arrive within a
+short window, embeds them with one `embed_documents` call and hands each
+vector back to the thread that asked for it.
+"""
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class _PendingEmbedding:
+    def __init__(self, text: str):
+        self.text = text
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class QueryEmbeddingBatcher:
+    """Batches concurrent `embed_query` calls into single embedding requests."""
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 16, max_wait_ms: float = 5):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[_PendingEmbedding]" = queue.Queue()
+        self._lock = threading.Lock()
+        # Callers currently waiting for a vector
+        self._waiting = 0
+        self.requests = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed_query(self, text: str) -> List[float]:
+        pending = _PendingEmbedding(text)
+        with self._lock:
+            self._waiting += 1
+        try:
+            self._queue.put(pending)
+            pending.done.wait()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        if pending.error is not None:
+            raise pending.error
+        return pending.vector
+
+    def _collect_batch(self) -> List[_PendingEmbedding]:
+        batch = [self._queue.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # A lone caller is embedded straight away; the window only applies under load.
+        with self._lock:
+            concurrent = self._waiting > 1
+        if concurrent and self.max_wait > 0:
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                vectors = self.embeddings.embed_documents([pending.text for pending in batch])
+                for pending, vector in zip(batch, vectors):
+                    pending.vector = vector
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                self.requests += len(batch)
+                self.batches += 1
+                for pending in batch:
+                    pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "average_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def create_embedding_batcher_from_env(embeddings: Embeddings) -> Optional[QueryEmbeddingBatcher]:
+    """Wrap `embeddings` in a batcher configured from the environment (None when disabled)."""
+    if os.getenv("EMBED_BATCHING_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    return QueryEmbeddingBatcher(
+        embeddings,
+        max_batch_size=int(os.getenv("EMBED_BATCH_MAX_SIZE", "16")),
+        max_wait_ms=float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5")),
+    )
@@ -0,0 +1,305 @@
+"""
+Stand-in Ollama server for offline load tests.
+
+Implements the parts of the Ollama HTTP API the backend uses (generate,
+embed, ps, tags) with deterministic output and configurable latency, so
+load tests run on a CPU-only box without models or network access:
+
+    python fake_ollama.py --port 11435 --token-latency-ms 20
+    OLLAMA_HOST=http://127.0.0.1:11435 python api_server.py
+
+Generated text and embeddings are derived from a hash of the input, so the
+same prompt always produces the same answer and the same question always
+embeds to the same vector. Timing fields (prompt_eval_duration,
+eval_duration, ...) report the simulated latencies.
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# nomic-embed-text dimensions, so the fake works against an existing Chroma collection
+EMBEDDING_DIMENSIONS = 768
+# Reported size of every fake model
+MODEL_SIZE_BYTES = 4 * 1024 ** 3
+
+_WORDS = (
+    "autism spectrum disorder is a developmental condition that affects communication social interaction "
+    "and behaviour early diagnosis and support services help children and adults with sensory differences"
+).split()
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> List[float]:
+    """Hashed bag-of-words vector: texts sharing words get similar embeddings."""
+    vector = [0.0] * dimensions
+    for word in _TOKEN_RE.findall(text.lower()):
+        seed = _seed(word)
+        vector[seed % dimensions] += 1.0 if (seed >> 32) & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def fake_tokens(prompt: str, count: int) -> List[str]:
+    seed = _seed(prompt)
+    return [_WORDS[(seed + i * 7919) % len(_WORDS)] + " " for i in range(count)]
+
+
+def fake_token_ids(text: str) -> List[int]:
+    """Stand-in for the token IDs Ollama returns as a generation's `context`."""
+    return [_seed(word) % 32000 for word in _TOKEN_RE.findall(text)]
+
+
+class FakeOllama:
+    """Simulated model behaviour shared by all request handlers."""
+
+    def __init__(self, token_latency_ms: float = 20.0, prompt_token_latency_ms: float = 0.2,
+                 load_latency_ms: float = 0.0, embed_latency_ms: float = 5.0, response_tokens: int = 64,
+                 keep_alive: float = 300.0):
+        self.token_latency = token_latency_ms / 1000
+        self.prompt_token_latency = prompt_token_latency_ms / 1000
+        self.load_latency = load_latency_ms / 1000
+        self.embed_latency = embed_latency_ms / 1000
+        self.response_tokens = response_tokens
+        self.default_keep_alive = keep_alive
+        # Loaded model -> expiry time (monotonic)
+        self._loaded: Dict[str, float] = {}
+        # Every model name seen so far; any name is accepted
+        self._known: Dict[str, None] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse_keep_alive(value, default: float) -> float:
+        if value is None:
+            return default
+        if isinstance(value, (int, float)):
+            return float(value)
+        match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+        if not match:
+            return default
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+        return float(match.group(1)) * scale
+
+    def load(self, model: str, keep_alive=None) -> float:
+        """Mark `model` loaded; returns the simulated load time (0 when already loaded)."""
+        seconds = self._parse_keep_alive(keep_alive, self.default_keep_alive)
+        now = time.monotonic()
+        with self._lock:
+            self._known[model] = None
+            warm = self._loaded.get(model, 0) > now
+            if seconds == 0:
+                self._loaded.pop(model, None)
+                return 0.0
+            self._loaded[model] = math.inf if seconds < 0 else now + seconds
+        if warm:
+            return 0.0
+        time.sleep(self.load_latency)
+        return self.load_latency
+
+    def known_models(self) -> List[str]:
+        with self._lock:
+            return list(self._known)
+
+    def loaded_models(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            return [model for model, expiry in self._loaded.items() if expiry > now]
+
+
+def _model_info(name: str) -> dict:
+    return {
+        "name": name,
+        "model": name,
+        "size": MODEL_SIZE_BYTES,
+        "digest": hashlib.sha256(name.encode("utf-8")).hexdigest(),
+        "details": {"format": "gguf", "family": "fake", "parameter_size": "7B", "quantization_level": "Q4_0"},
+        "modified_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    fake: FakeOllama = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [_model_info(name) for name in self.fake.known_models()]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [_model_info(name) for name in self.fake.loaded_models()]})
+        elif self.path == "/api/version":
+            self._send_json({"version": "0.0.0-fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        try:
+            request = self._read_json()
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+        if self.path == "/api/generate":
+            self._generate(request)
+        elif self.path == "/api/embed":
+            self._embed(request, request.get("input") or [])
+        elif self.path == "/api/embeddings":
+            vector = self._embed_texts(request.get("model", ""), [request.get("prompt", "")], request.get("keep_alive"))[0]
+            self._send_json({"embedding": vector})
+        elif self.path == "/api/show":
+            self._send_json({**_model_info(request.get("model", "")), "modelfile": "", "parameters": ""})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _embed_texts(self, model: str, texts: List[str], keep_alive=None) -> List[List[float]]:
+        self.fake.load(model, keep_alive)
+        time.sleep(self.fake.embed_latency)
+        return [fake_embedding(text) for text in texts]
+
+    def _embed(self, request: dict, texts):
+        if isinstance(texts, str):
+            texts = [texts]
+        start = time.perf_counter_ns()
+        vectors = self._embed_texts(request.get("model", ""), texts, request.get("keep_alive"))
+        self._send_json({
+            "model": request.get("model", ""),
+            "embeddings": vectors,
+            "total_duration": time.perf_counter_ns() - start,
+            "prompt_eval_count": sum(len(_TOKEN_RE.findall(text)) for text in texts),
+        })
+
+    def _generate(self, request: dict):
+        model = request.get("model", "")
+        prompt = request.get("prompt") or ""
+        start = time.perf_counter_ns()
+        load_seconds = self.fake.load(model, request.get("keep_alive"))
+        if not prompt:
+            # Empty prompts only load (or, with keep_alive=0, unload) the model
+            self._send_json({"model": model, "created_at": _now(), "response": "", "done": True,
+                             "done_reason": "load", "load_duration": int(load_seconds * 1e9)})
+            return
+
+        prompt_tokens = max(1, (len(prompt) + 3) // 4)
+        prompt_seconds = prompt_tokens * self.fake.prompt_token_latency
+        time.sleep(prompt_seconds)
+        options = request.get("options") or {}
+        num_predict = int(options.get("num_predict") or 0)
+        tokens = fake_tokens(prompt, num_predict if num_predict > 0 else self.fake.response_tokens)
+
+        def final(eval_seconds: float) -> dict:
+            return {
+                "model": model,
+                "created_at": _now(),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": time.perf_counter_ns() - start,
+                "load_duration": int(load_seconds * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_seconds * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(eval_seconds * 1e9),
+                # Only the new prompt is prefilled; a passed-in context is taken as already cached
+                "context": list(request.get("context") or []) + fake_token_ids(prompt + "".join(tokens)),
+            }
+
+        if request.get("stream", True) is False:
+            time.sleep(self.fake.token_latency * len(tokens))
+            self._send_json({**final(self.fake.token_latency * len(tokens)), "response": "".join(tokens)})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        eval_start = time.perf_counter()
+        try:
+            for token in tokens:
+                time.sleep(self.fake.token_latency)
+                self._write_chunk({"model": model, "created_at": _now(), "response": token, "done": False})
+            self._write_chunk({**final(time.perf_counter() - eval_start), "response": ""})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the generation
+            pass
+
+    def _write_chunk(self, payload: dict):
+        data = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def create_server(host: str = "127.0.0.1", port: int = 11435, fake: Optional[FakeOllama] = None) -> ThreadingHTTPServer:
+    """Build (but don't start) a fake Ollama server; port 0 picks a free port."""
+    handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), {"fake": fake or FakeOllama()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(host: str = "127.0.0.1", port: int = 0, fake: Optional[FakeOllama] = None) -> ThreadingHTTPServer:
+    """Start a fake server on a daemon thread; its URL is http://host:server.server_port."""
+    server = create_server(host, port, fake)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic stand-in for the Ollama API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency-ms", type=float, default=20.0, help="Delay per generated token.")
+    parser.add_argument("--prompt-token-latency-ms", type=float, default=0.2, help="Delay per prompt token (prefill).")
+    parser.add_argument("--load-latency-ms", type=float, default=0.0, help="Delay when a model is cold-loaded.")
+    parser.add_argument("--embed-latency-ms", type=float, default=5.0, help="Delay per embedding request.")
+    parser.add_argument("--response-tokens", type=int, default=64, help="Tokens generated per answer.")
+    args = parser.parse_args()
+
+    fake = FakeOllama(
+        token_latency_ms=args.token_latency_ms,
+        prompt_token_latency_ms=args.prompt_token_latency_ms,
+        load_latency_ms=args.load_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        response_tokens=args.response_tokens,
+    )
+    server = create_server(args.host, args.port, fake)
+    print(f"Fake Ollama listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ import { Button } from "@/components/ui/button"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Textarea } from "@/components/ui/textarea"
 import { ScrollArea } from "@/components/ui/scroll-area"
-import { queryRAG, type QueryResponse, type Source, getPdfUrl } from "@/lib/api"
+import { queryRAGStream, type Source, getPdfUrl } from "@/lib/api"
 import { Send, Loader2, Bot, User, FileText, ExternalLink, BarChart3, MessageCircle, ChevronRight, ChevronLeft, X } from "lucide-react"
 import { HealthIndicator } from "@/components/health-indicator"
 import { OptimizationDashboard } from "@/components/optimization-dashboard"
@@ -53,17 +53,30 @@ export default function Home() {
     setError(null)
 
     try {
-      const response: QueryResponse = await queryRAG(userMessage.content)
-
-      const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
-        role: "assistant",
-        content: response.answer,
-        sources: response.sources,
-        timestamp: new Date(),
+      const assistantId = (Date.now() + 1).toString()
+      const updateAssistant = (update: (message: Message) => Message) => {
+        setMessages((prev) => prev.map((m) => (m.id === assistantId ? update(m) : m)))
       }
 
-      setMessages((prev) => [...prev, assistantMessage])
+      // Show the assistant message as soon as sources arrive, then grow it token by token.
+      await queryRAGStream(userMessage.content, {
+        onSources: (sources) => {
+          setIsLoading(false)
+          setMessages((prev) => [
+            ...prev,
+            {
+              id: assistantId,
+              role: "assistant",
+              content: "",
+              sources,
+              timestamp: new Date(),
+            },
+          ])
+        },
+        onToken: (token) => {
+          updateAssistant((m) => ({ ...m, content: m.content + token }))
+        },
+      })
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : "An error occurred"
       setError(errorMessage)
@@ -202,8 +215,10 @@ export default function Home() {
                                           })
                                         }
 
-                                        // First, try the pdf_url field from backend
-                                        if (source.pdf_url) {
+                                        // First, try the cited page alone, then the whole PDF
+                                        if (source.page_url) {
+                                          pdfUrl = getPdfUrl(source.page_url)
+                                        } else if (source.pdf_url) {
                                           pdfUrl = getPdfUrl(source.pdf_url)
                                         }
 
@@ -286,6 +301,12 @@ export default function Home() {
                                               {source.content}
                                             </p>
                                             <div className="flex items-center justify-between mt-2 pt-2 border-t border-border/50">
+                                              {source.score === null ? (
+                                                <p className="text-xs text-muted-foreground">
+                                                  <span className="font-medium">Keyword match:</span>{" "}
+                                                  {source.bm25_score?.toFixed(2)}
+                                                </p>
+                                              ) : (
                                               <p className="text-xs text-muted-foreground">
                                                 <span className="font-medium">Distance:</span>{" "}
                                                 {source.score.toFixed(3)}
@@ -300,6 +321,7 @@ export default function Home() {
                                                     : "⚡ Fair match"}
                                                 </span>
                                               </p>
+                                              )}
                                             </div>
                                           </div>
                                         )
@@ -7,6 +7,7 @@ import {
   runBaselineBenchmark, 
   runQuantizationBenchmark, 
   runPruningBenchmark,
+  type BenchmarkJob,
   type BenchmarkMetrics,
   type BenchmarkResponse 
 } from "@/lib/optimization-api"
@@ -34,6 +35,7 @@ interface ComparisonData {
 
 export function OptimizationDashboard({ currentQuestion }: { currentQuestion: string | null }) {
   const [loading, setLoading] = useState<string | null>(null)
+  const [progress, setProgress] = useState<BenchmarkJob | null>(null)
   const [comparisonData, setComparisonData] = useState<ComparisonData>({})
   const [quantizationLevel, setQuantizationLevel] = useState("q4_0")
   const [pruningRatio, setPruningRatio] = useState(0.3)
@@ -49,10 +51,10 @@ export function OptimizationDashboard({ currentQuestion }: { currentQuestion: st
       let result: BenchmarkResponse
       
       if (type === 'baseline') {
-        result = await runBaselineBenchmark(currentQuestion)
+        result = await runBaselineBenchmark(currentQuestion, setProgress)
         setComparisonData(prev => ({ ...prev, baseline: result.metrics }))
       } else if (type === 'quantization') {
-        result = await runQuantizationBenchmark(quantizationLevel, currentQuestion)
+        result = await runQuantizationBenchmark(quantizationLevel, currentQuestion, setProgress)
         setComparisonData(prev => ({
           ...prev,
           quantization: result.metrics,
@@ -60,7 +62,7 @@ export function OptimizationDashboard({ currentQuestion }: { currentQuestion: st
           quantizationImprovements: result.improvements
         }))
       } else {
-        result = await runPruningBenchmark(pruningRatio, currentQuestion)
+        result = await runPruningBenchmark(pruningRatio, currentQuestion, setProgress)
         setComparisonData(prev => ({
           ...prev,
           pruning: result.metrics,
@@ -73,6 +75,7 @@ export function OptimizationDashboard({ currentQuestion }: { currentQuestion: st
       alert(`Failed to run ${type} benchmark: ${error instanceof Error ? error.message : 'Unknown error'}`)
     } finally {
       setLoading(null)
+      setProgress(null)
     }
   }
 
@@ -175,6 +178,20 @@ export function OptimizationDashboard({ currentQuestion }: { currentQuestion: st
             improvement={undefined}
             lowerIsBetter={true}
           />
+          <MetricCard
+            title="Prompt Rate"
+            value={metrics.prompt_tokens_per_second}
+            unit="tok/s"
+            improvement={getImprovement('prompt_throughput')}
+            lowerIsBetter={false}
+          />
+          <MetricCard
+            title="Retrieval Time"
+            value={metrics.retrieval_time}
+            unit="s"
+            improvement={undefined}
+            lowerIsBetter={true}
+          />
         </div>
       </div>
     )
@@ -193,6 +210,12 @@ export function OptimizationDashboard({ currentQuestion }: { currentQuestion: st
           </CardDescription>
         </CardHeader>
         <CardContent className="space-y-4">
+          {progress && (
+            <p className="text-xs text-muted-foreground">
+              {progress.message || progress.status} ({Math.round(progress.progress * 100)}%)
+            </p>
+          )}
+
           {/* Baseline Benchmark */}
           <div className="space-y-2">
             <div className="flex items-center justify-between">
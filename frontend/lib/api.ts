@@ -6,19 +6,25 @@ export interface QueryRequest {
 
 export interface Source {
   content: string;
-  score: number;
+  // Vector distance (lower is better); null for chunks found by keyword search alone
+  score: number | null;
+  retrieval?: 'dense' | 'hybrid' | 'lexical';
+  bm25_score?: number;
+  rrf_score?: number;
   metadata: {
     source?: string;
     page?: number;
     id?: string;
   };
   pdf_url?: string;
+  page_url?: string | null;
   filename?: string;
 }
 
 export interface QueryResponse {
   answer: string;
   sources: Source[];
+  metrics?: Record<string, number | string | boolean | null>;
 }
 
 export async function queryRAG(question: string): Promise<QueryResponse> {
@@ -38,6 +44,71 @@ export async function queryRAG(question: string): Promise<QueryResponse> {
   return response.json();
 }
 
+export interface StreamMetrics {
+  retrieval_time: number;
+  time_to_first_token: number | null;
+  response_time: number;
+}
+
+export interface StreamHandlers {
+  onSources?: (sources: Source[]) => void;
+  onToken?: (token: string) => void;
+  onDone?: (metrics: StreamMetrics) => void;
+}
+
+/**
+ * Query the RAG system using the NDJSON streaming endpoint.
+ * Sources arrive first, then answer tokens as they are generated.
+ */
+export async function queryRAGStream(question: string, handlers: StreamHandlers = {}): Promise<QueryResponse> {
+  const response = await fetch(`${API_BASE_URL}/api/query/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ question }),
+  });
+
+  if (!response.ok || !response.body) {
+    const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+    throw new Error(error.detail || `HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let answer = '';
+  let sources: Source[] = [];
+
+  const handleLine = (line: string) => {
+    if (!line.trim()) return;
+    const event = JSON.parse(line);
+    if (event.type === 'sources') {
+      sources = event.sources;
+      handlers.onSources?.(sources);
+    } else if (event.type === 'token') {
+      answer += event.content;
+      handlers.onToken?.(event.content);
+    } else if (event.type === 'done') {
+      handlers.onDone?.(event.metrics);
+    } else if (event.type === 'error') {
+      throw new Error(event.detail || 'Unknown error');
+    }
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split('\n');
+    buffer = lines.pop() ?? '';
+    lines.forEach(handleLine);
+  }
+  handleLine(buffer);
+
+  return { answer, sources };
+}
+
 export async function checkHealth(): Promise<{ status: string }> {
   const response = await fetch(`${API_BASE_URL}/health`);
   if (!response.ok) {
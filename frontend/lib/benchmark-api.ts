@@ -9,6 +9,11 @@ export interface BenchmarkMetrics {
   latency_p50?: number | null;
   latency_p95?: number | null;
   latency_p99?: number | null;
+  // Split timings from Ollama's generation statistics
+  prompt_tokens_per_second?: number | null;
+  load_time?: number | null;
+  retrieval_time?: number | null;
+  generation_time?: number | null;
 }
 
 export interface BenchmarkResult {
@@ -21,6 +26,7 @@ export interface BenchmarkResult {
     memory?: number;
     cpu?: number;
     throughput?: number;
+    prompt_throughput?: number;
     model_size?: number;
   };
   quantization_level?: string;
@@ -9,6 +9,11 @@ export interface BenchmarkMetrics {
   latency_p50?: number | null;
   latency_p95?: number | null;
   latency_p99?: number | null;
+  // Split timings from Ollama's generation statistics
+  prompt_tokens_per_second?: number | null;
+  load_time?: number | null;
+  retrieval_time?: number | null;
+  generation_time?: number | null;
 }
 
 export interface OptimizationRequest {
@@ -27,13 +32,34 @@ export interface BenchmarkResponse {
   pruning_ratio?: number;
 }
 
-export async function runBaselineBenchmark(question: string): Promise<BenchmarkResponse> {
-  const response = await fetch(`${API_BASE_URL}/api/benchmark/baseline`, {
+export type BenchmarkJobStatus = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+
+export interface BenchmarkJob {
+  job_id: string;
+  kind: string;
+  params: Record<string, unknown>;
+  status: BenchmarkJobStatus;
+  progress: number;
+  message?: string | null;
+  created_at: number;
+  started_at?: number | null;
+  finished_at?: number | null;
+  cancel_requested: boolean;
+  error?: string | null;
+  result?: BenchmarkResponse | null;
+}
+
+export type BenchmarkProgressCallback = (job: BenchmarkJob) => void;
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+async function submitBenchmarkJob(body: Record<string, unknown>): Promise<BenchmarkJob> {
+  const response = await fetch(`${API_BASE_URL}/api/benchmark/jobs`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ question }),
+    body: JSON.stringify(body),
   });
 
   if (!response.ok) {
@@ -41,7 +67,49 @@ export async function runBaselineBenchmark(question: string): Promise<BenchmarkR
     throw new Error(error.detail || `HTTP error! status: ${response.status}`);
   }
 
-  const data = await response.json();
+  return response.json();
+}
+
+export async function getBenchmarkJob(jobId: string): Promise<BenchmarkJob> {
+  const response = await fetch(`${API_BASE_URL}/api/benchmark/jobs/${jobId}`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch benchmark job (status ${response.status})`);
+  }
+  return response.json();
+}
+
+export async function cancelBenchmarkJob(jobId: string): Promise<BenchmarkJob> {
+  const response = await fetch(`${API_BASE_URL}/api/benchmark/jobs/${jobId}`, { method: 'DELETE' });
+  if (!response.ok) {
+    throw new Error(`Failed to cancel benchmark job (status ${response.status})`);
+  }
+  return response.json();
+}
+
+// Benchmarks take minutes, so they run as background jobs; poll until the job finishes
+async function runBenchmarkJob(
+  body: Record<string, unknown>,
+  onProgress?: BenchmarkProgressCallback,
+): Promise<BenchmarkResponse> {
+  let job = await submitBenchmarkJob(body);
+  onProgress?.(job);
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    job = await getBenchmarkJob(job.job_id);
+    onProgress?.(job);
+  }
+
+  if (job.status !== 'succeeded' || !job.result) {
+    throw new Error(job.error || `Benchmark ${job.status}`);
+  }
+  return job.result;
+}
+
+export async function runBaselineBenchmark(
+  question: string,
+  onProgress?: BenchmarkProgressCallback,
+): Promise<BenchmarkResponse> {
+  const data = await runBenchmarkJob({ technique: 'baseline', question }, onProgress);
   return {
     technique: data.technique,
     model_name: data.model_name,
@@ -52,49 +120,64 @@ export async function runBaselineBenchmark(question: string): Promise<BenchmarkR
 export async function runQuantizationBenchmark(
   quantizationLevel: string = 'q4_0',
   question: string,
+  onProgress?: BenchmarkProgressCallback,
 ): Promise<BenchmarkResponse> {
-  const response = await fetch(`${API_BASE_URL}/api/benchmark/quantization`, {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-    },
-    body: JSON.stringify({
+  return runBenchmarkJob(
+    {
       technique: 'quantization',
       quantization_level: quantizationLevel,
       question,
-    }),
-  });
-
-  if (!response.ok) {
-    const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
-    throw new Error(error.detail || `HTTP error! status: ${response.status}`);
-  }
-
-  return response.json();
+    },
+    onProgress,
+  );
 }
 
 export async function runPruningBenchmark(
   pruningRatio: number = 0.3,
   question: string,
+  onProgress?: BenchmarkProgressCallback,
 ): Promise<BenchmarkResponse> {
-  const response = await fetch(`${API_BASE_URL}/api/benchmark/pruning`, {
-    method: 'POST',
-    headers: {
-      'Content-Type': 'application/json',
-    },
-    body: JSON.stringify({
+  return runBenchmarkJob(
+    {
       technique: 'pruning',
       pruning_ratio: pruningRatio,
       question,
-    }),
-  });
+    },
+    onProgress,
+  );
+}
+
+export interface StoredBenchmarkResult {
+  id: number;
+  technique: string;
+  model_name: string;
+  question?: string | null;
+  created_at: number;
+  metrics: BenchmarkMetrics;
+  before_metrics?: BenchmarkMetrics | null;
+  improvement_percent?: Record<string, number> | null;
+}
+
+export interface BenchmarkResultFilters {
+  model_name?: string;
+  technique?: string;
+  question?: string;
+  since?: string;
+  until?: string;
+  limit?: number;
+}
 
+export async function getBenchmarkResults(filters: BenchmarkResultFilters = {}): Promise<StoredBenchmarkResult[]> {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== '') params.set(key, String(value));
+  }
+  const response = await fetch(`${API_BASE_URL}/api/benchmark/results?${params}`);
   if (!response.ok) {
-    const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
-    throw new Error(error.detail || `HTTP error! status: ${response.status}`);
+    throw new Error('Failed to fetch benchmark results');
   }
-
-  return response.json();
+  const data = await response.json();
+  return data.results;
 }
 
 export async function getBenchmarkHistory() {
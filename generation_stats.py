@@ -0,0 +1,80 @@
+"""
+Generation statistics reported by Ollama.
+
+Every Ollama generation ends with token counts and timings for prompt
+processing (prefill), token generation and model loading. These are far
+more accurate than estimating tokens from the answer length and dividing
+by wall time that also includes retrieval. The collector is a langchain
+callback, so it works for both `invoke` and `stream`.
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+_NANOSECONDS = 1e9
+
+
+def _seconds(value: Optional[int]) -> Optional[float]:
+    return value / _NANOSECONDS if value is not None else None
+
+
+def _rate(tokens: Optional[int], seconds: Optional[float]) -> Optional[float]:
+    return tokens / seconds if tokens is not None and seconds else None
+
+
+@dataclass
+class GenerationStats:
+    """Token counts and timings (seconds) of one Ollama generation."""
+    prompt_tokens: Optional[int] = None
+    prompt_eval_time: Optional[float] = None
+    generated_tokens: Optional[int] = None
+    generation_time: Optional[float] = None
+    load_time: Optional[float] = None
+    total_time: Optional[float] = None
+
+    @property
+    def prompt_tokens_per_second(self) -> Optional[float]:
+        return _rate(self.prompt_tokens, self.prompt_eval_time)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Generation rate, excluding prompt processing and loading."""
+        return _rate(self.generated_tokens, self.generation_time)
+
+    @classmethod
+    def from_generation_info(cls, info: Optional[Dict[str, Any]]) -> Optional["GenerationStats"]:
+        if not info or info.get("eval_count") is None:
+            return None
+        return cls(
+            prompt_tokens=info.get("prompt_eval_count"),
+            prompt_eval_time=_seconds(info.get("prompt_eval_duration")),
+            generated_tokens=info.get("eval_count"),
+            generation_time=_seconds(info.get("eval_duration")),
+            load_time=_seconds(info.get("load_duration")),
+            total_time=_seconds(info.get("total_duration")),
+        )
+
+    def as_metrics(self) -> Dict[str, Optional[float]]:
+        return {
+            **asdict(self),
+            "prompt_tokens_per_second": self.prompt_tokens_per_second,
+            "tokens_per_second": self.tokens_per_second,
+        }
+
+
+class GenerationStatsCollector(BaseCallbackHandler):
+    """Captures the Ollama statistics of the generation it is passed to."""
+
+    def __init__(self):
+        self.stats: Optional[GenerationStats] = None
+        # Token context Ollama returns for continuing the conversation
+        self.context: Optional[List[int]] = None
+
+    def on_llm_end(self, response, **kwargs):
+        try:
+            info = response.generations[0][0].generation_info
+        except (AttributeError, IndexError):
+            return
+        self.stats = GenerationStats.from_generation_info(info)
+        self.context = (info or {}).get("context")
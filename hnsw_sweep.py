@@ -0,0 +1,208 @@
+"""
+Retrieval-only sweep of the Chroma HNSW index parameters.
+
+Copies the chunk embeddings of the populated collection into a throwaway
+collection for each pair of graph settings (M, construction ef), then runs
+a query set against it under every search ef and reports recall@k against
+exact brute-force search and p50/p99 search latency. Index build time and
+on-disk size depend only on the graph settings, so they are measured once
+per collection. No LLM is involved.
+
+    python hnsw_sweep.py --queries questions.txt --m 8,16,32 --search-ef 10,50,100
+
+    # Save the fastest configuration reaching 95% recall for populate_database
+    python hnsw_sweep.py --queries questions.txt --apply --min-recall 0.95
+
+Applied settings take effect when the collection is next created
+(`python populate_database.py --reset`).
+"""
+import argparse
+import itertools
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from query_sets import DEFAULT_QUERIES_PATH, load_queries, summarize
+from retrieval import collection_space, vector_distances
+
+# Vectors per add() call when building a sweep collection
+BUILD_BATCH_SIZE = 1000
+
+
+@dataclass
+class SweepResult:
+    M: int
+    construction_ef: int
+    search_ef: int
+    recall: float  # mean recall@k against brute-force search
+    latency_ms: Dict[str, float]
+    # Of the collection built for (M, construction_ef), shared by its search_ef rows
+    build_time: float  # seconds
+    disk_size_mb: float
+
+    @property
+    def settings(self) -> dict:
+        return {"M": self.M, "construction_ef": self.construction_ef, "search_ef": self.search_ef}
+
+
+def parse_grid(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1024 / 1024
+
+
+def load_corpus():
+    """IDs, embeddings and distance function of the collection built by populate_database."""
+    from get_embedding_function import get_embedding_function
+    from populate_database import open_chroma
+
+    db = open_chroma(get_embedding_function())
+    items = db.get(include=["embeddings"])
+    if not len(items["ids"]):
+        raise SystemExit("The collection is empty; run populate_database.py first")
+    return list(items["ids"]), np.asarray(items["embeddings"], dtype=np.float32), collection_space(db)
+
+
+def exact_top_k(space: str, ids: List[str], embeddings: np.ndarray, query_embedding: np.ndarray, k: int) -> List[str]:
+    distances = vector_distances(space, query_embedding, embeddings)
+    k = min(k, len(ids))
+    nearest = np.argpartition(distances, k - 1)[:k]
+    return [ids[i] for i in nearest[np.argsort(distances[nearest])]]
+
+
+def measure_queries(collection, query_embeddings: np.ndarray, ground_truth: List[List[str]], k: int):
+    """Mean recall@k and per-query latencies (seconds) of a collection."""
+    latencies, recalls = [], []
+    for query_embedding, expected in zip(query_embeddings, ground_truth):
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query_embedding.tolist()], n_results=k, include=[])["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(found) & set(expected)) / len(expected))
+    return sum(recalls) / len(recalls), latencies
+
+
+def run_configuration(ids: List[str], embeddings: np.ndarray, space: str, query_embeddings: np.ndarray,
+                      ground_truth: List[List[str]], k: int, m: int, construction_ef: int,
+                      search_efs: List[int]) -> List[SweepResult]:
+    """Build one collection with the given graph settings in a temporary directory and measure each search ef on it."""
+    if not len(query_embeddings):
+        raise ValueError("At least one query is needed to measure recall and latency")
+    import chromadb
+    from chromadb.config import Settings
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hnsw_sweep_", ignore_cleanup_errors=True) as path:
+        client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("sweep", metadata={
+            "hnsw:space": space,
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+        })
+
+        start = time.perf_counter()
+        for i in range(0, len(ids), BUILD_BATCH_SIZE):
+            collection.add(ids=ids[i:i + BUILD_BATCH_SIZE], embeddings=embeddings[i:i + BUILD_BATCH_SIZE].tolist())
+        build_time = time.perf_counter() - start
+        disk_size_mb = directory_size_mb(path)
+
+        for search_ef in search_efs:
+            # Search ef is the one HNSW setting Chroma can change without rebuilding the graph
+            collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+            recall, latencies = measure_queries(collection, query_embeddings, ground_truth, k)
+            results.append(SweepResult(
+                M=m,
+                construction_ef=construction_ef,
+                search_ef=search_ef,
+                recall=recall,
+                latency_ms=summarize(latencies),
+                build_time=build_time,
+                disk_size_mb=disk_size_mb,
+            ))
+
+        # Drop the cached client so the directory can be removed
+        if hasattr(client, "clear_system_cache"):
+            client.clear_system_cache()
+
+    return results
+
+
+def choose(results: List[SweepResult], min_recall: float) -> Optional[SweepResult]:
+    """Lowest p99 latency among configurations reaching `min_recall`, else the one with the best recall."""
+    if not results:
+        return None
+    eligible = [result for result in results if result.recall >= min_recall]
+    if eligible:
+        return min(eligible, key=lambda result: (result.latency_ms["p99"], result.build_time))
+    return max(results, key=lambda result: (result.recall, -result.latency_ms["p99"]))
+
+
+def print_results(results: List[SweepResult], k: int, chosen: Optional[SweepResult]):
+    print(f"\n{'M':>4} {'cons_ef':>8} {'search_ef':>10} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'size MB':>8}")
+    for result in results:
+        marker = "  <- chosen" if result is chosen else ""
+        print(f"{result.M:>4} {result.construction_ef:>8} {result.search_ef:>10} {result.recall:>10.3f} "
+              f"{result.latency_ms['p50']:>8.2f} {result.latency_ms['p99']:>8.2f} "
+              f"{result.build_time:>8.1f} {result.disk_size_mb:>8.1f}{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Chroma HNSW parameters against exact search.")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES_PATH, help="JSONL or text file of questions.")
+    parser.add_argument("--question-field", help="JSONL key holding the question (default: first of question/query/title/body).")
+    parser.add_argument("--k", type=int, default=5, help="Results per query (recall@k).")
+    parser.add_argument("--m", default="8,16,32", help="Comma-separated values of M.")
+    parser.add_argument("--construction-ef", default="100,200", help="Comma-separated construction ef values.")
+    parser.add_argument("--search-ef", default="10,50,100", help="Comma-separated search ef values.")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Recall the chosen configuration must reach.")
+    parser.add_argument("--apply", action="store_true", help="Save the chosen settings for populate_database.")
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    from get_embedding_function import get_embedding_function
+    from populate_database import HNSW_SETTINGS_PATH, save_hnsw_settings
+
+    # Recall and latency percentiles are undefined without queries
+    try:
+        questions = load_queries(args.queries, args.question_field)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot sweep without queries: {e}")
+    ids, embeddings, space = load_corpus()
+    print(f"{len(ids)} chunks ({space} distance), {len(questions)} queries")
+    embedding_function = get_embedding_function()
+    query_embeddings = np.asarray([embedding_function.embed_query(q) for q in questions], dtype=np.float32)
+    ground_truth = [exact_top_k(space, ids, embeddings, query, args.k) for query in query_embeddings]
+
+    results = []
+    search_efs = parse_grid(args.search_ef)
+    for m, construction_ef in itertools.product(parse_grid(args.m), parse_grid(args.construction_ef)):
+        print(f"Building M={m} construction_ef={construction_ef}...")
+        results.extend(run_configuration(ids, embeddings, space, query_embeddings, ground_truth,
+                                         args.k, m, construction_ef, search_efs))
+
+    chosen = choose(results, args.min_recall)
+    print_results(results, args.k, chosen)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "space": space,
+                "k": args.k,
+                "results": [asdict(result) for result in results],
+                "chosen": chosen.settings if chosen else None,
+            }, f, indent=2)
+    if args.apply and chosen is not None:
+        save_hnsw_settings({"space": space, **chosen.settings})
+        print(f"Saved {chosen.settings} to {HNSW_SETTINGS_PATH}; run populate_database.py --reset to rebuild with them")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Bounded execution layer for blocking retrieval and generation calls.
+
+Chroma searches and Ollama generations are synchronous, so running them
+directly inside `async def` endpoints freezes the event loop. The pool runs
+them on a sized thread pool, caps how many requests may use each model at
+once, and rejects work early (QueueFullError) once a model's wait queue is
+full, or when the expected wait would outlast the request's deadline,
+instead of letting requests pile up.
+
+A worker thread cannot be interrupted, so cancellation is cooperative: a
+request carries a `Deadline`, which generation checks between tokens and
+which is cancelled when nobody is waiting for the answer any more.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+# Weight of the latest slot hold time in the per-model service time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class QueueFullError(Exception):
+    """Raised when a request is shed: the model's queue is full, or the wait would outlast its deadline."""
+
+    MESSAGES = {
+        "queue_full": "Too many pending requests for model '{}'",
+        "deadline": "Requests for model '{}' are queued longer than this request's deadline",
+        "wait_timeout": "Timed out waiting for model '{}'",
+    }
+
+    def __init__(self, model_name: str, retry_after: int, reason: str = "queue_full"):
+        super().__init__(self.MESSAGES[reason].format(model_name))
+        self.model_name = model_name
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class RequestCancelled(Exception):
+    """Raised in a worker whose request ran past its deadline or was abandoned by its client."""
+
+    def __init__(self, reason: str):
+        super().__init__("Deadline exceeded" if reason == "deadline" else f"Request cancelled ({reason})")
+        self.reason = reason
+
+
+class Deadline:
+    """The time a request must be answered by, and whether it is still wanted. Safe to share with workers."""
+
+    def __init__(self, timeout: Optional[float] = None):
+        # No deadline when `timeout` is None or 0
+        self.expires_at = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def cancel(self, reason: str = "abandoned"):
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    def check(self):
+        """Raise RequestCancelled once the request was cancelled or its deadline has passed."""
+        if self._cancelled.is_set():
+            raise RequestCancelled(self.reason)
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            raise RequestCancelled("deadline")
+
+
+class InferenceSlot:
+    """
+    A reserved execution slot for one model. Releasing is idempotent.
+
+    While a worker call started by `InferencePool.iterate` is still running
+    on the slot, releasing waits for it to return: the model is busy until then.
+    """
+
+    def __init__(self, pool: "InferencePool", model_name: str, queue_time: float = 0.0):
+        self.pool = pool
+        self.model_name = model_name
+        # Seconds spent waiting for the slot
+        self.queue_time = queue_time
+        self.acquired_at = time.perf_counter()
+        self.released_at: Optional[float] = None
+        self.running: Optional[Future] = None
+        self._release_pending = False
+        self._on_release: List[Callable[[], None]] = []
+
+    @property
+    def service_time(self) -> float:
+        """Seconds the slot has been (or was) held."""
+        return (self.released_at or time.perf_counter()) - self.acquired_at
+
+    def release(self):
+        """Release the slot; call from the event loop."""
+        if self.released_at is not None or self._release_pending:
+            return
+        running = self.running
+        if running is not None and not running.done():
+            self._release_pending = True
+            loop = asyncio.get_running_loop()
+            running.add_done_callback(lambda _f: loop.call_soon_threadsafe(self._release_now))
+            return
+        self._release_now()
+
+    def on_release(self, callback: Callable[[], None]):
+        """Run `callback` on the event loop once the slot is released."""
+        if self.released_at is not None:
+            callback()
+        else:
+            self._on_release.append(callback)
+
+    def _release_now(self):
+        if self.released_at is None:
+            self.released_at = time.perf_counter()
+            self.pool._release(self.model_name, self.service_time)
+            for callback in self._on_release:
+                callback()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class InferencePool:
+    """Thread pool with per-model concurrency limits and bounded wait queues."""
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        per_model_limit: int = 2,
+        max_queue: int = 8,
+        retry_after: int = 2,
+    ):
+        self.max_workers = max_workers
+        self.per_model_limit = per_model_limit
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Requests holding or waiting for a slot, per model
+        self._pending: Dict[str, int] = {}
+        # Requests holding a slot, per model
+        self._active: Dict[str, int] = {}
+        # Smoothed seconds a slot is held, per model; drives the expected queue wait
+        self._service_time: Dict[str, float] = {}
+        # Cumulative counters per model, exported as metrics
+        self._admitted: Dict[str, int] = {}
+        self._shed: Dict[tuple, int] = {}
+        self._wait_seconds: Dict[str, float] = {}
+        self._service_seconds: Dict[str, float] = {}
+
+    def expected_wait(self, model_name: str) -> float:
+        """Estimated seconds a request arriving now would wait for a slot on `model_name`."""
+        queued = self._pending.get(model_name, 0) - self._active.get(model_name, 0)
+        if self._active.get(model_name, 0) < self.per_model_limit and queued <= 0:
+            return 0.0
+        return (queued + 1) / self.per_model_limit * self._service_time.get(model_name, 0.0)
+
+    def _shed_request(self, model_name: str, reason: str) -> QueueFullError:
+        self._shed[(model_name, reason)] = self._shed.get((model_name, reason), 0) + 1
+        # Retry once the queue ahead has probably drained
+        retry_after = max(self.retry_after, math.ceil(self.expected_wait(model_name)))
+        return QueueFullError(model_name, retry_after, reason)
+
+    async def acquire(self, model_name: str, timeout: Optional[float] = None) -> InferenceSlot:
+        """
+        Wait for a slot on `model_name`, or raise QueueFullError if the queue is full.
+
+        With a `timeout` (the seconds left before the request's deadline) the
+        request is also rejected up front when the expected wait is longer,
+        and gives up once it has waited that long.
+        """
+        pending = self._pending.get(model_name, 0)
+        if pending >= self.per_model_limit + self.max_queue:
+            raise self._shed_request(model_name, "queue_full")
+        if timeout is not None and self.expected_wait(model_name) > timeout:
+            raise self._shed_request(model_name, "deadline")
+
+        semaphore = self._semaphores.get(model_name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_model_limit)
+            self._semaphores[model_name] = semaphore
+
+        self._pending[model_name] = pending + 1
+        start = time.perf_counter()
+        try:
+            if timeout is None:
+                await semaphore.acquire()
+            else:
+                await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._pending[model_name] -= 1
+            raise self._shed_request(model_name, "wait_timeout")
+        except BaseException:
+            self._pending[model_name] -= 1
+            raise
+        queue_time = time.perf_counter() - start
+        self._active[model_name] = self._active.get(model_name, 0) + 1
+        self._admitted[model_name] = self._admitted.get(model_name, 0) + 1
+        self._wait_seconds[model_name] = self._wait_seconds.get(model_name, 0.0) + queue_time
+        return InferenceSlot(self, model_name, queue_time)
+
+    def _release(self, model_name: str, service_time: float):
+        self._pending[model_name] -= 1
+        self._active[model_name] -= 1
+        self._service_seconds[model_name] = self._service_seconds.get(model_name, 0.0) + service_time
+        previous = self._service_time.get(model_name)
+        self._service_time[model_name] = service_time if previous is None else (
+            previous + SERVICE_TIME_SMOOTHING * (service_time - previous))
+        self._semaphores[model_name].release()
+
+    def active_models(self) -> List[str]:
+        """Models with at least one slot held. Safe to call from worker threads."""
+        return [name for name, count in list(self._active.items()) if count]
+
+    async def run_in_worker(self, func: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool without taking a model slot."""
+        future = self.executor.submit(func, *args, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    async def run(self, model_name: str, func: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool while holding a slot for `model_name`."""
+        async with await self.acquire(model_name):
+            return await self.run_in_worker(func, *args, **kwargs)
+
+    async def run_in_slot(self, slot: InferenceSlot, func: Callable[..., Any], /, *args,
+                          deadline: Optional[Deadline] = None, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and release `slot` once it returns.
+
+        If the caller is cancelled, `deadline` is cancelled so the callable
+        can stop itself, and the slot stays taken until it actually has.
+        """
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(func, *args, **kwargs)
+        try:
+            result = await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if deadline is not None:
+                deadline.cancel()
+            future.add_done_callback(lambda _f: loop.call_soon_threadsafe(slot.release))
+            raise
+        except BaseException:
+            slot.release()
+            raise
+        slot.release()
+        return result
+
+    async def iterate(self, iterator: Iterator[Any], slot: Optional[InferenceSlot] = None) -> AsyncIterator[Any]:
+        """
+        Consume a blocking iterator on the pool, one item at a time.
+
+        The caller is responsible for holding a slot for the model that backs
+        the iterator; passing it as `slot` makes its release wait for any
+        in-flight `next()` call. If the consumer stops early, the iterator is
+        closed once that call has returned.
+        """
+        done = object()
+        future = None
+        try:
+            while True:
+                future = self.executor.submit(next, iterator, done)
+                if slot is not None:
+                    slot.running = future
+                item = await asyncio.wrap_future(future)
+                future = None
+                if item is done:
+                    break
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if future is not None and not future.done():
+                    future.add_done_callback(lambda _f: close())
+                else:
+                    close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "per_model_limit": self.per_model_limit,
+            "max_queue": self.max_queue,
+            "pending": {name: count for name, count in self._pending.items() if count},
+            "active": {name: count for name, count in self._active.items() if count},
+            "expected_wait": {name: self.expected_wait(name) for name in self._service_time},
+            "admitted": dict(self._admitted),
+            "shed": [{"model": name, "reason": reason, "count": count} for (name, reason), count in self._shed.items()],
+            "wait_seconds": dict(self._wait_seconds),
+            "service_seconds": dict(self._service_seconds),
+        }
+
+
+def create_inference_pool_from_env() -> InferencePool:
+    """Build an InferencePool sized from environment variables."""
+    return InferencePool(
+        max_workers=int(os.getenv("INFERENCE_WORKERS", "8")),
+        per_model_limit=int(os.getenv("MODEL_CONCURRENCY", "2")),
+        max_queue=int(os.getenv("MODEL_QUEUE_SIZE", "8")),
+        retry_after=int(os.getenv("QUEUE_RETRY_AFTER", "2")),
+    )
@@ -0,0 +1,279 @@
+"""
+Load generator for the query API.
+
+Replays a query set against /api/query (or /api/query/stream) either with a
+fixed number of concurrent clients (closed loop) or at a fixed arrival rate
+(open loop), then reports throughput, error rate and latency percentiles.
+
+    # Against a running API
+    python load_test.py --url http://localhost:8000 --concurrency 8 --requests 200
+
+    # Fully offline: starts the fake Ollama server and an API process pointed at it
+    python load_test.py --fake-ollama --rate 4 --duration 60 --token-latency-ms 20
+
+In open-loop mode latency is measured from each request's scheduled send
+time, so a server that falls behind shows up in the tail percentiles instead
+of silently lowering the offered load.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+
+import fake_ollama
+from query_sets import DEFAULT_QUERIES_PATH, load_queries, summarize
+
+
+@dataclass
+class RequestResult:
+    question: str
+    scheduled: float
+    latency: float
+    status: Optional[int] = None
+    error: Optional[str] = None
+    time_to_first_token: Optional[float] = None
+    cache_hit: Optional[bool] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status == 200
+
+
+@dataclass
+class LoadTestReport:
+    mode: str
+    endpoint: str
+    requests: int
+    succeeded: int
+    errors: int
+    error_rate: float
+    duration: float
+    throughput: float  # successful requests per second
+    offered_rate: Optional[float]  # requests per second (open loop only)
+    concurrency: Optional[int]
+    latency_ms: Dict[str, float]
+    time_to_first_token_ms: Optional[Dict[str, float]] = None
+    cache_hits: int = 0
+    status_codes: Dict[str, int] = field(default_factory=dict)
+    error_messages: Dict[str, int] = field(default_factory=dict)
+
+
+async def send_query(client: httpx.AsyncClient, endpoint: str, question: str, scheduled: float,
+                     timeout: float) -> RequestResult:
+    result = RequestResult(question=question, scheduled=scheduled, latency=0.0)
+    try:
+        if endpoint.endswith("/stream"):
+            async with client.stream("POST", endpoint, json={"question": question}, timeout=timeout) as response:
+                result.status = response.status_code
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["type"] == "token" and result.time_to_first_token is None:
+                        result.time_to_first_token = time.perf_counter() - scheduled
+                    elif event["type"] == "done":
+                        result.cache_hit = event["metrics"].get("cache_hit")
+                    elif event["type"] == "error":
+                        result.error = event.get("detail", "stream error")
+        else:
+            response = await client.post(endpoint, json={"question": question}, timeout=timeout)
+            result.status = response.status_code
+            if response.status_code == 200:
+                result.cache_hit = (response.json().get("metrics") or {}).get("cache_hit")
+        if result.status != 200 and result.error is None:
+            result.error = f"HTTP {result.status}"
+    except (httpx.HTTPError, ValueError) as e:
+        result.error = type(e).__name__
+    result.latency = time.perf_counter() - scheduled
+    return result
+
+
+def question_at(questions: List[str], index: int) -> str:
+    return questions[index % len(questions)]
+
+
+async def run_closed_loop(client, endpoint, questions, concurrency, total, duration, timeout) -> List[RequestResult]:
+    """`concurrency` clients, each sending its next request as soon as the previous one returns."""
+    results: List[RequestResult] = []
+    counter = iter(range(total if total else sys.maxsize))
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client_loop():
+        for index in counter:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            results.append(await send_query(client, endpoint, question_at(questions, index), time.perf_counter(), timeout))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return results
+
+
+async def run_open_loop(client, endpoint, questions, rate, total, duration, timeout, arrival, seed) -> List[RequestResult]:
+    """Send requests at `rate` per second regardless of how fast the server answers."""
+    rng = random.Random(seed)
+    tasks = []
+    start = time.perf_counter()
+    scheduled = start
+    index = 0
+    while (not total or index < total) and (not duration or scheduled - start < duration):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_query(client, endpoint, question_at(questions, index), scheduled, timeout)))
+        index += 1
+        scheduled += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    return list(await asyncio.gather(*tasks))
+
+
+def build_report(results: List[RequestResult], elapsed: float, args) -> LoadTestReport:
+    succeeded = [result for result in results if result.ok]
+    ttfts = [result.time_to_first_token for result in succeeded if result.time_to_first_token is not None]
+    return LoadTestReport(
+        mode="open" if args.rate else "closed",
+        endpoint=args.endpoint,
+        requests=len(results),
+        succeeded=len(succeeded),
+        errors=len(results) - len(succeeded),
+        error_rate=(len(results) - len(succeeded)) / len(results) if results else 0.0,
+        duration=elapsed,
+        throughput=len(succeeded) / elapsed if elapsed > 0 else 0.0,
+        offered_rate=args.rate,
+        concurrency=None if args.rate else args.concurrency,
+        latency_ms=summarize([result.latency for result in succeeded]),
+        time_to_first_token_ms=summarize(ttfts) if ttfts else None,
+        cache_hits=sum(1 for result in succeeded if result.cache_hit),
+        status_codes=dict(Counter(str(result.status) for result in results)),
+        error_messages=dict(Counter(result.error for result in results if result.error)),
+    )
+
+
+def print_report(report: LoadTestReport):
+    load = f"{report.offered_rate:g} req/s offered" if report.mode == "open" else f"{report.concurrency} concurrent clients"
+    print(f"\n{report.endpoint}: {report.requests} requests in {report.duration:.1f}s ({load})")
+    print(f"  Throughput:  {report.throughput:.2f} req/s")
+    print(f"  Errors:      {report.errors} ({report.error_rate:.1%})  status codes: {report.status_codes}")
+    if report.error_messages:
+        print(f"  Error types: {report.error_messages}")
+    print(f"  Cache hits:  {report.cache_hits}")
+    for label, summary in (("Latency", report.latency_ms), ("TTFT", report.time_to_first_token_ms)):
+        if summary:
+            print(f"  {label + ' (ms):':<15}" + "  ".join(f"{key} {value:.0f}" for key, value in summary.items()))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(port: int, env: Dict[str, str], ready_timeout: float) -> subprocess.Popen:
+    """Start api_server in a subprocess and wait until /ready (or /health) answers."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=2).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError(f"API server was not ready after {ready_timeout:.0f}s")
+
+
+async def run(args) -> LoadTestReport:
+    questions = load_queries(args.queries, args.question_field)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits) as client:
+        if args.warmup:
+            await run_closed_loop(client, args.endpoint, questions, 1, args.warmup, None, args.timeout)
+        start = time.perf_counter()
+        if args.rate:
+            results = await run_open_loop(client, args.endpoint, questions, args.rate, args.requests,
+                                          args.duration, args.timeout, args.arrival, args.seed)
+        else:
+            results = await run_closed_loop(client, args.endpoint, questions, args.concurrency, args.requests,
+                                            args.duration, args.timeout)
+        elapsed = time.perf_counter() - start
+    return build_report(results, elapsed, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a query set against the RAG API.")
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of a running API.")
+    parser.add_argument("--endpoint", default="/api/query", choices=["/api/query", "/api/query/stream"])
+    parser.add_argument("--queries", default=DEFAULT_QUERIES_PATH, help="JSONL or text file of questions.")
+    parser.add_argument("--question-field", help="JSONL key holding the question (default: first of question/query/title/body).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (closed loop).")
+    parser.add_argument("--rate", type=float, help="Arrival rate in requests/second (open loop; overrides --concurrency).")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson", help="Open-loop inter-arrival times.")
+    parser.add_argument("--requests", type=int, default=100, help="Requests to send (0 = until --duration).")
+    parser.add_argument("--duration", type=float, help="Stop sending after this many seconds.")
+    parser.add_argument("--warmup", type=int, default=2, help="Unrecorded requests sent first.")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for Poisson arrivals.")
+    parser.add_argument("--output", help="Also write the report as JSON to this file.")
+
+    offline = parser.add_argument_group("offline mode")
+    offline.add_argument("--start-api", action="store_true", help="Start api_server in a subprocess.")
+    offline.add_argument("--fake-ollama", action="store_true", help="Start the fake Ollama server (implies --start-api).")
+    offline.add_argument("--no-answer-cache", action="store_true", help="Disable the answer cache in the started API.")
+    offline.add_argument("--token-latency-ms", type=float, default=20.0)
+    offline.add_argument("--prompt-token-latency-ms", type=float, default=0.2)
+    offline.add_argument("--embed-latency-ms", type=float, default=5.0)
+    offline.add_argument("--response-tokens", type=int, default=64)
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("--requests 0 needs --duration")
+
+    api_process = None
+    fake_server = None
+    try:
+        if args.fake_ollama or args.start_api:
+            env = {"EAGER_INIT": "1"}
+            if args.no_answer_cache:
+                env["ANSWER_CACHE_ENABLED"] = "0"
+            if args.fake_ollama:
+                fake_server = fake_ollama.start_in_background(fake=fake_ollama.FakeOllama(
+                    token_latency_ms=args.token_latency_ms,
+                    prompt_token_latency_ms=args.prompt_token_latency_ms,
+                    embed_latency_ms=args.embed_latency_ms,
+                    response_tokens=args.response_tokens,
+                ))
+                env["OLLAMA_HOST"] = f"http://127.0.0.1:{fake_server.server_port}"
+                print(f"Fake Ollama listening on {env['OLLAMA_HOST']}")
+            port = free_port()
+            api_process = start_api(port, env, ready_timeout=120)
+            args.url = f"http://127.0.0.1:{port}"
+            print(f"API server started on {args.url}")
+
+        report = asyncio.run(run(args))
+        print_report(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(asdict(report), f, indent=2)
+    finally:
+        if api_process is not None:
+            api_process.terminate()
+            api_process.wait(timeout=10)
+        if fake_server is not None:
+            fake_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
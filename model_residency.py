@@ -0,0 +1,207 @@
+"""
+Model residency management for the Ollama server.
+
+Caching `OllamaLLM` wrappers says nothing about whether the weights are
+loaded on the server, so the first query after idle (and every switch
+between benchmark variants) pays a cold load. The manager preloads models,
+sets a keep-alive per model, tracks which models the server has loaded and
+evicts the least recently used ones when a memory budget would be exceeded.
+
+Residency is an optimisation: when Ollama's metadata calls fail, the manager
+logs the error and lets the query go ahead, since Ollama loads a model on
+demand anyway.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    import ollama
+
+
+def normalize_model_name(model_name: str) -> str:
+    """Ollama reports untagged models as "<name>:latest"."""
+    return model_name if ":" in model_name else f"{model_name}:latest"
+
+
+class ModelResidencyManager:
+    """Keeps frequently used models loaded on the Ollama server."""
+
+    def __init__(
+        self,
+        client: Optional["ollama.Client"] = None,
+        keep_alive: str = "30m",
+        keep_alive_overrides: Optional[Dict[str, str]] = None,
+        memory_budget_mb: float = 0,
+        refresh_interval: float = 30.0,
+        in_use: Optional[Callable[[str], bool]] = None,
+    ):
+        self._client = client
+        self.keep_alive = keep_alive
+        self.keep_alive_overrides = {normalize_model_name(k): v for k, v in (keep_alive_overrides or {}).items()}
+        # 0 disables budget-based eviction
+        self.memory_budget_mb = memory_budget_mb
+        self.refresh_interval = refresh_interval
+        # Whether a (normalized) model is serving requests right now; those are never evicted
+        self.in_use = in_use
+        # Loaded models, least recently used first: name -> size in MB
+        self._loaded: "OrderedDict[str, float]" = OrderedDict()
+        self._load_times: Dict[str, float] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.cold_loads = 0
+        self.evictions = 0
+
+    @property
+    def client(self) -> "ollama.Client":
+        # The ollama client (and httpx) is only imported once the server is contacted
+        if self._client is None:
+            import ollama
+
+            self._client = ollama.Client()
+        return self._client
+
+    def is_loaded(self, model_name: str) -> bool:
+        with self._lock:
+            return normalize_model_name(model_name) in self._loaded
+
+    def keep_alive_for(self, model_name: str) -> str:
+        return self.keep_alive_overrides.get(normalize_model_name(model_name), self.keep_alive)
+
+    def refresh(self, force: bool = False):
+        """Sync the loaded set with what the server reports (models expire on their own)."""
+        now = time.time()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        running = {model.model: (model.size or 0) / 1024 / 1024 for model in self.client.ps().models}
+        with self._lock:
+            for name in list(self._loaded):
+                if name not in running:
+                    del self._loaded[name]
+            for name, size_mb in running.items():
+                is_new = name not in self._loaded
+                self._loaded[name] = size_mb
+                if is_new:
+                    # Loaded by someone else; treat as least recently used
+                    self._loaded.move_to_end(name, last=False)
+            self._last_refresh = now
+
+    def _estimated_size_mb(self, name: str) -> float:
+        """Size of the model on disk, or 0 when unknown."""
+        try:
+            models = self.client.list().models
+        except Exception as e:
+            print(f"Error listing models: {e}")
+            return 0.0
+        for model in models:
+            if model.model == name:
+                return (model.size or 0) / 1024 / 1024
+        return 0.0
+
+    def _make_room(self, name: str, needed_mb: float):
+        """Unload least recently used models until `needed_mb` fits in the budget."""
+        if not self.memory_budget_mb:
+            return
+        with self._lock:
+            used = sum(self._loaded.values())
+            victims = []
+            for victim, size_mb in self._loaded.items():
+                if used + needed_mb <= self.memory_budget_mb:
+                    break
+                if victim != name and not (self.in_use is not None and self.in_use(victim)):
+                    victims.append(victim)
+                    used -= size_mb
+        for victim in victims:
+            try:
+                self.unload(victim)
+            except Exception as e:
+                print(f"Error unloading model {victim}: {e}")
+
+    def ensure_loaded(self, model_name: str):
+        """Make sure `model_name` is resident, loading it (and evicting others) if needed."""
+        name = normalize_model_name(model_name)
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Error checking loaded models: {e}")
+            return
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return
+
+        with self._load_lock:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return
+            self._make_room(name, self._estimated_size_mb(name))
+            start_time = time.time()
+            try:
+                # An empty prompt loads the weights without generating anything
+                self.client.generate(model=name, prompt="", keep_alive=self.keep_alive_for(name))
+            except Exception as e:
+                # The query itself will load the model, or report what is wrong
+                print(f"Error loading model {name}: {e}")
+                return
+            self._load_times[name] = time.time() - start_time
+            self.cold_loads += 1
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                print(f"Error checking loaded models: {e}")
+            with self._lock:
+                if name not in self._loaded:
+                    self._loaded[name] = 0.0
+                self._loaded.move_to_end(name)
+
+    def unload(self, model_name: str):
+        name = normalize_model_name(model_name)
+        self.client.generate(model=name, prompt="", keep_alive=0)
+        with self._lock:
+            self._loaded.pop(name, None)
+        self.evictions += 1
+
+    def preload(self, model_names: Iterable[str]):
+        for model_name in model_names:
+            try:
+                self.ensure_loaded(model_name)
+            except Exception as e:
+                print(f"Error preloading model {model_name}: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = [
+                {"model": name, "size_mb": size_mb, "load_time": self._load_times.get(name)}
+                for name, size_mb in reversed(self._loaded.items())
+            ]
+        return {
+            "loaded": loaded,
+            "memory_budget_mb": self.memory_budget_mb or None,
+            "memory_used_mb": sum(model["size_mb"] for model in loaded),
+            "keep_alive": self.keep_alive,
+            "cold_loads": self.cold_loads,
+            "evictions": self.evictions,
+        }
+
+
+def parse_keep_alive_overrides(value: str) -> Dict[str, str]:
+    """Parse "model=duration,model=duration" (e.g. "mistral=1h,llama3.2:1b-instruct-q4_0=5m")."""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model_name, _, keep_alive = item.rpartition("=")
+        if model_name:
+            overrides[model_name] = keep_alive
+    return overrides
+
+
+def create_residency_manager_from_env(in_use: Optional[Callable[[str], bool]] = None) -> ModelResidencyManager:
+    return ModelResidencyManager(
+        keep_alive=os.getenv("MODEL_KEEP_ALIVE", "30m"),
+        keep_alive_overrides=parse_keep_alive_overrides(os.getenv("MODEL_KEEP_ALIVE_OVERRIDES", "")),
+        memory_budget_mb=float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")),
+        in_use=in_use,
+    )
@@ -0,0 +1,161 @@
+"""
+Confidence-based cascade between a small and a large model.
+
+Most questions retrieve a couple of chunks that closely match them, and a
+1B model answers those about as well as a 7B one in a fraction of the time
+and memory. The router sends a question to the small model when retrieval
+looks confident: the best chunk is close to the question, several chunks
+back it up and the question is short. Everything else goes to the large
+model, and so does any question whose small answer fails a cheap check
+(too short, a refusal, or mostly words that are not in the retrieved
+context).
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+SMALL = "small"
+LARGE = "large"
+ESCALATED = "escalated"
+ROUTES = (SMALL, LARGE, ESCALATED)
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+# How small models say the context has no answer
+_REFUSAL_RE = re.compile(
+    r"\b(i don'?t know|i do not know|i'?m not sure|cannot answer|can'?t answer|unable to answer"
+    r"|(does not|doesn'?t) (contain|provide|mention|say)|no information|not (mentioned|provided|specified) in)\b"
+)
+
+
+@dataclass
+class RouteDecision:
+    """Model picked for a question before generation, and why."""
+    route: str
+    model_name: str
+    reason: str
+    best_distance: Optional[float] = None
+    # Retrieved chunks within max_distance of the question
+    support: int = 0
+    question_words: int = 0
+
+    def as_metrics(self) -> dict:
+        return {
+            "route": self.route,
+            "route_reason": self.reason,
+            "route_best_distance": self.best_distance,
+            "route_support": self.support,
+        }
+
+
+class CascadeRouter:
+    """Routes questions between `small_model` and `large_model` and counts the outcomes."""
+
+    def __init__(
+        self,
+        small_model: str,
+        large_model: str,
+        max_distance: float = 0.6,
+        min_support: int = 2,
+        max_question_words: int = 25,
+        min_answer_chars: int = 40,
+        min_grounding: float = 0.5,
+    ):
+        self.small_model = small_model
+        self.large_model = large_model
+        # In the collection's distance units (squared L2 unless hnsw:space says otherwise)
+        self.max_distance = max_distance
+        self.min_support = min_support
+        self.max_question_words = max_question_words
+        self.min_answer_chars = min_answer_chars
+        # Fraction of the answer's content words that must appear in the context
+        self.min_grounding = min_grounding
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {route: 0 for route in ROUTES}
+        self._seconds: Dict[str, float] = {route: 0.0 for route in ROUTES}
+        self._reasons: Dict[str, int] = {}
+
+    @property
+    def cache_key(self) -> str:
+        """Answer cache key for cascaded answers, which may come from either model."""
+        return f"cascade:{self.small_model}:{self.large_model}"
+
+    def route(self, question: str, results) -> RouteDecision:
+        """Pick the model for a question from its (Document, distance, extras) search results."""
+        words = len(_WORD_RE.findall(question.lower()))
+        distances = [distance for _doc, distance, _extras in results if distance is not None]
+        best = min(distances) if distances else None
+        support = sum(1 for distance in distances if distance <= self.max_distance)
+
+        def decide(route: str, reason: str) -> RouteDecision:
+            model_name = self.small_model if route == SMALL else self.large_model
+            return RouteDecision(route, model_name, reason, best, support, words)
+
+        if not results:
+            return decide(LARGE, "no_results")
+        if words > self.max_question_words:
+            return decide(LARGE, "long_question")
+        if not distances:
+            # Keyword lookups ("SHANK3", "ADOS-2") are short factual questions
+            return decide(SMALL, "keyword_lookup")
+        if best > self.max_distance:
+            return decide(LARGE, "weak_match")
+        if support < min(self.min_support, len(results)):
+            return decide(LARGE, "little_support")
+        return decide(SMALL, "confident")
+
+    def check_answer(self, answer: str, results) -> Optional[str]:
+        """Why a small model's answer should be escalated, or None when it looks usable."""
+        text = answer.strip().lower()
+        if len(text) < self.min_answer_chars:
+            return "short_answer"
+        if _REFUSAL_RE.search(text):
+            return "refusal"
+        # Content words only; short function words appear everywhere
+        words = [word for word in _WORD_RE.findall(text) if len(word) > 3]
+        if words:
+            context = set(_WORD_RE.findall(" ".join(doc.page_content.lower() for doc, _d, _e in results)))
+            grounded = sum(1 for word in words if word in context) / len(words)
+            if grounded < self.min_grounding:
+                return "ungrounded"
+        return None
+
+    def record(self, route: str, reason: str, seconds: float):
+        with self._lock:
+            self._counts[route] += 1
+            self._seconds[route] += seconds
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {
+                    "count": self._counts[route],
+                    "mean_latency": self._seconds[route] / self._counts[route] if self._counts[route] else None,
+                }
+                for route in ROUTES
+            }
+            total = sum(self._counts.values())
+            return {
+                "small_model": self.small_model,
+                "large_model": self.large_model,
+                "routes": routes,
+                "reasons": dict(self._reasons),
+                "small_share": self._counts[SMALL] / total if total else None,
+                "escalation_rate": (self._counts[ESCALATED] / (self._counts[SMALL] + self._counts[ESCALATED])
+                                    if self._counts[SMALL] + self._counts[ESCALATED] else None),
+            }
+
+
+def create_router_from_env(small_model: str, large_model: str) -> CascadeRouter:
+    """Build the cascade router from environment variables; the models default to the given names."""
+    return CascadeRouter(
+        small_model=os.getenv("ROUTER_SMALL_MODEL", small_model),
+        large_model=os.getenv("ROUTER_LARGE_MODEL", large_model),
+        max_distance=float(os.getenv("ROUTER_MAX_DISTANCE", "0.6")),
+        min_support=int(os.getenv("ROUTER_MIN_SUPPORT", "2")),
+        max_question_words=int(os.getenv("ROUTER_MAX_QUESTION_WORDS", "25")),
+        min_answer_chars=int(os.getenv("ROUTER_MIN_ANSWER_CHARS", "40")),
+        min_grounding=float(os.getenv("ROUTER_MIN_GROUNDING", "0.5")),
+    )
@@ -5,8 +5,8 @@ import time
 import psutil
 import subprocess
 import json
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, asdict, field
 import os
 
 
@@ -16,11 +16,15 @@ class BenchmarkMetrics:
     response_time: float  # seconds
     memory_usage_mb: float  # MB
     cpu_usage_percent: float  # %
-    tokens_per_second: float  # tokens/sec
+    tokens_per_second: float  # generated tokens/sec (Ollama eval rate when available)
     model_size_mb: Optional[float] = None  # MB
     latency_p50: Optional[float] = None  # ms
     latency_p95: Optional[float] = None  # ms
     latency_p99: Optional[float] = None  # ms
+    prompt_tokens_per_second: Optional[float] = None  # prompt tokens/sec (prefill)
+    load_time: Optional[float] = None  # seconds spent loading the model, observed on the warm-up run
+    retrieval_time: Optional[float] = None  # seconds (embedding, search and prompt building)
+    generation_time: Optional[float] = None  # seconds spent generating tokens
 
 
 @dataclass
@@ -31,13 +35,92 @@ class OptimizationResult:
     metrics: BenchmarkMetrics
     before_metrics: Optional[BenchmarkMetrics] = None
     improvement_percent: Optional[Dict[str, float]] = None
+    question: Optional[str] = None
+    created_at: Optional[float] = None  # Unix time
+    id: Optional[int] = None  # Row ID once persisted
+
+
+@dataclass
+class MatrixVariant:
+    """A model configuration benchmarked against the baseline in a matrix run."""
+    model_name: str
+    technique: str  # "quantization", "pruning", ...
+    label: Optional[str] = None  # Column name in the comparison table; defaults to model_name
+
+    @property
+    def name(self) -> str:
+        return self.label or self.model_name
+
+
+@dataclass
+class MatrixCell:
+    """One (variant, question) benchmark; variant is None for the baseline cell."""
+    question: str
+    variant: Optional[str]
+    result: OptimizationResult
+    reused: bool = False  # Taken from an earlier run instead of measured now
+
+
+@dataclass
+class BenchmarkMatrix:
+    """Variants x questions comparison against a shared baseline."""
+    baseline_model: str
+    questions: List[str]
+    variants: List[MatrixVariant]
+    cells: List[MatrixCell] = field(default_factory=list)
+
+    def cell(self, question: str, variant: Optional[str] = None) -> Optional[MatrixCell]:
+        return next((c for c in self.cells if c.question == question and c.variant == variant), None)
+
+    def aggregates(self) -> Dict[str, Dict[str, float]]:
+        """Mean improvement (%) of each variant over the baseline across questions."""
+        aggregates = {}
+        for variant in self.variants:
+            totals: Dict[str, List[float]] = {}
+            for cell in self.cells:
+                if cell.variant == variant.name and cell.result.improvement_percent:
+                    for key, value in cell.result.improvement_percent.items():
+                        totals.setdefault(key, []).append(value)
+            aggregates[variant.name] = {key: sum(values) / len(values) for key, values in totals.items()}
+        return aggregates
+
+    def table(self) -> List[Dict[str, Any]]:
+        """One row per cell: question, variant, key metrics and improvements over the baseline."""
+        rows = []
+        for cell in self.cells:
+            metrics = cell.result.metrics
+            rows.append({
+                "question": cell.question,
+                "variant": cell.variant or "baseline",
+                "model_name": cell.result.model_name,
+                "technique": cell.result.technique,
+                "reused": cell.reused,
+                "response_time": metrics.response_time,
+                "tokens_per_second": metrics.tokens_per_second,
+                "prompt_tokens_per_second": metrics.prompt_tokens_per_second,
+                "latency_p95": metrics.latency_p95,
+                "improvements": cell.result.improvement_percent or {},
+            })
+        return rows
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "baseline_model": self.baseline_model,
+            "questions": self.questions,
+            "variants": [asdict(variant) for variant in self.variants],
+            "table": self.table(),
+            "aggregates": self.aggregates(),
+            "cells": [asdict(cell) for cell in self.cells],
+        }
 
 
 class ModelOptimizer:
     """Handles model optimization and benchmarking."""
     
-    def __init__(self):
+    def __init__(self, store=None):
         self.benchmark_history: List[OptimizationResult] = []
+        # Optional BenchmarkStore that every result is persisted to
+        self.store = store
         self.current_model = "mistral"
         self.quantization_levels = ["q4_0", "q5_0", "q8_0"]  # Ollama quantization formats
         self.process = psutil.Process()
@@ -78,17 +161,36 @@ class ModelOptimizer:
         self, 
         query_func, 
         query_text: str,
-        iterations: int = 3
+        iterations: int = 3,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
     ) -> BenchmarkMetrics:
-        """Measure performance of a query function."""
+        """
+        Measure performance of a query function.
+
+        `query_func` returns either the answer text or an (answer, metrics)
+        tuple, where metrics are those of `query_rag(..., return_metrics=True)`.
+        Token rates then come from Ollama's own counters; for plain answers
+        they are estimated (~4 characters per token) over the wall time.
+
+        `progress_callback(completed, total)` is called before the warm-up
+        run and after every iteration; it may raise to abort the benchmark.
+        """
+        if progress_callback:
+            progress_callback(0, iterations)
         response_times = []
         memory_readings = []
         cpu_readings = []
         token_counts = []
+        prompt_rates = []
+        retrieval_times = []
+        generation_times = []
+        load_time = None
         
-        # Warm-up run
+        # Warm-up run (its load time shows what a cold model costs)
         try:
-            _ = query_func(query_text)
+            warmup = query_func(query_text)
+            if isinstance(warmup, tuple):
+                load_time = warmup[1].get("load_time")
         except:
             pass
         
@@ -98,18 +200,30 @@ class ModelOptimizer:
             cpu_before = self.process.cpu_percent(interval=0.1)
             
             # Measure query time
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
                 response = query_func(query_text)
-                end_time = time.time()
+                end_time = time.perf_counter()
                 response_time = end_time - start_time
                 response_times.append(response_time)
-                
-                # Estimate tokens (rough approximation: ~4 chars per token)
-                if isinstance(response, str):
+
+                query_metrics = {}
+                if isinstance(response, tuple):
+                    response, query_metrics = response
+                if query_metrics.get("tokens_per_second") is not None:
+                    token_counts.append(query_metrics["tokens_per_second"])
+                elif isinstance(response, str):
+                    # Estimate tokens (rough approximation: ~4 chars per token)
                     estimated_tokens = len(response) / 4
-                    tokens_per_sec = estimated_tokens / response_time if response_time > 0 else 0
+                    generation_time = query_metrics.get("generation_time") or response_time
+                    tokens_per_sec = estimated_tokens / generation_time if generation_time > 0 else 0
                     token_counts.append(tokens_per_sec)
+                if query_metrics.get("prompt_tokens_per_second") is not None:
+                    prompt_rates.append(query_metrics["prompt_tokens_per_second"])
+                if query_metrics.get("retrieval_time") is not None:
+                    retrieval_times.append(query_metrics["retrieval_time"])
+                if query_metrics.get("generation_time") is not None:
+                    generation_times.append(query_metrics["generation_time"])
             except Exception as e:
                 print(f"Error in query: {e}")
                 continue
@@ -121,6 +235,9 @@ class ModelOptimizer:
             memory_readings.append(memory_after - memory_before)
             cpu_readings.append((cpu_before + cpu_after) / 2)
             
+            if progress_callback:
+                progress_callback(i + 1, iterations)
+
             # Small delay between iterations
             time.sleep(0.5)
         
@@ -141,7 +258,11 @@ class ModelOptimizer:
             tokens_per_second=sum(token_counts) / len(token_counts) if token_counts else 0,
             latency_p50=p50,
             latency_p95=p95,
-            latency_p99=p99
+            latency_p99=p99,
+            prompt_tokens_per_second=sum(prompt_rates) / len(prompt_rates) if prompt_rates else None,
+            load_time=load_time,
+            retrieval_time=sum(retrieval_times) / len(retrieval_times) if retrieval_times else None,
+            generation_time=sum(generation_times) / len(generation_times) if generation_times else None,
         )
     
     def benchmark_model(
@@ -149,13 +270,22 @@ class ModelOptimizer:
         model_name: str,
         query_func,
         test_queries: List[str],
-        technique: str = "baseline"
+        technique: str = "baseline",
+        baseline: Optional[OptimizationResult] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
     ) -> OptimizationResult:
-        """Benchmark a model configuration."""
+        """
+        Benchmark a model configuration.
+
+        With a `baseline` result the improvements over it are filled in. The
+        result is appended to `benchmark_history` and persisted to the store.
+        """
         # Use first test query for benchmarking
         test_query = test_queries[0] if test_queries else "What is autism?"
         
-        metrics = self.measure_query_performance(query_func, test_query, iterations=3)
+        metrics = self.measure_query_performance(
+            query_func, test_query, iterations=3, progress_callback=progress_callback
+        )
         model_size = self.get_ollama_model_size(model_name)
         if model_size:
             metrics.model_size_mb = model_size
@@ -163,10 +293,95 @@ class ModelOptimizer:
         result = OptimizationResult(
             technique=technique,
             model_name=model_name,
-            metrics=metrics
+            metrics=metrics,
+            question=test_query,
+            created_at=time.time(),
         )
-        
+        if baseline is not None:
+            result.before_metrics = baseline.metrics
+            result.improvement_percent = self.calculate_improvement(baseline.metrics, metrics)
+
+        self.record_result(result)
         return result
+
+    def record_result(self, result: OptimizationResult):
+        """Keep `result` in the in-memory history and the persistent store."""
+        self.benchmark_history.append(result)
+        if self.store is not None:
+            try:
+                self.store.add(result)
+            except Exception as e:
+                print(f"Error saving benchmark result: {e}")
+
+    def fresh_baseline(self, model_name: str, question: str,
+                       max_age: Optional[float] = None) -> Optional[OptimizationResult]:
+        """Most recent baseline of `model_name` on `question` no older than `max_age` seconds."""
+        if max_age is not None and max_age <= 0:
+            return None
+        if self.store is not None:
+            try:
+                return self.store.latest(model_name, question=question, technique="baseline", max_age=max_age)
+            except Exception as e:
+                print(f"Error reading benchmark results: {e}")
+        cutoff = time.time() - max_age if max_age is not None else None
+        for result in reversed(self.benchmark_history):
+            if (result.technique == "baseline" and result.model_name == model_name and result.question == question
+                    and (cutoff is None or (result.created_at or 0) >= cutoff)):
+                return result
+        return None
+
+    def run_matrix(
+        self,
+        baseline_model: str,
+        variants: List[MatrixVariant],
+        questions: List[str],
+        query_func_for: Callable[[str], Callable[[str], Any]],
+        baseline_max_age: Optional[float] = 3600,
+        progress_callback: Optional[Callable[[float, int], None]] = None,
+    ) -> BenchmarkMatrix:
+        """
+        Benchmark every variant on every question once, against a baseline.
+
+        `query_func_for(model_name)` returns the query function for that
+        model; unlike `benchmark_model`'s, it must answer the question it is
+        given. Baseline cells measured within `baseline_max_age` seconds are
+        reused instead of re-run (None reuses any age, 0 never reuses).
+
+        `progress_callback(completed_cells, total_cells)` is called as cells
+        finish (with fractions while one runs); it may raise to abort.
+        """
+        matrix = BenchmarkMatrix(baseline_model=baseline_model, questions=list(questions), variants=list(variants))
+        total = len(questions) * (len(variants) + 1)
+        completed = 0
+
+        def run_cell(model_name: str, question: str, technique: str,
+                     baseline: Optional[OptimizationResult]) -> OptimizationResult:
+            def cell_progress(done: int, iterations: int):
+                if progress_callback:
+                    progress_callback(completed + done / iterations, total)
+
+            return self.benchmark_model(
+                model_name, query_func_for(model_name), [question], technique=technique,
+                baseline=baseline, progress_callback=cell_progress,
+            )
+
+        for question in questions:
+            baseline = self.fresh_baseline(baseline_model, question, baseline_max_age)
+            reused = baseline is not None
+            if baseline is None:
+                baseline = run_cell(baseline_model, question, "baseline", None)
+            matrix.cells.append(MatrixCell(question=question, variant=None, result=baseline, reused=reused))
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, total)
+
+            for variant in variants:
+                result = run_cell(variant.model_name, question, variant.technique, baseline)
+                matrix.cells.append(MatrixCell(question=question, variant=variant.name, result=result))
+                completed += 1
+                if progress_callback:
+                    progress_callback(completed, total)
+        return matrix
     
     def calculate_improvement(
         self,
@@ -191,6 +406,10 @@ class ModelOptimizer:
         # Throughput improvement (higher is better)
         if before.tokens_per_second > 0:
             improvements["throughput"] = ((after.tokens_per_second - before.tokens_per_second) / before.tokens_per_second) * 100
+
+        # Prompt processing improvement (higher is better)
+        if before.prompt_tokens_per_second and after.prompt_tokens_per_second is not None:
+            improvements["prompt_throughput"] = ((after.prompt_tokens_per_second - before.prompt_tokens_per_second) / before.prompt_tokens_per_second) * 100
         
         # Model size improvement (lower is better)
         if before.model_size_mb and after.model_size_mb and before.model_size_mb > 0:
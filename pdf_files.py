@@ -0,0 +1,208 @@
+"""
+Serving the source PDFs behind /api/pdf.
+
+`PdfLibrary` indexes the PDFs under data/ once, so a request is a dictionary
+lookup instead of several path resolutions and `os.path.exists` calls; only
+indexed files can ever be served. Responses carry ETag and Last-Modified,
+answer conditional GETs with 304 and honour single byte ranges, so PDF
+viewers can fetch just the pages they display. `PageCache` extracts single
+pages as small PDFs and keeps them in an LRU cache on disk.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+
+class PdfLibrary:
+    """Maps the names clients use for a PDF to its absolute path under `data_path`."""
+
+    def __init__(self, data_path: str, project_root: str, rescan_interval: float = 5.0):
+        self.data_path = os.path.abspath(data_path)
+        self.project_root = os.path.abspath(project_root)
+        self.rescan_interval = rescan_interval
+        self._paths: Dict[str, str] = {}
+        self._scanned_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return name.replace("\\", "/").strip("/").lower()
+
+    def scan(self):
+        """Rebuild the index. Each PDF is reachable by its project-relative path, data-relative path and filename."""
+        paths = {}
+        for root, dirs, files in os.walk(self.data_path):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                if name.startswith(".") or not name.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                # Full paths win over bare filenames shared by several files
+                paths.setdefault(self._key(name), path)
+                paths[self._key(os.path.relpath(path, self.data_path))] = path
+                paths[self._key(os.path.relpath(path, self.project_root))] = path
+        with self._lock:
+            self._paths = paths
+            self._scanned_at = time.monotonic()
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Absolute path of the PDF called `name` (as in a chunk's `source`), or None."""
+        name = name.replace("\\", "/")
+        if os.path.isabs(name):
+            name = os.path.relpath(os.path.normpath(name), self.project_root)
+        key = self._key(os.path.normpath(name).replace("\\", "/"))
+        if self._scanned_at is None:
+            self.scan()
+        path = self._paths.get(key)
+        if path is None:
+            # Unknown name: pick up files added since the last scan, at most every rescan_interval
+            if time.monotonic() - self._scanned_at >= self.rescan_interval:
+                self.scan()
+                path = self._paths.get(key)
+            if path is None:
+                path = self._paths.get(self._key(os.path.basename(name)))
+        if path is not None and not os.path.isfile(path):
+            return None
+        return path
+
+
+def validators(path: str, variant: str = "") -> Tuple[str, str, float]:
+    """(ETag, Last-Modified, mtime) of a file; `variant` distinguishes representations derived from it."""
+    stat = os.stat(path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{variant}"'
+    return etag, formatdate(stat.st_mtime, usegmt=True), stat.st_mtime
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+    """True when a conditional GET's If-None-Match or If-Modified-Since says the client copy is current."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) of a single "bytes=" range, None to send the whole file.
+
+    Raises ValueError when the range cannot be satisfied. Multiple ranges are
+    answered with the whole file, which RFC 9110 allows.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    if not (start_text or end_text).isdigit() or (start_text and end_text and not end_text.isdigit()):
+        # Malformed ranges are ignored
+        return None
+    if start_text:
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(end_text), 0), size - 1
+        if int(end_text) == 0:
+            raise ValueError("empty suffix range")
+    if start >= size or start > end:
+        raise ValueError(f"range {header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+def range_applies(headers, etag: str, last_modified: str) -> bool:
+    """If-Range: only honour Range when the client's copy is still the current one."""
+    if_range = headers.get("if-range")
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+def read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start + 1)
+
+
+class PageCache:
+    """Single pages extracted from PDFs, cached on disk and evicted least recently used first."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, pdf_path: str, page: int) -> str:
+        stat = os.stat(pdf_path)
+        # Keyed on size and mtime too, so edited PDFs never serve stale pages
+        key = f"{os.path.abspath(pdf_path)}:{stat.st_size}:{stat.st_mtime_ns}:{page}"
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".pdf")
+
+    def get(self, pdf_path: str, page: int) -> str:
+        """Path of a one-page PDF holding `page` (0-based) of `pdf_path`. Raises IndexError for a missing page."""
+        path = self._path(pdf_path, page)
+        try:
+            # The mtime doubles as the LRU timestamp
+            os.utime(path)
+            self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+        self.misses += 1
+        data = extract_page(pdf_path, page)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Delete the least recently used pages until the cache fits in `max_bytes`."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _mtime, size, _path in entries)
+            for _mtime, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def extract_page(pdf_path: str, page: int) -> bytes:
+    import pypdf
+
+    reader = pypdf.PdfReader(pdf_path)
+    if not 0 <= page < len(reader.pages):
+        raise IndexError(f"page {page} out of range (the PDF has {len(reader.pages)} pages)")
+    writer = pypdf.PdfWriter()
+    writer.add_page(reader.pages[page])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def create_page_cache_from_env(directory: str = "pdf_page_cache") -> PageCache:
+    return PageCache(
+        directory=os.getenv("PDF_PAGE_CACHE_PATH", directory),
+        max_bytes=int(float(os.getenv("PDF_PAGE_CACHE_MB", "256")) * 1024 * 1024),
+    )
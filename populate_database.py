@@ -1,16 +1,45 @@
 import argparse
+import hashlib
+import json
 import os
 import shutil
-from langchain_community.document_loaders import PyPDFDirectoryLoader
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+import pypdf
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from get_embedding_function import get_embedding_function
+from embedding_cache import CachedEmbeddings
+from bm25_index import BM25Index
+from retrieval import collection_space
+from vector_index import VECTOR_DTYPES, VectorIndex
 from langchain_chroma import Chroma
 from chromadb.config import Settings
 
 
 CHROMA_PATH = "chroma"
 DATA_PATH = "data"
+# Rewritten whenever the collection changes so the API can invalidate cached answers
+COLLECTION_VERSION_PATH = os.path.join(CHROMA_PATH, "collection_version")
+# Kept outside CHROMA_PATH so vectors survive --reset and re-chunking
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+# Size, mtime and content hash of every ingested file (cleared together with the DB)
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "manifest.json")
+# Lexical (BM25) index over every chunk in the collection, rebuilt after each change
+BM25_INDEX_PATH = "bm25_index.json.gz"
+# Memory-mappable copy of the embeddings for the API's "numpy" vector backend
+VECTOR_INDEX_PATH = "vector_index"
+# Files longer than this are split into page ranges so one book can use several cores
+PAGES_PER_TASK = 50
+# Chunks per embedding request, and how many embedding requests run at once
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+# HNSW parameters chosen with hnsw_sweep.py, applied when the collection is created
+HNSW_SETTINGS_PATH = "hnsw_settings.json"
+HNSW_SETTING_KEYS = ("space", "M", "construction_ef", "search_ef")
 
 
 def main():
@@ -18,20 +47,186 @@ def main():
     # Check if the database should be cleared (using the --clear flag).
     parser = argparse.ArgumentParser()
     parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1,
+        help="Processes used to parse PDFs (1 parses in this process).",
+    )
+    parser.add_argument(
+        "--pages-per-task", type=int, default=PAGES_PER_TASK,
+        help="Maximum pages of one PDF parsed by a single worker task.",
+    )
+    parser.add_argument(
+        "--embed-concurrency", type=int, default=EMBED_CONCURRENCY,
+        help="Embedding requests sent to the embedding server at once.",
+    )
+    parser.add_argument(
+        "--embed-batch-size", type=int, default=EMBED_BATCH_SIZE,
+        help="Chunks per embedding request.",
+    )
+    parser.add_argument(
+        "--vector-dtype", choices=VECTOR_DTYPES, default="float32",
+        help="Storage type of the exported vector index (float16/int8 trade accuracy for size).",
+    )
     args = parser.parse_args()
     if args.reset:
         print("Clearing Database")
         clear_database()
 
+    # Work out which files changed since the last run before parsing anything.
+    manifest = load_manifest()
+    current = scan_source_files(manifest)
+    new_files, modified_files, removed_files = diff_manifest(manifest, current)
+    print(
+        f"Source files: {len(current)} total, {len(new_files)} new, "
+        f"{len(modified_files)} modified, {len(removed_files)} removed"
+    )
+
+    # Old chunks of edited or deleted files are purged; edited files are then re-added.
+    if modified_files or removed_files:
+        purge_sources(modified_files + removed_files)
+
     # Create (or update) the data store.
-    documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    files_to_load = new_files + modified_files
+    if files_to_load:
+        start_time = time.time()
+        documents = load_documents(files_to_load, workers=args.workers, pages_per_task=args.pages_per_task)
+        print(f"Parsed {len(documents)} pages in {time.time() - start_time:.1f}s")
+        chunks = split_documents(documents)
+        add_to_chroma(chunks, batch_size=args.embed_batch_size, embed_concurrency=args.embed_concurrency)
+
+    if files_to_load or modified_files or removed_files or not os.path.exists(BM25_INDEX_PATH):
+        build_bm25_index()
+    if (files_to_load or modified_files or removed_files or not os.path.exists(VECTOR_INDEX_PATH)
+            or exported_vector_dtype() != args.vector_dtype):
+        export_vector_index(args.vector_dtype)
+
+    save_manifest(current)
+
+
+def list_source_files() -> list[str]:
+    """PDF paths under DATA_PATH, named the way the loader records them in `source`."""
+    data_dir = Path(DATA_PATH)
+    paths = []
+    for path in data_dir.glob("**/[!.]*.pdf"):
+        if path.is_file() and not any(part.startswith(".") for part in path.relative_to(data_dir).parts):
+            paths.append(str(path))
+    return sorted(paths)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+
+def save_manifest(files: dict):
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2, sort_keys=True)
+
+
+def scan_source_files(manifest: dict) -> dict:
+    """
+    Describe every source file by size, mtime and content hash.
+
+    Files whose size and mtime match the manifest reuse the recorded hash,
+    so unchanged files are never read.
+    """
+    files = {}
+    for path in list_source_files():
+        stat = os.stat(path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+        previous = manifest.get(path)
+        if previous and previous["size"] == entry["size"] and previous["mtime"] == entry["mtime"]:
+            entry["sha256"] = previous["sha256"]
+        else:
+            entry["sha256"] = file_sha256(path)
+        files[path] = entry
+    return files
+
+
+def diff_manifest(manifest: dict, current: dict):
+    """Split files into (new, modified, removed) lists. Touched-but-identical files count as unchanged."""
+    new_files = [path for path in current if path not in manifest]
+    modified_files = [
+        path for path in current
+        if path in manifest and current[path]["sha256"] != manifest[path]["sha256"]
+    ]
+    removed_files = [path for path in manifest if path not in current]
+    return new_files, modified_files, removed_files
+
+
+def load_documents(paths: list[str] = None, workers: int = 1, pages_per_task: int = PAGES_PER_TASK):
+    if paths is None:
+        paths = list_source_files()
+    if workers > 1 and paths:
+        return load_documents_parallel(paths, workers, pages_per_task)
+    documents = []
+    for path in paths:
+        docs = PyPDFLoader(path).load()
+        for doc in docs:
+            doc.metadata["source"] = path
+        documents.extend(docs)
+    return documents
+
+
+def load_documents_parallel(paths: list[str], workers: int, pages_per_task: int = PAGES_PER_TASK):
+    """
+    Parse PDFs across a process pool, splitting large files into page ranges.
+
+    Results are reassembled in file and page order, so `calculate_chunk_ids`
+    yields the same IDs as a sequential load.
+    """
+    tasks = []
+    for path in paths:
+        page_count = len(pypdf.PdfReader(path).pages)
+        for start in range(0, max(page_count, 1), pages_per_task):
+            tasks.append((path, start, start + pages_per_task))
+
+    documents = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        for docs in executor.map(_load_pdf_pages, *zip(*tasks)):
+            documents.extend(docs)
+    return documents
+
 
+def _pdf_metadata(reader: pypdf.PdfReader, path: str) -> dict:
+    """Document-level metadata in PyPDFLoader's shape: lower-case keys, ISO dates, defaults for missing fields."""
+    metadata = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        key = key.lstrip("/").lower()
+        value = value if isinstance(value, int) else str(value).strip()
+        if key in ("creationdate", "moddate"):
+            # PDF dates look like D:20240131120000+01'00'
+            try:
+                value = datetime.strptime(value.replace("'", ""), "D:%Y%m%d%H%M%S%z").isoformat("T")
+            except ValueError:
+                pass
+        metadata[key] = value
+    return metadata | {"source": path, "total_pages": len(reader.pages)}
 
-def load_documents():
-    document_loader = PyPDFDirectoryLoader(DATA_PATH)
-    return document_loader.load()
+
+def _load_pdf_pages(path: str, start: int, end: int) -> list[Document]:
+    """Parse pages [start, end) of one PDF with the metadata PyPDFLoader would produce."""
+    reader = pypdf.PdfReader(path)
+    doc_metadata = _pdf_metadata(reader, path)
+    documents = []
+    for page_number in range(start, min(end, len(reader.pages))):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain").strip()
+        documents.append(Document(
+            page_content=text,
+            metadata=doc_metadata | {"page": page_number, "page_label": reader.page_labels[page_number]},
+        ))
+    return documents
 
 
 def split_documents(documents: list[Document]):
@@ -44,21 +239,63 @@ def split_documents(documents: list[Document]):
     return text_splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: list[Document]):
+def open_chroma(embedding_function, collection_metadata: dict = None):
     # Configure Chroma for better handling of large datasets
     client_settings = Settings(
         anonymized_telemetry=False,
         is_persistent=True,
         persist_directory=CHROMA_PATH,
     )
-    
+
     # Load the existing database with optimized settings
-    db = Chroma(
+    return Chroma(
         persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function(),
-        client_settings=client_settings
+        embedding_function=embedding_function,
+        client_settings=client_settings,
+        collection_metadata=collection_metadata,
     )
 
+
+def load_hnsw_settings() -> dict:
+    if not os.path.exists(HNSW_SETTINGS_PATH):
+        return {}
+    with open(HNSW_SETTINGS_PATH, "r", encoding="utf-8") as f:
+        settings = json.load(f)
+    return {key: settings[key] for key in HNSW_SETTING_KEYS if settings.get(key) is not None}
+
+
+def save_hnsw_settings(settings: dict):
+    with open(HNSW_SETTINGS_PATH, "w", encoding="utf-8") as f:
+        json.dump({key: settings[key] for key in HNSW_SETTING_KEYS if settings.get(key) is not None}, f, indent=2)
+
+
+def hnsw_collection_metadata(settings: dict) -> dict:
+    """Chroma collection metadata ("hnsw:M", ...) for the given HNSW settings."""
+    return {f"hnsw:{key}": value for key, value in settings.items()}
+
+
+def hnsw_settings_applied(db, settings: dict) -> bool:
+    metadata = db._collection.metadata or {}
+    return all(metadata.get(key) == value for key, value in hnsw_collection_metadata(settings).items())
+
+
+def purge_sources(sources: list[str]):
+    """Delete every chunk that came from one of `sources`."""
+    db = open_chroma(get_embedding_function())
+    stale_ids = []
+    for source in sources:
+        stale_ids.extend(db.get(where={"source": source}, include=[])["ids"])
+    if stale_ids:
+        print(f"Removing stale documents: {len(stale_ids)}")
+        db.delete(ids=stale_ids)
+        mark_collection_changed()
+
+
+def add_to_chroma(chunks: list[Document], batch_size: int = EMBED_BATCH_SIZE, embed_concurrency: int = EMBED_CONCURRENCY):
+    # Chunks whose text was embedded before (with the same model) are served from disk
+    embedding_function = CachedEmbeddings(get_embedding_function(), EMBEDDING_CACHE_PATH)
+    db = open_chroma(embedding_function)
+
     # Calculate Page IDs.
     chunks_with_ids = calculate_chunk_ids(chunks)
 
@@ -67,6 +304,16 @@ def add_to_chroma(chunks: list[Document]):
     existing_ids = set(existing_items["ids"])
     print(f"Number of existing documents in DB: {len(existing_ids)}")
 
+    # HNSW parameters are fixed once a collection is created, so only an empty one can pick them up
+    hnsw_settings = load_hnsw_settings()
+    if hnsw_settings and not hnsw_settings_applied(db, hnsw_settings):
+        if existing_ids:
+            print(f"HNSW settings in {HNSW_SETTINGS_PATH} apply to new collections only; run with --reset to use them")
+        else:
+            db.delete_collection()
+            db = open_chroma(embedding_function, collection_metadata=hnsw_collection_metadata(hnsw_settings))
+            print(f"Created collection with HNSW settings {hnsw_settings}")
+
     # Only add documents that don't exist in the DB.
     new_chunks = []
     for chunk in chunks_with_ids:
@@ -75,13 +322,87 @@ def add_to_chroma(chunks: list[Document]):
 
     if len(new_chunks):
         print(f"Adding new documents: {len(new_chunks)}")
-        batch_size = 1000
-        for i in range(0, len(new_chunks), batch_size):
-            batch_chunks = new_chunks[i:i+batch_size]
-            batch_ids = [chunk.metadata["id"] for chunk in batch_chunks]
-            db.add_documents(batch_chunks, ids=batch_ids)
+        start_time = time.time()
+        write_chunks_pipelined(db, embedding_function, new_chunks, batch_size, embed_concurrency)
+        elapsed = time.time() - start_time
+        print(f"Added {len(new_chunks)} documents in {elapsed:.1f}s ({len(new_chunks) / max(elapsed, 1e-9):.1f} chunks/sec)")
+        mark_collection_changed()
+        print(f"Embedding cache: {embedding_function.hits} hits, {embedding_function.misses} embedded")
     else:
         print("No new documents to add")
+    embedding_function.close()
+
+
+def write_chunks_pipelined(db, embedding_function, chunks: list[Document], batch_size: int, embed_concurrency: int):
+    """
+    Embed batches concurrently while this thread writes finished batches to Chroma.
+
+    `embed_concurrency` embedding requests run at once, and no more than twice
+    that many batches are queued or awaiting a write, which bounds memory use.
+    """
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+    def embed_batch(batch: list[Document]):
+        return batch, embedding_function.embed_documents([chunk.page_content for chunk in batch])
+
+    written = 0
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(embed_concurrency, 1)) as executor:
+        pending = set()
+        next_batch = 0
+        while next_batch < len(batches) or pending:
+            while next_batch < len(batches) and len(pending) < 2 * max(embed_concurrency, 1):
+                pending.add(executor.submit(embed_batch, batches[next_batch]))
+                next_batch += 1
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, embeddings = future.result()
+                # Embeddings are precomputed, so write straight to the collection
+                db._collection.upsert(
+                    ids=[chunk.metadata["id"] for chunk in batch],
+                    embeddings=embeddings,
+                    metadatas=[chunk.metadata for chunk in batch],
+                    documents=[chunk.page_content for chunk in batch],
+                )
+                written += len(batch)
+                rate = written / max(time.time() - start_time, 1e-9)
+                print(f"  {written}/{len(chunks)} chunks written ({rate:.1f} chunks/sec)")
+
+
+def build_bm25_index():
+    """Rebuild the BM25 index from every chunk currently in the collection."""
+    db = open_chroma(get_embedding_function())
+    items = db.get(include=["documents"])
+    index = BM25Index.build(items["ids"], items["documents"])
+    index.save(BM25_INDEX_PATH)
+    print(f"BM25 index: {len(index.doc_ids)} chunks, {len(index.postings)} terms")
+    # The API reloads the index when the collection version changes
+    mark_collection_changed()
+
+
+def export_vector_index(dtype: str = "float32"):
+    """Write every chunk's embedding, text and metadata to VECTOR_INDEX_PATH."""
+    db = open_chroma(get_embedding_function())
+    items = db.get(include=["embeddings", "documents", "metadatas"])
+    index = VectorIndex.build(items["ids"], items["documents"], items["metadatas"], items["embeddings"],
+                              space=collection_space(db), dtype=dtype)
+    index.save(VECTOR_INDEX_PATH)
+    print(f"Vector index: {len(index)} chunks ({dtype}, {index.space} distance)")
+
+
+def exported_vector_dtype():
+    try:
+        with open(os.path.join(VECTOR_INDEX_PATH, "index.json"), "r", encoding="utf-8") as f:
+            return json.load(f)["dtype"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def mark_collection_changed():
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    with open(COLLECTION_VERSION_PATH, "w", encoding="utf-8") as f:
+        f.write(str(time.time_ns()))
 
 
 def calculate_chunk_ids(chunks):
@@ -116,6 +437,10 @@ def calculate_chunk_ids(chunks):
 def clear_database():
     if os.path.exists(CHROMA_PATH):
         shutil.rmtree(CHROMA_PATH)
+    if os.path.exists(BM25_INDEX_PATH):
+        os.remove(BM25_INDEX_PATH)
+    if os.path.exists(VECTOR_INDEX_PATH):
+        shutil.rmtree(VECTOR_INDEX_PATH)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+"""
+Query sets and latency summaries shared by the benchmarking scripts.
+
+load_test.py and hnsw_sweep.py read the same question files and report
+latencies the same way; keeping these helpers here lets the sweep run
+without the HTTP client and fake server the load test needs.
+"""
+import json
+from typing import Dict, List, Optional
+
+DEFAULT_QUERIES_PATH = "requests.jsonl"
+# Keys tried, in order, when reading questions from a JSONL file
+QUESTION_FIELDS = ("question", "query", "title", "body")
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_queries(path: str, question_field: Optional[str] = None) -> List[str]:
+    """Questions from a JSONL file (one object per line) or a text file (one question per line)."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not path.endswith(".jsonl"):
+                questions.append(line)
+                continue
+            item = json.loads(line)
+            fields = (question_field,) if question_field else QUESTION_FIELDS
+            question = next((item[key] for key in fields if item.get(key)), None)
+            if question:
+                questions.append(str(question))
+    if not questions:
+        raise ValueError(f"No questions found in {path}")
+    return questions
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Mean, percentiles and max of latencies given in seconds, reported in ms."""
+    values = sorted(value * 1000 for value in values)
+    if not values:
+        return {}
+    summary = {"mean": sum(values) / len(values), "min": values[0]}
+    summary.update({f"p{pct}": percentile(values, pct) for pct in PERCENTILES})
+    summary["max"] = values[-1]
+    return summary
@@ -0,0 +1,62 @@
+"""
+Per-component readiness tracking for the API server.
+
+`/health` only says the process is up. Components such as the Chroma
+database, the embedding model and the Ollama models are initialized either
+eagerly at startup or lazily on the first query; the tracker records when
+each one became ready, how long it took and why it failed, so `/ready` can
+tell an orchestrator whether this replica is warm.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable
+
+# Component states
+PENDING = "pending"
+INITIALIZING = "initializing"
+READY = "ready"
+FAILED = "failed"
+# Initialized on first use; does not hold back readiness
+LAZY = "lazy"
+
+
+class ReadinessTracker:
+    """Records the state and init time of each named component."""
+
+    def __init__(self, components: Iterable[str]):
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        self._components: Dict[str, Dict[str, Any]] = {
+            name: {"state": PENDING, "init_time": None, "error": None} for name in components
+        }
+
+    def set_state(self, name: str, state: str, **fields):
+        with self._lock:
+            component = self._components.setdefault(name, {"state": PENDING, "init_time": None, "error": None})
+            component.update(state=state, **fields)
+
+    def is_ready(self, name: str) -> bool:
+        with self._lock:
+            return self._components.get(name, {}).get("state") == READY
+
+    @contextmanager
+    def track(self, name: str):
+        """Time the block and mark `name` ready, or failed if it raises."""
+        self.set_state(name, INITIALIZING, error=None)
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.set_state(name, FAILED, init_time=time.perf_counter() - start_time, error=str(e))
+            raise
+        self.set_state(name, READY, init_time=time.perf_counter() - start_time, error=None)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            components = {name: dict(component) for name, component in self._components.items()}
+        return {
+            "ready": all(component["state"] in (READY, LAZY) for component in components.values()),
+            "uptime": time.time() - self._started_at,
+            "components": components,
+        }
@@ -0,0 +1,181 @@
+"""
+Single-flight coalescing of identical in-flight questions.
+
+When a question spreads, many copies of it arrive within seconds, each one
+paying for its own embedding, search and generation on the same Ollama
+instance. The answer cache only helps once the first answer is complete.
+`SingleFlight` lets the first request (the leader) do the work while
+identical concurrent requests attach to it:
+
+- `run` shares the leader's result with every caller waiting on the key.
+- `start_stream`/`stream` share a stream of events. Late subscribers first
+  replay the events already produced, then follow the live ones.
+
+The leader's work runs in its own task, so it survives its own client
+going away as long as someone else is still waiting; once every waiter has
+left, it is cancelled. A stream subscriber counts as waiting from the moment
+it is created until it is exhausted or closed, so a client that leaves before
+reading anything must still `aclose()` it. Keys are removed as soon as the
+work finishes, so only requests overlapping in time are coalesced.
+"""
+import asyncio
+import os
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case, spacing and trailing punctuation don't change the answer: "What is autism?" == "what is  autism"."""
+    return _SPACE_RE.sub(" ", question).strip().rstrip("?!. ").lower()
+
+
+class _Flight:
+    def __init__(self, streaming: bool = False):
+        self.streaming = streaming
+        self.task: Optional[asyncio.Task] = None
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.changed = asyncio.Condition()
+
+
+class Subscription:
+    """Async iterator over a stream's events, replaying those already produced."""
+
+    def __init__(self, owner: "SingleFlight", flight: _Flight):
+        self._owner = owner
+        self._flight = flight
+        self._index = 0
+        self._closed = False
+        flight.waiters += 1
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        flight = self._flight
+        try:
+            while not self._closed:
+                if self._index < len(flight.events):
+                    self._index += 1
+                    return flight.events[self._index - 1]
+                if flight.done:
+                    await self.aclose()
+                    if flight.error is not None:
+                        raise flight.error
+                    break
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: self._index < len(flight.events) or flight.done)
+        except asyncio.CancelledError:
+            await self.aclose()
+            raise
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        """Stop waiting for the stream; idempotent."""
+        if not self._closed:
+            self._closed = True
+            self._owner._leave(self._flight)
+
+
+class SingleFlight:
+    """Deduplicates concurrent work by key. Must be used from a single event loop."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+
+    def _leave(self, flight: _Flight):
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.done and flight.task is not None:
+            # Nobody is waiting for the result any more
+            self.abandoned += 1
+            flight.task.cancel()
+
+    def _finish(self, key: Hashable, flight: _Flight):
+        flight.done = True
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of `func()`, or of the call already running for `key`. Returns (result, shared)."""
+        flight = self._flights.get(key)
+        shared = flight is not None and not flight.streaming
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(func())
+            # Runs before any waiter resumes, so the next duplicate starts a new flight
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+            # Retrieved here in case every waiter gave up before it finished
+            flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        finally:
+            self._leave(flight)
+
+    def stream(self, key: Hashable) -> Optional[Subscription]:
+        """Subscribe to the event stream already running for `key`, or None."""
+        flight = self._flights.get(key)
+        if flight is None or not flight.streaming or flight.done:
+            return None
+        self.followers += 1
+        return Subscription(self, flight)
+
+    def start_stream(self, key: Hashable, events: AsyncIterator[Any],
+                     on_finish: Optional[Callable[[], None]] = None) -> Subscription:
+        """
+        Run `events` as the stream for `key` and subscribe to it.
+
+        `on_finish` runs once the stream ends, fails or is abandoned, e.g. to
+        release the inference slot it holds. Check `stream(key)` first: this
+        replaces any stream already running for the key.
+        """
+        self.leaders += 1
+        flight = _Flight(streaming=True)
+        self._flights[key] = flight
+
+        async def produce():
+            try:
+                async for event in events:
+                    async with flight.changed:
+                        flight.events.append(event)
+                        flight.changed.notify_all()
+            except Exception as e:
+                flight.error = e
+            finally:
+                self._finish(key, flight)
+                if hasattr(events, "aclose"):
+                    await events.aclose()
+                if on_finish is not None:
+                    on_finish()
+                async with flight.changed:
+                    flight.changed.notify_all()
+
+        subscription = Subscription(self, flight)
+        flight.task = asyncio.create_task(produce())
+        return subscription
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "abandoned": self.abandoned,
+        }
+
+
+def create_single_flight_from_env() -> Optional[SingleFlight]:
+    """Build the request coalescer from environment variables (None when disabled)."""
+    if os.getenv("COALESCING_ENABLED", "1").lower() in ("0", "false", "no"):
+        return None
+    return SingleFlight()
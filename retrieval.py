@@ -0,0 +1,135 @@
+"""
+Retrieval strategies for the query path: dense, lexical (BM25) and hybrid.
+
+Every strategy returns a list of (Document, distance, extras) tuples, best
+first. `distance` is the vector distance Chroma would report for the chunk
+(lower is better) or None when the query was never embedded; `extras`
+carries strategy-specific scores such as "bm25_score" or "rrf_score".
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical")
+# Where nearest neighbours are searched: the Chroma collection or the exported VectorIndex
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+# Candidates pulled from each ranking before fusion, as a multiple of k
+HYBRID_CANDIDATE_FACTOR = 4
+
+SearchResult = Tuple[Document, Optional[float], Dict[str, float]]
+
+
+def chunk_id(doc: Document) -> Optional[str]:
+    return doc.id or doc.metadata.get("id")
+
+
+def collection_space(db) -> str:
+    """Distance function of the Chroma collection ("l2", "cosine" or "ip")."""
+    try:
+        collection = db._collection
+        hnsw = (collection.configuration or {}).get("hnsw") or {}
+        return hnsw.get("space") or (collection.metadata or {}).get("hnsw:space", "l2")
+    except Exception:
+        return "l2"
+
+
+def vector_distances(space: str, query_embedding: Sequence[float], embeddings) -> np.ndarray:
+    """Distances between the query and each row of `embeddings`, as Chroma computes them."""
+    query = np.asarray(query_embedding, dtype=np.float32)
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        return 1.0 - (matrix @ query) / np.where(norms > 0, norms, 1.0)
+    if space == "ip":
+        return 1.0 - matrix @ query
+    # hnswlib's "l2" is the squared Euclidean distance
+    diff = matrix - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+
+def fetch_chunks(db, ids: List[str], query_embedding: Optional[Sequence[float]] = None) -> Dict[str, Tuple[Document, Optional[float]]]:
+    """Load chunks by ID, with their distance to the query when an embedding is given."""
+    if not ids:
+        return {}
+    include = ["documents", "metadatas"] + (["embeddings"] if query_embedding is not None else [])
+    items = db.get(ids=ids, include=include)
+    distances = [None] * len(items["ids"])
+    if query_embedding is not None and len(items["ids"]):
+        distances = vector_distances(collection_space(db), query_embedding, items["embeddings"]).tolist()
+    return {
+        doc_id: (Document(page_content=text, metadata=metadata, id=doc_id), distance)
+        for doc_id, text, metadata, distance in zip(items["ids"], items["documents"], items["metadatas"], distances)
+    }
+
+
+def nearest_chunks_batch(db, query_embeddings: Sequence[Sequence[float]], k: int,
+                         vectors=None) -> List[List[Tuple[Document, float]]]:
+    """(Document, distance) lists, nearest first, for several queries in one search call."""
+    if not len(query_embeddings):
+        return []
+    if vectors is not None:
+        return [[(vectors.document(row), distance) for row, distance in hits]
+                for hits in vectors.search_batch(query_embeddings, k)]
+    results = db._collection.query(
+        query_embeddings=[list(embedding) for embedding in query_embeddings],
+        n_results=k,
+        include=["documents", "metadatas", "distances"],
+    )
+    return [
+        [(Document(page_content=text, metadata=metadata, id=doc_id), float(distance))
+         for doc_id, text, metadata, distance in zip(ids, texts, metadatas, distances)]
+        for ids, texts, metadatas, distances in zip(
+            results["ids"], results["documents"], results["metadatas"], results["distances"])
+    ]
+
+
+def dense_search(db, query_embedding: Sequence[float], k: int, vectors=None) -> List[SearchResult]:
+    """Nearest chunks from `vectors` (a VectorIndex) when given, else from the Chroma collection."""
+    results = (vectors if vectors is not None else db).similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+    return [(doc, float(score), {}) for doc, score in results]
+
+
+def lexical_search(db, index: BM25Index, query_text: str, k: int) -> List[SearchResult]:
+    """BM25-only retrieval; never calls the embedding model."""
+    hits = index.search(query_text, k=k)
+    chunks = fetch_chunks(db, [doc_id for doc_id, _score in hits])
+    return [
+        (chunks[doc_id][0], None, {"bm25_score": score})
+        for doc_id, score in hits if doc_id in chunks
+    ]
+
+
+def hybrid_search(db, index: BM25Index, query_text: str, query_embedding: Sequence[float], k: int,
+                  vectors=None, dense: Optional[List[Tuple[Document, float]]] = None) -> List[SearchResult]:
+    """
+    Fuse dense and BM25 rankings with reciprocal rank fusion.
+
+    `dense` takes (Document, distance) candidates already found for the
+    query (see `nearest_chunks_batch`) instead of searching again.
+    """
+    candidates = k * HYBRID_CANDIDATE_FACTOR
+    if dense is None:
+        dense = (vectors if vectors is not None else db).similarity_search_by_vector_with_relevance_scores(query_embedding, k=candidates)
+    lexical = index.search(query_text, k=candidates)
+
+    by_id = {chunk_id(doc): (doc, float(score)) for doc, score in dense}
+    bm25_scores = dict(lexical)
+    fused = reciprocal_rank_fusion([list(by_id), [doc_id for doc_id, _score in lexical]])[:k]
+
+    # Chunks only found lexically still get their real vector distance
+    by_id.update(fetch_chunks(db, [doc_id for doc_id, _score in fused if doc_id not in by_id], query_embedding))
+
+    results = []
+    for doc_id, rrf_score in fused:
+        if doc_id not in by_id:
+            continue
+        doc, distance = by_id[doc_id]
+        extras = {"rrf_score": rrf_score}
+        if doc_id in bm25_scores:
+            extras["bm25_score"] = bm25_scores[doc_id]
+        results.append((doc, distance, extras))
+    return results
@@ -0,0 +1,205 @@
+"""
+Conversation sessions for multi-turn chat.
+
+A stateless follow-up question rebuilds the whole prompt, so Ollama
+re-processes every chunk and instruction again. A session keeps the
+`context` token array Ollama returns after each generation together with
+the IDs of the chunks already shown to the model. The next turn sends that
+context back and a prompt holding only the new question and newly retrieved
+chunks; Ollama reuses the KV cache for the shared prefix, so prefill covers
+only the new turn.
+
+Sessions expire after `idle_ttl` seconds. When a session's context outgrows
+`max_context_tokens` or its memory estimate exceeds `max_bytes`, the model
+context is dropped and the next turn starts a fresh prompt that recaps the
+latest turns.
+"""
+import os
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+class ConversationSession:
+    """State of one conversation. Claim it with `begin_turn` for the length of each turn."""
+
+    def __init__(self, session_id: str, model_name: str):
+        self.id = session_id
+        self.model_name = model_name
+        # Ollama context tokens of the conversation so far; empty until the first turn or after a reset
+        self.context = array("i")
+        self.sent_chunks: set = set()
+        self.turns: List[Turn] = []
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.resets = 0
+        # Only guards the claim itself, never held while a turn runs
+        self._claim_lock = threading.Lock()
+        self.in_turn = False
+
+    @property
+    def has_context(self) -> bool:
+        return len(self.context) > 0
+
+    def memory_bytes(self) -> int:
+        """Rough size of what the session keeps in memory."""
+        return (
+            self.context.itemsize * len(self.context)
+            + sum(len(chunk_id) for chunk_id in self.sent_chunks)
+            + sum(len(turn.question) + len(turn.answer) for turn in self.turns)
+        )
+
+    def reset(self, model_name: Optional[str] = None):
+        """Drop the model context and sent chunks; the turns stay for the recap."""
+        self.context = array("i")
+        self.sent_chunks = set()
+        self.resets += 1
+        if model_name is not None:
+            self.model_name = model_name
+
+    def begin_turn(self) -> bool:
+        """Claim the session for a turn; False while another turn holds it. Does not block."""
+        with self._claim_lock:
+            if self.in_turn:
+                return False
+            self.in_turn = True
+            return True
+
+    def end_turn(self):
+        self.in_turn = False
+
+    def use_model(self, model_name: str):
+        """Switch the session to `model_name`, resetting it if it was on another model. Needs the turn claimed."""
+        # Context tokens only mean something to the model that produced them
+        if self.model_name != model_name:
+            self.reset(model_name)
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "model_name": self.model_name,
+            "turns": len(self.turns),
+            "context_tokens": len(self.context),
+            "chunks_sent": len(self.sent_chunks),
+            "memory_bytes": self.memory_bytes(),
+            "resets": self.resets,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+        }
+
+
+class SessionStore:
+    """In-memory sessions with idle expiry, a per-session memory cap and an LRU bound on their number."""
+
+    def __init__(
+        self,
+        idle_ttl: float = 1800,
+        max_sessions: int = 1000,
+        max_bytes: int = 512 * 1024,
+        max_context_tokens: int = 4096,
+        max_turns: int = 20,
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # Should stay below the models' num_ctx, or Ollama truncates the context itself
+        self.max_context_tokens = max_context_tokens
+        self.max_turns = max_turns
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float):
+        stale = [session_id for session_id, session in self._sessions.items() if now - session.last_used > self.idle_ttl]
+        for session_id in stale:
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def create(self, model_name: str) -> ConversationSession:
+        return self.get_or_create(uuid.uuid4().hex, model_name)[0]
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        with self._lock:
+            self._expire(time.time())
+            return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str, model_name: str) -> Tuple[ConversationSession, bool]:
+        """
+        The session `session_id`, created if unknown or expired. Returns (session, created).
+
+        An existing session keeps its model until its next turn calls
+        `use_model` with the session claimed.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            created = session is None
+            if created:
+                session = ConversationSession(session_id, model_name)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+        return session, created
+
+    def record_turn(self, session: ConversationSession, question: str, answer: str,
+                    context: Optional[Iterable[int]], chunk_ids: Iterable[str]):
+        """Store a finished turn and the context Ollama returned, enforcing the caps."""
+        session.turns.append(Turn(question=question, answer=answer))
+        del session.turns[:-self.max_turns]
+        if context:
+            session.context = array("i", context)
+            # Replaced rather than updated: /metrics iterates it from another thread
+            session.sent_chunks = session.sent_chunks | set(chunk_ids)
+        else:
+            # Without a returned context the next turn cannot continue this one
+            session.reset()
+        if len(session.context) > self.max_context_tokens or session.memory_bytes() > self.max_bytes:
+            session.reset()
+        while len(session.turns) > 1 and session.memory_bytes() > self.max_bytes:
+            session.turns.pop(0)
+        session.last_used = time.time()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl": self.idle_ttl,
+                "max_bytes": self.max_bytes,
+                "max_context_tokens": self.max_context_tokens,
+                "memory_bytes": sum(session.memory_bytes() for session in self._sessions.values()),
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+def create_session_store_from_env() -> SessionStore:
+    """Build the session store from environment variables."""
+    return SessionStore(
+        idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+        max_sessions=int(os.getenv("SESSION_MAX_COUNT", "1000")),
+        max_bytes=int(float(os.getenv("SESSION_MAX_KB", "512")) * 1024),
+        max_context_tokens=int(os.getenv("SESSION_MAX_CONTEXT_TOKENS", "4096")),
+        max_turns=int(os.getenv("SESSION_MAX_TURNS", "20")),
+    )
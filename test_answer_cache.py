@@ -0,0 +1,57 @@
+from answer_cache import SemanticAnswerCache
+
+SOURCES = [{"id": "a:0:0"}]
+
+
+def test_similar_question_hits():
+    cache = SemanticAnswerCache(threshold=0.95)
+    cache.store("what is autism", [1.0, 0.0, 0.0], "llama3", "answer", SOURCES)
+    entry = cache.lookup([0.99, 0.05, 0.0], "llama3")
+    assert entry is not None and entry.answer == "answer" and entry.sources == SOURCES
+    assert cache.lookup([0.0, 1.0, 0.0], "llama3") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_entries_are_separated_by_key():
+    cache = SemanticAnswerCache()
+    cache.store("question", [1.0, 0.0], "llama3|dense|chroma", "dense answer", SOURCES)
+    assert cache.lookup([1.0, 0.0], "llama3|hybrid|chroma") is None
+    assert cache.lookup([1.0, 0.0], "mistral|dense|chroma") is None
+    assert cache.lookup([1.0, 0.0], "llama3|dense|chroma").answer == "dense answer"
+
+
+def test_most_similar_entry_wins():
+    cache = SemanticAnswerCache(threshold=0.5)
+    cache.store("first", [1.0, 0.0], "llama3", "first", SOURCES)
+    cache.store("second", [0.6, 0.8], "llama3", "second", SOURCES)
+    assert cache.lookup([0.5, 0.9], "llama3").answer == "second"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store("first", [1.0, 0.0, 0.0], "llama3", "first", SOURCES)
+    cache.store("second", [0.0, 1.0, 0.0], "llama3", "second", SOURCES)
+    assert cache.lookup([1.0, 0.0, 0.0], "llama3") is not None
+    cache.store("third", [0.0, 0.0, 1.0], "llama3", "third", SOURCES)
+    assert cache.lookup([0.0, 1.0, 0.0], "llama3") is None
+    assert cache.lookup([1.0, 0.0, 0.0], "llama3") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_dropped():
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store("question", [1.0, 0.0], "llama3", "answer", SOURCES)
+    cache._entries[0].created_at -= 61
+    assert cache.lookup([1.0, 0.0], "llama3") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_version_change_invalidates_every_entry(tmp_path):
+    version_path = tmp_path / "collection_version"
+    version_path.write_text("1")
+    cache = SemanticAnswerCache(version_path=str(version_path))
+    cache.store("question", [1.0, 0.0], "llama3", "answer", SOURCES)
+    assert cache.lookup([1.0, 0.0], "llama3") is not None
+    version_path.write_text("2")
+    assert cache.lookup([1.0, 0.0], "llama3") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from bm25_index import BM25Index, is_lexical_query, load_index, reciprocal_rank_fusion, tokenize
+
+IDS = ["a:0:0", "a:0:1", "b:1:0"]
+TEXTS = [
+    "SHANK3 mutations are linked to autism",
+    "Diagnosis uses the ADOS-2 observation schedule",
+    "Early intervention improves outcomes in autism",
+]
+
+
+def test_tokenize_keeps_identifiers_whole():
+    assert tokenize("The ADOS-2 and 16p11.2 in Baron-Cohen's work") == ["ados-2", "16p11.2", "baron-cohen's", "work"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SHANK3", True),
+    ("ADOS-2", True),
+    ("Baron-Cohen 2008", True),
+    ('"early intervention"', True),
+    ("what is autism", False),
+    ("autism outcomes", False),
+    ("Does SHANK3 matter?", False),
+])
+def test_is_lexical_query(query, expected):
+    assert is_lexical_query(query) == expected
+
+
+def test_search_ranks_rare_terms_first():
+    index = BM25Index.build(IDS, TEXTS)
+    assert [doc_id for doc_id, _score in index.search("shank3 autism")][0] == "a:0:0"
+    # Both mention autism once; the shorter chunk scores higher
+    assert [doc_id for doc_id, _score in index.search("autism")] == ["a:0:0", "b:1:0"]
+    assert index.search("unrelated") == []
+    assert len(index.search("autism", k=1)) == 1
+
+
+def test_empty_index():
+    assert BM25Index.build([], []).search("autism") == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index.build(IDS, TEXTS)
+    path = str(tmp_path / "bm25.json.gz")
+    index.save(path)
+    loaded = load_index(path)
+    assert loaded is not None
+    assert loaded.search("ADOS-2 autism") == index.search("ADOS-2 autism")
+    assert load_index(str(tmp_path / "missing.json.gz")) is None
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+    # First and third (1/61 + 1/63) narrowly beats second twice (2/62)
+    assert [doc_id for doc_id, _score in fused] == ["c", "b", "a", "d"]
+    scores = dict(fused)
+    assert scores["b"] == pytest.approx(2 / 62)
+    assert scores["a"] == pytest.approx(1 / 61)
+    assert scores["d"] == pytest.approx(1 / 63)
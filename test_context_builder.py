@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from context_builder import CONTEXT_SEPARATOR, build_context, estimate_tokens, overlap_length
+
+
+def chunk(chunk_id: str, text: str):
+    source, page, _index = chunk_id.rsplit(":", 2)
+    return SimpleNamespace(page_content=text, metadata={"id": chunk_id, "source": source, "page": int(page)})
+
+
+def test_overlap_length():
+    assert overlap_length("the quick brown fox jumps", "brown fox jumps over") == len("brown fox jumps")
+    # Overlaps shorter than MIN_OVERLAP_CHARS are treated as coincidence
+    assert overlap_length("abc fox", "fox abc") == 0
+
+
+def test_context_stays_within_budget():
+    results = [(chunk(f"a.pdf:{page}:0", "x" * 400), 0.1 * page, {}) for page in range(5)]
+    used, text, stats = build_context(results, token_budget=250)
+    # Two 100-token chunks and a separator fit; a third does not
+    assert [doc.metadata["id"] for doc, _d, _e in used] == ["a.pdf:0:0", "a.pdf:1:0"]
+    assert text == "x" * 400 + CONTEXT_SEPARATOR + "x" * 400
+    assert stats["context_tokens"] <= 250 and stats["chunks_used"] == 2 and stats["chunks_retrieved"] == 5
+    assert stats["context_tokens_saved"] > 0
+
+
+def test_best_chunk_is_truncated_rather_than_dropped():
+    used, text, stats = build_context([(chunk("a.pdf:0:0", "y" * 4000), 0.0, {})], token_budget=100)
+    assert len(used) == 1
+    assert text == "y" * 400 and estimate_tokens(text) == 100
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    results = [
+        (chunk("a.pdf:3:1", "shared overlap text, then the second half."), 0.1, {}),
+        (chunk("a.pdf:3:0", "The first half ends with shared overlap text,"), 0.2, {}),
+    ]
+    used, text, _stats = build_context(results, token_budget=1000)
+    assert text == "The first half ends with shared overlap text, then the second half."
+    # Results are still reported in rank order
+    assert [doc.metadata["id"] for doc, _d, _e in used] == ["a.pdf:3:1", "a.pdf:3:0"]
+
+
+def test_far_less_relevant_chunks_are_dropped():
+    results = [(chunk("a.pdf:0:0", "best"), 0.1, {}), (chunk("b.pdf:0:0", "distant"), 1.9, {})]
+    used, text, _stats = build_context(results, token_budget=1000, min_relative_score=0.5)
+    assert text == "best" and len(used) == 1
+
+
+def test_lexical_results_use_bm25_scores_for_relevance():
+    results = [
+        (chunk("a.pdf:0:0", "strong"), None, {"bm25_score": 8.0}),
+        (chunk("b.pdf:0:0", "weak"), None, {"bm25_score": 1.0}),
+    ]
+    _used, text, _stats = build_context(results, token_budget=1000, min_relative_score=0.5)
+    assert text == "strong"
+
+
+def test_no_results():
+    used, text, stats = build_context([], token_budget=100)
+    assert used == [] and text == "" and stats["chunks_used"] == 0
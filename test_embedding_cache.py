@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+from embedding_cache import CachedEmbeddings, embedding_key  # noqa: E402
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+def test_key_depends_on_model_and_text():
+    assert embedding_key("nomic", "text") == embedding_key("nomic", "text")
+    assert embedding_key("nomic", "text") != embedding_key("mxbai", "text")
+    assert embedding_key("nomic", "text") != embedding_key("nomic", "other")
+
+
+def test_only_new_texts_are_embedded(tmp_path):
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, str(tmp_path / "cache.sqlite3"), model_name="nomic")
+    assert cache.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert model.embedded == ["a", "bb"]
+    assert cache.embed_documents(["bb", "ccc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert model.embedded == ["a", "bb", "ccc"]
+    assert cache.hits == 1 and cache.misses == 3
+    cache.close()
+
+
+def test_vectors_persist_per_model(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = CachedEmbeddings(CountingEmbeddings(), path, model_name="nomic")
+    first.embed_documents(["a"])
+    first.close()
+
+    same_model = CountingEmbeddings()
+    CachedEmbeddings(same_model, path, model_name="nomic").embed_documents(["a"])
+    assert same_model.embedded == []
+
+    other_model = CountingEmbeddings()
+    CachedEmbeddings(other_model, path, model_name="mxbai").embed_documents(["a"])
+    assert other_model.embedded == ["a"]
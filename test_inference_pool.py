@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inference_pool import Deadline, InferencePool, QueueFullError, RequestCancelled
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_requests_beyond_limit_and_queue_are_shed():
+    async def scenario():
+        pool = InferencePool(max_workers=2, per_model_limit=1, max_queue=1, retry_after=3)
+        held = await pool.acquire("llama3")
+        queued = asyncio.create_task(pool.acquire("llama3"))
+        await settle()
+        with pytest.raises(QueueFullError) as shed:
+            await pool.acquire("llama3")
+        # Other models have their own queue
+        other = await pool.acquire("mistral")
+        other.release()
+        held.release()
+        (await queued).release()
+        return shed.value, pool.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.reason == "queue_full" and error.model_name == "llama3" and error.retry_after == 3
+    assert stats["admitted"] == {"llama3": 2, "mistral": 1}
+    assert stats["shed"] == [{"model": "llama3", "reason": "queue_full", "count": 1}]
+    assert stats["pending"] == {} and stats["active"] == {}
+
+
+def test_run_holds_a_slot_for_the_call():
+    async def scenario():
+        pool = InferencePool(max_workers=2, per_model_limit=1, max_queue=0)
+        seen = []
+
+        def work():
+            seen.append(pool.active_models())
+            return "answer"
+
+        return await pool.run("llama3", work), seen, pool.active_models()
+
+    result, seen, active_after = asyncio.run(scenario())
+    assert result == "answer"
+    assert seen == [["llama3"]] and active_after == []
+
+
+def test_release_is_idempotent():
+    async def scenario():
+        pool = InferencePool(per_model_limit=1, max_queue=0)
+        slot = await pool.acquire("llama3")
+        slot.release()
+        slot.release()
+        (await pool.acquire("llama3")).release()
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["admitted"] == {"llama3": 2} and stats["active"] == {}
+
+
+def test_deadline_check():
+    deadline = Deadline(60)
+    deadline.check()
+    assert 59 < deadline.remaining() <= 60
+    deadline.cancel("disconnected")
+    deadline.cancel("deadline")
+    with pytest.raises(RequestCancelled) as cancelled:
+        deadline.check()
+    assert cancelled.value.reason == "disconnected"
+    assert Deadline().remaining() is None
+
+
+def test_passed_deadline_cancels():
+    deadline = Deadline(0.01)
+    time.sleep(0.02)
+    with pytest.raises(RequestCancelled) as cancelled:
+        deadline.check()
+    assert cancelled.value.reason == "deadline"
+
+
+def test_request_that_would_wait_past_its_deadline_is_shed_up_front():
+    async def scenario():
+        pool = InferencePool(per_model_limit=1, max_queue=4)
+        # One earlier request held the slot for ten seconds
+        warmup = await pool.acquire("llama3")
+        warmup.acquired_at -= 10
+        warmup.release()
+        held = await pool.acquire("llama3")
+        with pytest.raises(QueueFullError) as shed:
+            await pool.acquire("llama3", timeout=1)
+        held.release()
+        return shed.value
+
+    error = asyncio.run(scenario())
+    assert error.reason == "deadline" and error.retry_after >= 10
+
+
+def test_waiting_stops_at_the_deadline():
+    async def scenario():
+        pool = InferencePool(per_model_limit=1, max_queue=4)
+        held = await pool.acquire("llama3")
+        with pytest.raises(QueueFullError) as shed:
+            await pool.acquire("llama3", timeout=0.01)
+        held.release()
+        return shed.value, pool.stats()
+
+    error, stats = asyncio.run(scenario())
+    assert error.reason == "wait_timeout"
+    assert stats["pending"] == {} and stats["active"] == {}
+
+
+def test_cancelled_caller_keeps_slot_until_worker_stops():
+    async def scenario():
+        pool = InferencePool(per_model_limit=1, max_queue=0)
+        deadline = Deadline()
+        proceed = threading.Event()
+
+        def work():
+            proceed.wait(5)
+            deadline.check()
+
+        slot = await pool.acquire("llama3")
+        task = asyncio.create_task(pool.run_in_slot(slot, work, deadline=deadline))
+        await settle()
+        task.cancel()
+        await settle()
+        # The worker is still running, so the model is still busy
+        held_after_cancel = pool.active_models()
+        proceed.set()
+        while slot.released_at is None:
+            await asyncio.sleep(0.005)
+        return held_after_cancel, deadline.reason, pool.active_models()
+
+    held_after_cancel, reason, active_after = asyncio.run(scenario())
+    assert held_after_cancel == ["llama3"]
+    assert reason == "abandoned"
+    assert active_after == []
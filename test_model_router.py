@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from model_router import ESCALATED, LARGE, SMALL, CascadeRouter
+
+CONTEXT = "Autism spectrum disorder is diagnosed through behavioural observation and developmental history."
+
+
+def result(distance, text=CONTEXT):
+    return SimpleNamespace(page_content=text, metadata={}), distance, {}
+
+
+@pytest.fixture
+def router():
+    return CascadeRouter("llama3.2:1b", "llama3", max_distance=0.6, min_support=2, max_question_words=10)
+
+
+@pytest.mark.parametrize("question, results, route, reason", [
+    ("How is autism diagnosed?", [result(0.2), result(0.4)], SMALL, "confident"),
+    ("How is autism diagnosed?", [], LARGE, "no_results"),
+    ("How is autism diagnosed in adults who were never assessed as children or teenagers?",
+     [result(0.2), result(0.4)], LARGE, "long_question"),
+    ("SHANK3", [result(None), result(None)], SMALL, "keyword_lookup"),
+    ("How is autism diagnosed?", [result(0.9), result(1.0)], LARGE, "weak_match"),
+    ("How is autism diagnosed?", [result(0.2), result(0.9)], LARGE, "little_support"),
+    # One result can only ever have a support of one
+    ("How is autism diagnosed?", [result(0.2)], SMALL, "confident"),
+])
+def test_route(router, question, results, route, reason):
+    decision = router.route(question, results)
+    assert (decision.route, decision.reason) == (route, reason)
+    assert decision.model_name == (router.small_model if route == SMALL else router.large_model)
+
+
+@pytest.mark.parametrize("answer, reason", [
+    ("Observation.", "short_answer"),
+    ("I don't know, the context does not mention how it is diagnosed.", "refusal"),
+    ("Quantum chromodynamics governs gluons binding quarks inside protons and neutrons.", "ungrounded"),
+    ("Autism spectrum disorder is diagnosed through behavioural observation and developmental history.", None),
+])
+def test_check_answer(router, answer, reason):
+    assert router.check_answer(answer, [result(0.2)]) == reason
+
+
+def test_stats(router):
+    router.record(SMALL, "confident", 1.0)
+    router.record(SMALL, "confident", 3.0)
+    router.record(ESCALATED, "refusal", 5.0)
+    router.record(LARGE, "weak_match", 4.0)
+    stats = router.stats()
+    assert stats["routes"][SMALL] == {"count": 2, "mean_latency": 2.0}
+    assert stats["small_share"] == 0.5
+    assert stats["escalation_rate"] == pytest.approx(1 / 3)
+    assert stats["reasons"] == {"confident": 2, "refusal": 1, "weak_match": 1}
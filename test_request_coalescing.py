@@ -0,0 +1,183 @@
+import asyncio
+
+from request_coalescing import SingleFlight, normalize_question
+
+
+async def settle():
+    # Let the flight's task and every waiter run up to their next await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_normalize_question():
+    assert normalize_question("  What is   Autism? ") == normalize_question("what is autism")
+
+
+def test_follower_shares_leader_result():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flight.run("key", work))
+        await settle()
+        follower = asyncio.create_task(flight.run("key", work))
+        await settle()
+        release.set()
+        return await leader, await follower, calls, flight.stats()
+
+    leader, follower, calls, stats = asyncio.run(scenario())
+    assert leader == ("answer", False)
+    assert follower == ("answer", True)
+    assert len(calls) == 1
+    assert stats["leaders"] == 1 and stats["followers"] == 1 and stats["in_flight"] == 0
+
+
+def test_work_is_cancelled_only_after_last_waiter_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        first = asyncio.create_task(flight.run("key", work))
+        await settle()
+        second = asyncio.create_task(flight.run("key", work))
+        await settle()
+
+        first.cancel()
+        await settle()
+        still_running = not cancelled.is_set()
+
+        second.cancel()
+        await settle()
+        return still_running, cancelled.is_set(), flight.stats()
+
+    still_running, cancelled, stats = asyncio.run(scenario())
+    assert still_running
+    assert cancelled
+    assert stats["abandoned"] == 1 and stats["in_flight"] == 0
+
+
+def test_late_stream_subscriber_replays_earlier_events():
+    async def scenario():
+        flight = SingleFlight()
+        more = asyncio.Event()
+
+        async def events():
+            yield 1
+            yield 2
+            await more.wait()
+            yield 3
+
+        leader = flight.start_stream("key", events())
+        seen_by_leader = [await leader.__anext__(), await leader.__anext__()]
+        late = flight.stream("key")
+        assert late is not None
+        more.set()
+        seen_by_leader += [event async for event in leader]
+        return seen_by_leader, [event async for event in late], flight.stream("key")
+
+    seen_by_leader, seen_late, after = asyncio.run(scenario())
+    assert seen_by_leader == [1, 2, 3]
+    assert seen_late == [1, 2, 3]
+    assert after is None
+
+
+def test_stream_error_reaches_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+        fail = asyncio.Event()
+
+        async def events():
+            yield "token"
+            await fail.wait()
+            raise RuntimeError("generation failed")
+
+        async def collect(subscriber):
+            seen = []
+            try:
+                async for event in subscriber:
+                    seen.append(event)
+            except RuntimeError as e:
+                return seen, str(e)
+            return seen, None
+
+        leader = asyncio.create_task(collect(flight.start_stream("key", events())))
+        await settle()
+        follower = asyncio.create_task(collect(flight.stream("key")))
+        await settle()
+        fail.set()
+        return await leader, await follower
+
+    leader, follower = asyncio.run(scenario())
+    assert leader == (["token"], "generation failed")
+    assert follower == (["token"], "generation failed")
+
+
+def test_run_error_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        fail = asyncio.Event()
+
+        async def work():
+            await fail.wait()
+            raise RuntimeError("generation failed")
+
+        waiters = [asyncio.create_task(flight.run("key", work)) for _ in range(3)]
+        await settle()
+        fail.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    for result in asyncio.run(scenario()):
+        assert isinstance(result, RuntimeError)
+
+
+def test_finished_key_starts_a_new_flight():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            return "answer"
+
+        return await flight.run("key", work), await flight.run("key", work)
+
+    first, second = asyncio.run(scenario())
+    assert first == ("answer", False)
+    assert second == ("answer", False)
+
+
+
+def test_unread_subscriptions_closed_cancel_the_stream():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def events():
+            yield "token"
+            await asyncio.Event().wait()
+
+        leader = flight.start_stream("key", events(), on_finish=finished.set)
+        follower = flight.stream("key")
+        await settle()
+        # Neither client read anything before going away
+        await leader.aclose()
+        await settle()
+        running_after_leader = not finished.is_set()
+        await follower.aclose()
+        await asyncio.wait_for(finished.wait(), 1)
+        return running_after_leader, flight.stats()
+
+    running_after_leader, stats = asyncio.run(scenario())
+    assert running_after_leader
+    assert stats["abandoned"] == 1 and stats["in_flight"] == 0
@@ -0,0 +1,85 @@
+from sessions import SessionStore
+
+
+def test_turn_keeps_context_and_sent_chunks():
+    store = SessionStore()
+    session = store.create("llama3")
+    store.record_turn(session, "first?", "one", [1, 2, 3], ["a:0:0"])
+    store.record_turn(session, "second?", "two", [1, 2, 3, 4, 5], ["a:0:1"])
+    assert list(session.context) == [1, 2, 3, 4, 5]
+    assert session.sent_chunks == {"a:0:0", "a:0:1"}
+    assert [turn.question for turn in session.turns] == ["first?", "second?"]
+
+
+def test_missing_context_resets_the_session():
+    store = SessionStore()
+    session = store.create("llama3")
+    store.record_turn(session, "first?", "one", [1, 2, 3], ["a:0:0"])
+    store.record_turn(session, "second?", "two", None, ["a:0:1"])
+    assert not session.has_context and session.sent_chunks == set() and session.resets == 1
+    # The turns stay for the recap
+    assert len(session.turns) == 2
+
+
+def test_context_over_the_token_cap_resets_the_session():
+    store = SessionStore(max_context_tokens=4)
+    session = store.create("llama3")
+    store.record_turn(session, "question?", "answer", [1, 2, 3, 4, 5], ["a:0:0"])
+    assert not session.has_context and session.resets == 1
+
+
+def test_memory_cap_drops_oldest_turns():
+    store = SessionStore(max_bytes=100)
+    session = store.create("llama3")
+    for i in range(5):
+        store.record_turn(session, f"question {i}?", "x" * 30, None, [])
+    assert session.memory_bytes() <= 100
+    assert session.turns[-1].question == "question 4?"
+    assert len(session.turns) < 5
+
+
+def test_turn_cap():
+    store = SessionStore(max_turns=2)
+    session = store.create("llama3")
+    for i in range(3):
+        store.record_turn(session, f"question {i}?", "answer", [i + 1], [])
+    assert [turn.question for turn in session.turns] == ["question 1?", "question 2?"]
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_sessions=2)
+    first, _ = store.get_or_create("first", "llama3")
+    store.get_or_create("second", "llama3")
+    store.get_or_create("first", "llama3")
+    store.get_or_create("third", "llama3")
+    assert store.get("second") is None
+    assert store.get("first") is first
+    assert store.stats()["evicted"] == 1
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(idle_ttl=60)
+    session, created = store.get_or_create("idle", "llama3")
+    assert created
+    session.last_used -= 61
+    assert store.get("idle") is None
+    _session, created = store.get_or_create("idle", "llama3")
+    assert created and store.stats()["expired"] == 1
+
+
+def test_switching_model_resets_the_session():
+    store = SessionStore()
+    session = store.create("llama3")
+    store.record_turn(session, "question?", "answer", [1, 2], ["a:0:0"])
+    session.use_model("llama3")
+    assert session.has_context
+    session.use_model("mistral")
+    assert session.model_name == "mistral" and not session.has_context and session.sent_chunks == set()
+
+
+def test_one_turn_at_a_time():
+    session = SessionStore().create("llama3")
+    assert session.begin_turn()
+    assert not session.begin_turn()
+    session.end_turn()
+    assert session.begin_turn()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from vector_index import VectorIndex, load_index
+
+IDS = ["a:0:0", "a:0:1", "b:1:0", "b:1:1"]
+DOCUMENTS = ["first", "second", "third", "fourth"]
+METADATAS = [{"source": "a", "page": 0}, {"source": "a", "page": 0}, {"source": "b", "page": 1}, {"source": "b", "page": 1}]
+EMBEDDINGS = np.array([
+    [1.0, 0.0, 0.0],
+    [0.0, 2.0, 0.0],
+    [0.0, 0.0, 3.0],
+    [1.0, 1.0, 0.0],
+], dtype=np.float32)
+QUERIES = np.array([[1.0, 0.1, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+
+
+def exact_distances(space: str) -> np.ndarray:
+    if space == "l2":
+        return ((QUERIES[:, None, :] - EMBEDDINGS[None, :, :]) ** 2).sum(axis=2)
+    if space == "cosine":
+        queries = QUERIES / np.linalg.norm(QUERIES, axis=1, keepdims=True)
+        rows = EMBEDDINGS / np.linalg.norm(EMBEDDINGS, axis=1, keepdims=True)
+        return 1.0 - queries @ rows.T
+    return 1.0 - QUERIES @ EMBEDDINGS.T
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+def test_distances_match_exact_computation(space):
+    index = VectorIndex.build(IDS, DOCUMENTS, METADATAS, EMBEDDINGS, space=space)
+    np.testing.assert_allclose(index.distances(QUERIES), exact_distances(space), rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_search_batch_returns_nearest_first(space, dtype):
+    index = VectorIndex.build(IDS, DOCUMENTS, METADATAS, EMBEDDINGS, space=space, dtype=dtype)
+    expected = exact_distances(space)
+    for query_results, query_distances in zip(index.search_batch(QUERIES, 2), expected):
+        rows = [row for row, _distance in query_results]
+        assert rows == list(np.argsort(query_distances)[:2])
+        # Compressed storage only approximates the distances
+        np.testing.assert_allclose([distance for _row, distance in query_results],
+                                   np.sort(query_distances)[:2], atol=0.05)
+
+
+def test_search_batch_caps_k_at_index_size():
+    index = VectorIndex.build(IDS, DOCUMENTS, METADATAS, EMBEDDINGS)
+    assert [len(results) for results in index.search_batch(QUERIES, 10)] == [4, 4]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_empty_index(dtype):
+    index = VectorIndex.build([], [], [], [], dtype=dtype)
+    assert len(index) == 0
+    assert index.distances(QUERIES).shape == (2, 0)
+    assert index.search_batch(QUERIES, 3) == [[], []]
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_save_and_load_round_trip(tmp_path, dtype):
+    index = VectorIndex.build(IDS, DOCUMENTS, METADATAS, EMBEDDINGS, space="cosine", dtype=dtype)
+    index.save(str(tmp_path))
+    loaded = load_index(str(tmp_path))
+    assert loaded is not None
+    assert loaded.ids == IDS and loaded.metadatas == METADATAS and loaded.space == "cosine"
+    np.testing.assert_allclose(loaded.distances(QUERIES), index.distances(QUERIES))
+
+
+def test_load_missing_index(tmp_path):
+    assert load_index(str(tmp_path / "missing")) is None
+
+
+def test_document():
+    pytest.importorskip("langchain_core")
+    index = VectorIndex.build(IDS, DOCUMENTS, METADATAS, EMBEDDINGS)
+    document, distance = index.similarity_search_by_vector_with_relevance_scores(EMBEDDINGS[2], k=1)[0]
+    assert document.page_content == "third" and document.id == "b:1:0" and distance == pytest.approx(0.0)
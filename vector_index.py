@@ -0,0 +1,178 @@
+"""
+Flat, memory-mapped vector index over the chunk embeddings.
+
+For a corpus of this size exact search is a single matrix product, which is
+cheaper than a round trip through the Chroma client. populate_database
+exports the collection into a directory holding:
+
+    embeddings.npy   (n, dim) float32, float16 or int8 rows
+    scales.npy       per-row dequantization scales (int8 only)
+    norms.npy        squared row norms (l2 collections only)
+    chunks.json.gz   chunk IDs, texts and metadata, in row order
+    index.json       distance function, storage dtype and shape; written last
+
+The .npy files are opened with mmap_mode="r", so several API worker
+processes share one read-only copy in the page cache. Distances match those
+Chroma reports for the collection's distance function.
+"""
+import gzip
+import json
+import os
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time when the matrix is stored compressed
+SEARCH_BLOCK_ROWS = 65536
+
+
+def _write_npy(directory: str, name: str, array: np.ndarray):
+    # Written under a temporary name so readers never map a partial file
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+class VectorIndex:
+    """Exact top-k search over a (possibly quantized) embedding matrix."""
+
+    def __init__(self, ids: List[str], documents: List[str], metadatas: List[dict], embeddings: np.ndarray,
+                 space: str = "l2", scales: Optional[np.ndarray] = None, norms: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.embeddings = embeddings
+        self.space = space
+        self.scales = scales
+        self.norms = norms
+
+    @classmethod
+    def build(cls, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[dict], embeddings,
+              space: str = "l2", dtype: str = "float32") -> "VectorIndex":
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{dtype}', expected one of {', '.join(VECTOR_DTYPES)}")
+        if len(ids):
+            matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        norms = None
+        if space == "cosine":
+            # Cosine distance is then 1 - dot product
+            lengths = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(lengths > 0, lengths, 1.0)
+        elif space == "l2":
+            norms = np.einsum("ij,ij->i", matrix, matrix)
+        scales = None
+        if dtype == "int8":
+            # Symmetric per-row quantization: row ~= scale * int8 row
+            scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+            scales[scales == 0] = 1.0
+            matrix = np.round(matrix / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+        else:
+            matrix = matrix.astype(dtype)
+        return cls(list(ids), list(documents), list(metadatas), matrix, space=space, scales=scales, norms=norms)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def distances(self, query_embeddings) -> np.ndarray:
+        """(queries, rows) matrix of distances between each query and every chunk."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if self.space == "cosine":
+            lengths = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(lengths > 0, lengths, 1.0)
+        if len(self.ids) == 0:
+            return np.empty((len(queries), 0), dtype=np.float32)
+
+        if self.embeddings.dtype == np.float32:
+            dots = queries @ self.embeddings.T
+        else:
+            # Convert block by block so a compressed matrix is never expanded whole
+            dots = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+            for start in range(0, len(self.ids), SEARCH_BLOCK_ROWS):
+                block = np.asarray(self.embeddings[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                dots[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            dots *= self.scales
+
+        if self.space == "l2":
+            # hnswlib's "l2" is the squared Euclidean distance
+            query_norms = np.einsum("ij,ij->i", queries, queries)
+            return np.maximum(query_norms[:, None] - 2 * dots + self.norms, 0.0)
+        return 1.0 - dots
+
+    def search_batch(self, query_embeddings, k: int) -> List[List[Tuple[int, float]]]:
+        """Top `k` (row, distance) pairs for each query, nearest first."""
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return [[] for _ in np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))]
+        distances = self.distances(query_embeddings)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        results = []
+        for row_distances, rows in zip(distances, nearest):
+            rows = rows[np.argsort(row_distances[rows])]
+            results.append([(int(row), float(row_distances[row])) for row in rows])
+        return results
+
+    def document(self, row: int) -> "Document":
+        from langchain_core.documents import Document
+
+        return Document(page_content=self.documents[row], metadata=self.metadatas[row], id=self.ids[row])
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: Sequence[float], k: int = 4) -> List[Tuple["Document", float]]:
+        """Same results as the Chroma vector store method of this name, found by exact search."""
+        return [(self.document(row), distance) for row, distance in self.search_batch([embedding], k)[0]]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        _write_npy(directory, "embeddings.npy", self.embeddings)
+        for name, array in (("scales.npy", self.scales), ("norms.npy", self.norms)):
+            if array is not None:
+                _write_npy(directory, name, array)
+            elif os.path.exists(os.path.join(directory, name)):
+                os.remove(os.path.join(directory, name))
+        chunks_path = os.path.join(directory, "chunks.json.gz")
+        with gzip.open(chunks_path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f, separators=(",", ":"))
+        os.replace(chunks_path + ".tmp", chunks_path)
+        # Readers reload when this file changes, so it goes last
+        info_path = os.path.join(directory, "index.json")
+        with open(info_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "space": self.space,
+                "dtype": str(self.embeddings.dtype),
+                "count": len(self.ids),
+                "dim": int(self.embeddings.shape[1]) if self.embeddings.ndim == 2 else 0,
+            }, f)
+        os.replace(info_path + ".tmp", info_path)
+
+    @classmethod
+    def load(cls, directory: str) -> "VectorIndex":
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        with gzip.open(os.path.join(directory, "chunks.json.gz"), "rt", encoding="utf-8") as f:
+            chunks = json.load(f)
+        embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        if len(chunks["ids"]) != info["count"] or len(embeddings) != info["count"]:
+            raise ValueError(f"Vector index in {directory} is inconsistent; re-run populate_database")
+
+        def optional(name: str) -> Optional[np.ndarray]:
+            path = os.path.join(directory, name)
+            return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+        return cls(chunks["ids"], chunks["documents"], chunks["metadatas"], embeddings,
+                   space=info["space"], scales=optional("scales.npy"), norms=optional("norms.npy"))
+
+
+def load_index(directory: str) -> Optional[VectorIndex]:
+    try:
+        return VectorIndex.load(directory)
+    except (OSError, ValueError, KeyError):
+        return None